@@ -7,17 +7,36 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 import shutil  # Import für Dateioperationen
+from .ki_client import KIClient
+from .ki_state import KIState
+from .ki_admission import KIAdmission
+from .dispatch_cache import DispatchCache
+from .timing import Metrics
+from .tool_calls import ToolCallExecutor
+from .passwords import PasswordHasher
+from .user_cache import UserCache
 
 # --- Initialisierung der Erweiterungen ---
 db = SQLAlchemy()
 login_manager = LoginManager()
 login_manager.login_view = 'main.login'
 login_manager.login_message_category = 'info'
-migrate = Migrate()
+migrate = Migrate(render_as_batch=True)  # SQLite kann ALTER TABLE nur eingeschränkt
+ki_client = KIClient()
+ki_state = KIState(ki_client)
+ki_admission = KIAdmission()
+dispatch_cache = DispatchCache()
+metrics = Metrics()
+tool_calls = ToolCallExecutor()
+password_hasher = PasswordHasher()
+user_cache = UserCache()
 
 
-def create_app():
-    """Erstellt und konfiguriert eine Instanz der Flask-Anwendung."""
+def create_app(test_config=None):
+    """
+    Erstellt und konfiguriert eine Instanz der Flask-Anwendung.
+    `test_config` überschreibt die Standardkonfiguration (z.B. für Benchmarks mit temporärer Datenbank).
+    """
     app = Flask(__name__, instance_relative_config=True)
 
     # --- Konfiguration ---
@@ -28,14 +47,88 @@ def create_app():
 
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(app.instance_path, "coldnet.db")}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # PRAGMAs pro Verbindung (WAL, busy_timeout, ...); Standardwerte siehe app/sqlite_profile.py
+    if os.environ.get('SQLITE_PROFILE') == 'off':
+        app.config['SQLITE_PROFILE'] = {}
+    # Massenänderungen an Notizen (/api/notes/bulk): Zeilen pro Transaktion
+    app.config['NOTES_BULK_CHUNK_SIZE'] = int(os.environ.get('NOTES_BULK_CHUNK_SIZE', 500))
 
     app.config['KI_SERVER_URL_LOCAL'] = 'http://192.168.86.206:8080'
     app.config['KI_SERVER_URL_PUBLIC'] = 'http://coldnet.dedyn.io:80'
+    # Connection-Pool pro KI-Endpunkt (Keep-Alive) und Wiederholungen bei Verbindungsfehlern
+    app.config['KI_POOL_SIZE'] = int(os.environ.get('KI_POOL_SIZE', 10))
+    app.config['KI_POOL_RETRIES'] = int(os.environ.get('KI_POOL_RETRIES', 2))
+    # Zustand (aktiver Endpunkt, geladenes Modell) wird im Hintergrund aktualisiert
+    app.config['KI_STATE_REFRESH_INTERVAL'] = int(os.environ.get('KI_STATE_REFRESH_INTERVAL', 15))
+    # Pool aus mehreren KI-Servern (kommagetrennte URLs; Einträge auch als {'url', 'name', 'fallback'}, siehe
+    # app/ki_state.py). Ohne Angabe: lokaler Server, der öffentliche Zugang nur als Fallback.
+    if os.environ.get('KI_BACKENDS'):
+        app.config['KI_BACKENDS'] = [url.strip() for url in os.environ['KI_BACKENDS'].split(',') if url.strip()]
+    # Circuit Breaker pro Backend: nach so vielen Fehlern in Folge gesperrt, nach der Abkühlzeit (s) eine Probeanfrage
+    app.config['KI_BREAKER_FAILURES'] = int(os.environ.get('KI_BREAKER_FAILURES', 3))
+    app.config['KI_BREAKER_COOLDOWN'] = int(os.environ.get('KI_BREAKER_COOLDOWN', 30))
+    # Zulassungssteuerung pro Modell: max. gleichzeitige KI-Aufrufe, Spuren siehe app/ki_admission.py
+    # (z.B. {'generation': {'limit': 2, 'max_wait': 60}} überschreibt nur diese Werte). Die Limits gelten für den
+    # ganzen Backend-Pool: bei mehreren GPU-Servern entsprechend erhöhen.
+    app.config['KI_ADMISSION_ENABLED'] = os.environ.get('KI_ADMISSION_ENABLED', '1') == '1'
+    app.config['KI_ADMISSION_MAX_ACTIVE'] = int(os.environ.get('KI_ADMISSION_MAX_ACTIVE', 4))
+    app.config['KI_ADMISSION_LANES'] = {}
+    # Lokaler Fast-Path: ab dieser Konfidenz wird der LLM-Dispatcher übersprungen
+    app.config['INTENT_FASTPATH_ENABLED'] = os.environ.get('INTENT_FASTPATH_ENABLED', '1') == '1'
+    app.config['INTENT_CONFIDENCE_THRESHOLD'] = float(os.environ.get('INTENT_CONFIDENCE_THRESHOLD', 0.9))
+    # Serverseitiger Chatverlauf: Prompt-Budget (geschätzte Tokens inkl. System-Prompt), max. Nachrichten im
+    # Fenster und Zusammenfassung der herausgefallenen Runden im Hintergrund
+    app.config['CHAT_CONTEXT_TOKEN_BUDGET'] = int(os.environ.get('CHAT_CONTEXT_TOKEN_BUDGET', 2048))
+    app.config['CHAT_CONTEXT_MAX_MESSAGES'] = int(os.environ.get('CHAT_CONTEXT_MAX_MESSAGES', 40))
+    app.config['CHAT_HISTORY_SUMMARY'] = os.environ.get('CHAT_HISTORY_SUMMARY', '1') == '1'
+    app.config['CHAT_SUMMARY_MAX_CHARS'] = 1500
+    # Zwischenspeicher für Dispatcher-Entscheidungen (normalisierte Nachricht + Modell + Werkzeug-Version)
+    app.config['DISPATCH_CACHE_ENABLED'] = os.environ.get('DISPATCH_CACHE_ENABLED', '1') == '1'
+    app.config['DISPATCH_CACHE_MAX_ENTRIES'] = int(os.environ.get('DISPATCH_CACHE_MAX_ENTRIES', 2048))
+    app.config['DISPATCH_CACHE_MAX_BYTES'] = int(os.environ.get('DISPATCH_CACHE_MAX_BYTES', 2 * 1024 * 1024))
+    app.config['DISPATCH_CACHE_TTL'] = int(os.environ.get('DISPATCH_CACHE_TTL', 3600))
+    # Mehrere Werkzeugaufrufe pro Dispatcher-Antwort: Obergrenze pro Nachricht, parallel laufende lesende Werkzeuge
+    app.config['TOOL_CALLS_MAX'] = int(os.environ.get('TOOL_CALLS_MAX', 8))
+    app.config['TOOL_CALLS_MAX_PARALLEL'] = int(os.environ.get('TOOL_CALLS_MAX_PARALLEL', 4))
+    # Opt-in: Dispatcher und coldBot-Antwort parallel starten (kürzere Zeit bis zum ersten Token)
+    app.config['CHAT_SPECULATIVE_DISPATCH'] = os.environ.get('CHAT_SPECULATIVE_DISPATCH', '0') == '1'
+    # Asynchrones Chat-Gateway (flask chat-gateway): Threads für Dispatcher/Werkzeuge, max. Upstream-Verbindungen
+    app.config['CHAT_GATEWAY_PLAN_WORKERS'] = int(os.environ.get('CHAT_GATEWAY_PLAN_WORKERS', 8))
+    app.config['CHAT_GATEWAY_UPSTREAM_LIMIT'] = int(os.environ.get('CHAT_GATEWAY_UPSTREAM_LIMIT', 200))
+    # Zeitmessung pro Phase (Server-Timing-Header, /metrics für Prometheus); Slow-Log ab dieser Dauer (0 = aus).
+    # /metrics ist für angemeldete Admins oder per "Authorization: Bearer <METRICS_TOKEN>" erreichbar.
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+    app.config['METRICS_SLOW_REQUEST_MS'] = int(os.environ.get('METRICS_SLOW_REQUEST_MS', 0))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Passwort-Hashing im Prozess-Pool (0 Worker = im Request-Thread), max. gleichzeitige Vorgänge und Wartezeit (s)
+    # auf einen Platz. Hashes mit anderer Methode werden bei der nächsten Anmeldung neu berechnet.
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 2)))
+    app.config['PASSWORD_HASH_MAX_CONCURRENT'] = int(os.environ.get('PASSWORD_HASH_MAX_CONCURRENT', 2 * app.config['PASSWORD_HASH_WORKERS'] or 4))
+    app.config['PASSWORD_HASH_MAX_WAIT'] = float(os.environ.get('PASSWORD_HASH_MAX_WAIT', 5))
+    # Cache für den user_loader (ein Eintrag pro angemeldetem Benutzer), TTL in Sekunden
+    app.config['USER_CACHE_ENABLED'] = os.environ.get('USER_CACHE_ENABLED', '1') == '1'
+    app.config['USER_CACHE_MAX_ENTRIES'] = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 1024))
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 60))
 
     # --- Konfiguration für den Video-Dienst ---
     VIDEO_BASE_PATH = '/mnt/nas_videos/jokaja/Unreal Engine/videos'
     app.config['VIDEO_FOLDER'] = VIDEO_BASE_PATH
     app.config['ALLOWED_VIDEO_EXTENSIONS'] = {'.mp4', '.webm', '.ogg', '.mkv'}
+    # Manifest des inkrementellen Scanners (Pfad, Größe, mtime je Datei) und Batch-Größe für DB-Schreibvorgänge
+    app.config['VIDEO_MANIFEST_PATH'] = os.path.join(app.instance_path, 'video_manifest.json')
+    app.config['VIDEO_SCAN_BATCH_SIZE'] = 500
+    # Katalog-Cache für /video-stream: wird nach jedem Scan verworfen, die TTL gilt für andere Worker-Prozesse
+    app.config['VIDEO_CATALOG_TTL'] = 300
+    app.config['VIDEO_CATALOG_PAGE_SIZE'] = 30
+    # Live-Aktualisierung per Dateisystem-Watcher: 'off', 'auto' (inotify, Polling auf NFS/CIFS), 'inotify' oder 'poll'
+    app.config['VIDEO_WATCH_MODE'] = os.environ.get('VIDEO_WATCH_MODE', 'off')
+    app.config['VIDEO_WATCH_DEBOUNCE'] = 5           # Sekunden Ruhe, bevor ein Teil-Scan startet
+    app.config['VIDEO_WATCH_MAX_DELAY'] = 60         # spätestens dann, auch wenn noch kopiert wird
+    app.config['VIDEO_WATCH_POLL_INTERVAL'] = 60
+    # Auslieferung von /video_files: 'sendfile' (Range-Responder), 'x-accel' (nginx), 'x-sendfile' (Apache) oder 'flask'
+    app.config['VIDEO_DELIVERY_MODE'] = os.environ.get('VIDEO_DELIVERY_MODE', 'sendfile')
+    app.config['VIDEO_ACCEL_REDIRECT_PREFIX'] = os.environ.get('VIDEO_ACCEL_REDIRECT_PREFIX', '/protected_videos/')
 
     # --- Konfiguration für Thumbnails ---
     # Dieser Ordner wird innerhalb des 'static'-Verzeichnisses erstellt.
@@ -44,11 +137,29 @@ def create_app():
     app.config['THUMBNAIL_FOLDER'] = thumbnail_folder_path
     if not os.path.exists(thumbnail_folder_path):
         os.makedirs(thumbnail_folder_path)
+    # WebP-Varianten pro Breite (px), benannt nach Inhalts-Hash; ausgeliefert mit "immutable"-Cache-Header
+    app.config['THUMBNAIL_WIDTHS'] = (240, 480)
+    app.config['THUMBNAIL_WEBP_QUALITY'] = 80
+    app.config['THUMBNAIL_WORKERS'] = min(8, os.cpu_count() or 4)
+    app.config['THUMBNAIL_MAX_AGE'] = 365 * 24 * 3600
+
+    if test_config:
+        app.config.update(test_config)
 
     # --- Erweiterungen mit der App verbinden ---
     db.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
+    ki_client.init_app(app)
+    ki_state.init_app(app)
+    ki_admission.init_app(app)
+    dispatch_cache.init_app(app)
+    metrics.init_app(app)
+    tool_calls.init_app(app)
+    password_hasher.init_app(app)
+    user_cache.init_app(app)
+    from .video_delivery import init_video_delivery
+    init_video_delivery(app)
 
     # --- Blueprints (Routen) registrieren ---
     # Dies geschieht, nachdem die gesamte Konfiguration abgeschlossen ist.
@@ -57,6 +168,24 @@ def create_app():
 
     # --- Erstellt die Datenbanktabellen, falls sie nicht existieren ---
     with app.app_context():
+        from .sqlite_profile import init_sqlite_profile
+        init_sqlite_profile(app, db.engine)
         db.create_all()
+        # Volltextindex für Notizen (FTS5) inkl. Trigger und Backfill
+        from .note_search import init_note_search
+        init_note_search(app)
+    from .video_watcher import init_video_watcher, watch_videos_command
+    init_video_watcher(app)
+
+    # --- Template-Filter ---
+    from .thumbnails import thumbnail_srcset
+    app.add_template_filter(lambda url: thumbnail_srcset(url, app.config['THUMBNAIL_WIDTHS']), 'thumbnail_srcset')
+
+    # --- CLI-Befehle ---
+    from .query_plans import check_query_plans_command
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(watch_videos_command)
+    from .chat_gateway import chat_gateway_command
+    app.cli.add_command(chat_gateway_command)
 
     return app
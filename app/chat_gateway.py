@@ -0,0 +1,247 @@
+# Ordner: /coldNet/app/
+# Datei: chat_gateway.py
+
+"""
+Asynchrones Chat-Gateway für /api/chat.
+
+Unter WSGI belegt jede offene Unterhaltung einen Worker-Thread, bis die Generierung
+fertig ist (bis zu 300 s). Das Gateway läuft als eigener Prozess mit einer Event-Loop:
+Anmeldung, Dispatcher und Werkzeuge laufen unverändert über plan_chat() in einem kleinen
+Thread-Pool, das Weiterreichen der Tokens übernimmt aiohttp ohne Thread pro Stream.
+Trennt der Browser die Verbindung, wird der Handler abgebrochen und damit auch die
+Anfrage an den KI-Server.
+
+Start:  flask chat-gateway --port 5001
+nginx:  location = /api/chat { proxy_pass http://127.0.0.1:5001; proxy_buffering off; }
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask_login import current_user
+
+try:
+    import aiohttp
+    from aiohttp import web
+except ImportError:  # aiohttp ist optional und wird nur für den Gateway-Prozess gebraucht.
+    aiohttp = None
+
+from . import ki_admission, ki_state, metrics
+from .conversations import ReplyRecorder, finish_turn
+from .ki_admission import AdmissionRejected
+from .routes import (QUEUE_EVENT_INTERVAL, REQUESTS_TIMEOUT, chat_failure_event, chat_headers, chat_timeout_event,
+                     plan_chat, retry_after_header, sse_message, sse_queue_position)
+
+
+class ChatGateway:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self._planner = ThreadPoolExecutor(max_workers=flask_app.config['CHAT_GATEWAY_PLAN_WORKERS'],
+                                           thread_name_prefix='chat-plan')
+        self._session = None
+        self.stats = {'requests': 0, 'streams': 0, 'active_streams': 0, 'client_disconnects': 0}
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post('/api/chat', self.handle_chat)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app):
+        connector = aiohttp.TCPConnector(limit=self.flask_app.config['CHAT_GATEWAY_UPSTREAM_LIMIT'], keepalive_timeout=30)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=REQUESTS_TIMEOUT[0], sock_read=REQUESTS_TIMEOUT[1])
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def _on_cleanup(self, app):
+        await self._session.close()
+        self._planner.shutdown(wait=False)
+
+    def _plan(self, cookie_header, body):
+        """
+        Läuft im Thread-Pool: derselbe Request-Kontext wie unter WSGI, inkl. Session-Cookie und Flask-Login.
+        Gibt (plan, Server-Timing der Phasen bis hier) zurück.
+        """
+        with self.flask_app.test_request_context('/api/chat', method='POST', headers={'Cookie': cookie_header}):
+            if not current_user.is_authenticated:
+                return None, None
+            plan = plan_chat(body)
+            if plan.events is not None:
+                # Werkzeugketten brauchen den Request-Kontext: hier ausführen statt beim Senden.
+                plan = plan._replace(events=list(plan.events))
+            return plan, metrics.server_timing()
+
+    def _finish_turn(self, plan, reply):
+        with self.flask_app.app_context():
+            finish_turn(plan.conversation_id, reply, plan.context)
+
+    def _error_event(self, e):
+        with self.flask_app.app_context():
+            if isinstance(e, asyncio.TimeoutError):
+                return chat_timeout_event(e)
+            return chat_failure_event(e, connection_error=isinstance(e, aiohttp.ClientConnectionError))
+
+    async def handle_chat(self, request):
+        self.stats['requests'] += 1
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        loop = asyncio.get_running_loop()
+        plan, server_timing = await loop.run_in_executor(self._planner, self._plan, request.headers.get('Cookie', ''), body)
+        if plan is None:
+            return web.json_response({'error': 'Nicht angemeldet.'}, status=401)
+        headers = chat_headers(plan)
+        if server_timing:
+            headers['Server-Timing'] = server_timing
+        if plan.json_body is not None:
+            return web.json_response(plan.json_body, status=plan.status, headers={**headers, **retry_after_header(plan.json_body)})
+        if plan.events is not None:
+            return web.Response(text=''.join(plan.events), status=plan.status, content_type='text/event-stream', headers=headers)
+        try:
+            ticket = ki_admission.enter('generation', plan.payload['model'])
+        except AdmissionRejected as e:
+            return web.json_response(e.to_dict(), status=e.status, headers={**headers, **retry_after_header(e.to_dict())})
+        try:
+            response = None
+            if not ticket.granted.is_set():
+                response = await self._prepare(request, 'text/event-stream', headers)
+                try:
+                    await self._wait_in_queue(ticket, response)
+                except AdmissionRejected as e:
+                    await response.write(sse_message(e.message).encode('utf-8'))
+                    await response.write_eof()
+                    return response
+            return await self._proxy(request, plan, headers, response)
+        finally:
+            # Auch bei Abbruch durch den Client: Platz bzw. Warteschlangenplatz freigeben.
+            ticket.release()
+
+    async def _wait_in_queue(self, ticket, response):
+        """Wie queue_events() unter WSGI, aber ohne einen Thread pro Wartendem zu belegen."""
+        while not ticket.wait(0):
+            await response.write(sse_queue_position(ticket).encode('utf-8'))
+            for _ in range(int(QUEUE_EVENT_INTERVAL / 0.05)):
+                if ticket.granted.is_set():
+                    return
+                await asyncio.sleep(0.05)
+
+    @staticmethod
+    async def _prepare(request, content_type, headers):
+        response = web.StreamResponse(headers={'Content-Type': content_type, 'Cache-Control': 'no-cache',
+                                               'X-Accel-Buffering': 'no', **headers})
+        await response.prepare(request)
+        return response
+
+    @staticmethod
+    def _backend_failure(e):
+        # Wie is_backend_failure(): 4xx liegt an der Anfrage und zählt nicht gegen das Backend.
+        return not isinstance(e, aiohttp.ClientResponseError) or e.status >= 500
+
+    async def _acquire(self, model, exclude):
+        """ki_state.acquire() im Thread-Pool: beim Kaltstart prüft es die Backends per blockierendem HTTP."""
+        future = self._planner.submit(ki_state.acquire, model, exclude)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Client weg, während der Thread noch wählt: das Lease danach trotzdem freigeben.
+            future.add_done_callback(lambda f: f.cancelled() or f.exception() or f.result() is None or f.result().release())
+            raise
+
+    async def _open_upstream(self, plan):
+        """Wie KIState.post(): scheitert ein Backend, bevor etwas weitergereicht wurde, kommt das nächste dran."""
+        tried = []
+        while True:
+            lease = await self._acquire(plan.payload['model'], list(tried))
+            upstream = None
+            try:
+                upstream = await self._session.post(f"{lease.url}{plan.stream_path}", json=plan.payload)
+                upstream.raise_for_status()
+                return upstream, lease
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                if upstream is not None:
+                    upstream.release()
+                failed = self._backend_failure(e)
+                lease.release(failed)
+                tried.append(lease.backend)
+                if not failed or len(tried) >= ki_state.attempts or len(tried) >= len(ki_state.backends):
+                    raise
+            except BaseException:
+                lease.release()
+                raise
+
+    async def _proxy(self, request, plan, headers, response=None):
+        self.stats['streams'] += 1
+        self.stats['active_streams'] += 1
+        recorder = ReplyRecorder() if plan.conversation_id is not None else None
+        lease = None
+        started_at = time.perf_counter()
+        try:
+            upstream, lease = await self._open_upstream(plan)
+            metrics.record('ki_connect', time.perf_counter() - started_at)
+            # Beim Verlassen des Blocks – auch durch Abbruch – wird die Upstream-Verbindung geschlossen.
+            async with upstream:
+                if response is None:
+                    response = await self._prepare(request, upstream.headers.get('Content-Type', 'text/event-stream'),
+                                                   headers)
+                streaming_at, first = time.perf_counter(), True
+                async for chunk in upstream.content.iter_any():
+                    if first:
+                        # Wie metrics.stream() unter WSGI
+                        metrics.record('ki_first_token', time.perf_counter() - streaming_at)
+                        first = False
+                    if recorder:
+                        recorder.feed(chunk)
+                    await response.write(chunk)
+                await response.write_eof()
+                metrics.record('ki_stream', time.perf_counter() - streaming_at)
+                return response
+        except (asyncio.CancelledError, ConnectionResetError):
+            self.stats['client_disconnects'] += 1
+            raise
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            if lease is not None:
+                lease.release(failed=self._backend_failure(e))
+            status, event = self._error_event(e)
+        finally:
+            self.stats['active_streams'] -= 1
+            if lease is not None:
+                lease.release()
+            if recorder:
+                # Nicht abwarten: der Handler kann gerade abgebrochen werden.
+                self._planner.submit(self._finish_turn, plan, recorder.text)
+
+        if response is not None:
+            # Header sind schon gesendet: Fehlermeldung als letztes Ereignis anhängen.
+            try:
+                await response.write(event.encode('utf-8'))
+                await response.write_eof()
+            except ConnectionResetError:
+                pass
+            return response
+        return web.Response(text=event, status=status, content_type='text/event-stream')
+
+
+async def start_gateway(flask_app, host='127.0.0.1', port=5001):
+    """Startet das Gateway auf der laufenden Event-Loop; gibt (runner, gateway) zurück."""
+    gateway = ChatGateway(flask_app)
+    # handler_cancellation: ein getrennter Client bricht den Handler (und damit den Upstream) sofort ab.
+    runner = web.AppRunner(gateway.make_app(), handler_cancellation=True, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, gateway
+
+
+@click.command('chat-gateway')
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', default=5001, type=int)
+def chat_gateway_command(host, port):
+    """Startet das asynchrone Chat-Gateway für /api/chat."""
+    if aiohttp is None:
+        raise click.ClickException("Für das Chat-Gateway wird aiohttp benötigt (pip install aiohttp).")
+    gateway = ChatGateway(current_app._get_current_object())
+    web.run_app(gateway.make_app(), host=host, port=port, handler_cancellation=True, access_log=None,
+                print=lambda message: click.echo(message))
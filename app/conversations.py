@@ -0,0 +1,247 @@
+# Ordner: /coldNet/app/
+# Datei: conversations.py
+
+"""
+Serverseitiger Chatverlauf und token-begrenztes Kontextfenster für /api/chat.
+
+Statt der gesamten Historie schickt der Client nur noch die neue Nachricht (plus
+conversation_id). An den KI-Server geht der System-Prompt, ggf. eine Zusammenfassung
+älterer Runden und so viele der neuesten Nachrichten, wie in CHAT_CONTEXT_TOKEN_BUDGET
+passen. Was aus dem Fenster fällt, wird nach der Antwort im Hintergrund in die
+Zusammenfassung eingearbeitet (oder nur ausgelassen, wenn CHAT_HISTORY_SUMMARY aus ist).
+"""
+
+import json
+import threading
+from collections import deque, namedtuple
+from datetime import datetime
+
+from flask import current_app
+
+from . import db, ki_admission, ki_state
+from .models import Conversation, ConversationMessage
+
+# Grobe Schätzung ohne Tokenizer: ~4 Zeichen pro Token plus Rollen-/Formatierungsaufschlag pro Nachricht.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PROMPT = ("Fasse den bisherigen Gesprächsverlauf zwischen Benutzer und coldBot knapp auf Deutsch zusammen. "
+                  "Behalte Namen, Zahlen, Entscheidungen und offene Fragen bei. Antworte nur mit der Zusammenfassung.")
+SUMMARY_TIMEOUT = 60
+
+# Ergebnis von build_context(): die Nachrichten für den KI-Server und was davon gemessen wird.
+ContextWindow = namedtuple('ContextWindow', 'messages tokens bytes window_messages dropped summarized first_id')
+
+
+def estimate_tokens(text):
+    return MESSAGE_OVERHEAD_TOKENS + (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def build_context(system_prompt, history, budget, max_messages, summary=None):
+    """
+    history: Nachrichten ältester zuerst ({'role', 'content'}, optional 'tokens' und 'id').
+    Die neueste Nachricht ist immer dabei, auch wenn sie allein das Budget übersteigt.
+    """
+    fixed = [{'role': 'system', 'content': system_prompt}]
+    if summary:
+        fixed.append({'role': 'system', 'content': f"Zusammenfassung des bisherigen Gesprächs: {summary}"})
+    used = sum(estimate_tokens(message['content']) for message in fixed)
+    window = []
+    for message in reversed(history[-max_messages:]):
+        tokens = message.get('tokens') or estimate_tokens(message['content'])
+        if window and used + tokens > budget:
+            break
+        window.append(message)
+        used += tokens
+    window.reverse()
+    messages = fixed + [{'role': message['role'], 'content': message['content']} for message in window]
+    size = len(json.dumps(messages, ensure_ascii=False).encode('utf-8'))
+    return ContextWindow(messages, used, size, len(window), len(history) - len(window), bool(summary),
+                         window[0].get('id') if window else None)
+
+
+class ContextStats:
+    """Threadsichere Zähler für die Größe der Prompts pro Runde (siehe /api/admin/chat_context)."""
+
+    def __init__(self, recent=50):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.turns = 0
+            self.prompt_tokens = 0
+            self.prompt_bytes = 0
+            self.dropped_messages = 0
+            self.summarized_turns = 0
+            self.summaries_written = 0
+            self.summary_failures = 0
+            self._recent.clear()
+
+    def record_turn(self, context, conversation_id):
+        with self._lock:
+            self.turns += 1
+            self.prompt_tokens += context.tokens
+            self.prompt_bytes += context.bytes
+            self.dropped_messages += context.dropped
+            self.summarized_turns += context.summarized
+            self._recent.append({'conversation_id': conversation_id, 'tokens': context.tokens, 'bytes': context.bytes,
+                                 'messages': context.window_messages, 'dropped': context.dropped,
+                                 'summary': context.summarized})
+
+    def record_summary(self, ok):
+        with self._lock:
+            if ok:
+                self.summaries_written += 1
+            else:
+                self.summary_failures += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'turns': self.turns,
+                'avg_prompt_tokens': round(self.prompt_tokens / self.turns, 1) if self.turns else 0.0,
+                'avg_prompt_bytes': round(self.prompt_bytes / self.turns, 1) if self.turns else 0.0,
+                'dropped_messages': self.dropped_messages,
+                'summarized_turns': self.summarized_turns,
+                'summaries_written': self.summaries_written,
+                'summary_failures': self.summary_failures,
+                'recent': list(self._recent),
+            }
+
+
+context_stats = ContextStats()
+_summarizing = set()
+_summarizing_lock = threading.Lock()
+
+
+# --- Speicher ---
+def get_conversation(user_id, conversation_id):
+    return Conversation.query.filter_by(id=conversation_id, user_id=user_id).first()
+
+
+def append_message(conversation, role, content):
+    message = ConversationMessage(conversation=conversation, role=role, content=content, tokens=estimate_tokens(content))
+    conversation.updated_at = datetime.utcnow()
+    db.session.add(message)
+    db.session.commit()
+    return message
+
+
+def start_turn(user_id, conversation_id, content):
+    """Legt bei Bedarf die Unterhaltung an und speichert die neue Benutzernachricht; None, wenn die ID fremd ist."""
+    if conversation_id is None:
+        conversation = Conversation(user_id=user_id, title=content.strip().splitlines()[0][:100] if content.strip() else None)
+        db.session.add(conversation)
+    else:
+        conversation = get_conversation(user_id, conversation_id)
+        if conversation is None:
+            return None
+    append_message(conversation, 'user', content)
+    return conversation
+
+
+def load_history(conversation, max_messages):
+    """Nur die neuesten max_messages Nachrichten nach der Zusammenfassung – die Abfrage wächst nicht mit dem Verlauf."""
+    rows = db.session.execute(
+        db.select(ConversationMessage.id, ConversationMessage.role, ConversationMessage.content, ConversationMessage.tokens)
+        .where(ConversationMessage.conversation_id == conversation.id, ConversationMessage.id > conversation.summary_until_id)
+        .order_by(ConversationMessage.id.desc()).limit(max_messages)
+    ).all()
+    return [{'id': row.id, 'role': row.role, 'content': row.content, 'tokens': row.tokens} for row in reversed(rows)]
+
+
+def finish_turn(conversation_id, reply, context=None):
+    """Speichert die Antwort von coldBot und fasst ggf. aus dem Fenster gefallene Runden im Hintergrund zusammen."""
+    conversation = db.session.get(Conversation, conversation_id)
+    if conversation is None:
+        return
+    if reply:
+        append_message(conversation, 'assistant', reply)
+    if context is not None and context.first_id is not None and current_app.config['CHAT_HISTORY_SUMMARY']:
+        has_dropped = db.session.execute(
+            db.select(ConversationMessage.id)
+            .where(ConversationMessage.conversation_id == conversation_id,
+                   ConversationMessage.id > conversation.summary_until_id,
+                   ConversationMessage.id < context.first_id).limit(1)
+        ).first()
+        if has_dropped:
+            schedule_summary(current_app._get_current_object(), conversation_id, context.first_id)
+
+
+# --- Zusammenfassung ---
+def schedule_summary(app, conversation_id, before_id):
+    with _summarizing_lock:
+        if conversation_id in _summarizing:
+            return
+        _summarizing.add(conversation_id)
+    threading.Thread(target=_summarize, args=(app, conversation_id, before_id), name='chat-summary', daemon=True).start()
+
+
+def _summarize(app, conversation_id, before_id):
+    try:
+        with app.app_context():
+            conversation = db.session.get(Conversation, conversation_id)
+            rows = conversation.messages.filter(ConversationMessage.id > conversation.summary_until_id,
+                                                ConversationMessage.id < before_id).all()
+            if not rows:
+                return
+            transcript = "\n".join(f"{'Benutzer' if row.role == 'user' else 'coldBot'}: {row.content}" for row in rows)
+            if conversation.summary:
+                transcript = f"Bisherige Zusammenfassung: {conversation.summary}\n\n{transcript}"
+            # Nie mehr als ein Budget an den KI-Server schicken; der Anfang des Transkripts ist am wenigsten wichtig.
+            transcript = transcript[-app.config['CHAT_CONTEXT_TOKEN_BUDGET'] * CHARS_PER_TOKEN:]
+            model = ki_state.get_loaded_model()
+            payload = {"model": model, "stream": False, "temperature": 0.0,
+                       "messages": [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}]}
+            with ki_admission.slot('summary', model):
+                response, lease = ki_state.post(model, '/api/chat', json=payload, timeout=SUMMARY_TIMEOUT)
+                lease.release()
+            summary = response.json().get('message', {}).get('content', '').strip()
+            if not summary:
+                raise ValueError("leere Zusammenfassung")
+            conversation.summary = summary[:app.config['CHAT_SUMMARY_MAX_CHARS']]
+            conversation.summary_until_id = rows[-1].id
+            db.session.commit()
+            context_stats.record_summary(True)
+    except Exception as e:
+        # Ohne Zusammenfassung fallen die alten Runden einfach aus dem Fenster.
+        context_stats.record_summary(False)
+        app.logger.warning(f"Zusammenfassung für Unterhaltung {conversation_id} fehlgeschlagen: {e}")
+    finally:
+        with _summarizing_lock:
+            _summarizing.discard(conversation_id)
+
+
+# --- Mitlesen der gestreamten Antwort ---
+class ReplyRecorder:
+    """Setzt aus den weitergereichten SSE-Chunks des KI-Servers den Antworttext für den Verlauf zusammen."""
+
+    def __init__(self):
+        self._buffer = b''
+        self._parts = []
+
+    def feed(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        lines = (self._buffer + chunk).split(b'\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            self._parse(line)
+
+    def _parse(self, line):
+        if not line.startswith(b'data:'):
+            return
+        try:
+            content = json.loads(line[5:]).get('message', {}).get('content')
+        except (ValueError, AttributeError):
+            return
+        if content:
+            self._parts.append(content)
+
+    @property
+    def text(self):
+        if self._buffer:
+            self._parse(self._buffer)
+            self._buffer = b''
+        return ''.join(self._parts).strip()
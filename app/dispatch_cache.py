@@ -0,0 +1,146 @@
+# Ordner: /coldNet/app/
+# Datei: dispatch_cache.py
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from .intent import normalize_message
+
+# Geschätzter Platzbedarf eines Eintrags zusätzlich zu Schlüssel und Entscheidung (Tupel, OrderedDict-Knoten)
+ENTRY_OVERHEAD = 200
+
+
+def normalize_dispatch_key(text):
+    """'Welche  Notizen habe ich?' und 'welche notizen habe ich' ergeben denselben Schlüssel."""
+    return ' '.join(normalize_message(text).split()).rstrip(' ?!.')
+
+
+def registry_version(tool_system_prompt):
+    """Kurzer Fingerabdruck des Dispatcher-Prompts: ändert sich ein Werkzeug, ändert sich der Schlüssel."""
+    return hashlib.sha1(tool_system_prompt.encode('utf-8')).hexdigest()[:12]
+
+
+class DispatchCache:
+    """
+    Zwischenspeicher für Entscheidungen des LLM-Dispatchers.
+
+    Schlüssel ist die normalisierte Nachricht plus geladenes Modell und Version der
+    Werkzeug-Registry; gespeichert wird nur die Entscheidung ({"tool_name", "arguments"} bzw.
+    {"tool_calls": [...]}), das Werkzeug selbst läuft bei jedem Treffer erneut. Verdrängt wird nach LRU, sobald
+    die maximale Anzahl oder der geschätzte Speicherbedarf überschritten ist, und nach
+    Ablauf der TTL. Da der Schlüssel normalisiert ist, gilt ein Treffer nur, wenn alle
+    Text-Argumente wörtlich in der aktuellen Nachricht vorkommen – sonst würde z.B. ein
+    Notiztitel aus einer anders geschriebenen Nachricht übernommen.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # Schlüssel -> (Entscheidung, Größe, Ablaufzeit)
+        self._bytes = 0
+        self.enabled = True
+        self.max_entries = 2048
+        self.max_bytes = 2 * 1024 * 1024
+        self.ttl = 3600
+        self._reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DISPATCH_CACHE_ENABLED', self.enabled)
+        app.config.setdefault('DISPATCH_CACHE_MAX_ENTRIES', self.max_entries)
+        app.config.setdefault('DISPATCH_CACHE_MAX_BYTES', self.max_bytes)
+        app.config.setdefault('DISPATCH_CACHE_TTL', self.ttl)
+        self.enabled = app.config['DISPATCH_CACHE_ENABLED']
+        self.max_entries = app.config['DISPATCH_CACHE_MAX_ENTRIES']
+        self.max_bytes = app.config['DISPATCH_CACHE_MAX_BYTES']
+        self.ttl = app.config['DISPATCH_CACHE_TTL']
+        self.clear()
+        with self._lock:
+            self._reset_stats()
+        app.extensions['dispatch_cache'] = self
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.argument_mismatches = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _arguments_match(decision, message):
+        calls = decision.get('tool_calls') or [decision]
+        return all(value in message for call in calls for value in call.get('arguments', {}).values() if isinstance(value, str))
+
+    def get(self, message, model, version):
+        if not self.enabled:
+            return None
+        key = (normalize_dispatch_key(message), model, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            decision, size, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self._bytes -= size
+                self.expired += 1
+                self.misses += 1
+                return None
+            if not self._arguments_match(decision, message):
+                self.argument_mismatches += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Kopie: der Aufrufer darf die Argumente verändern, ohne den Eintrag zu beschädigen.
+        return json.loads(json.dumps(decision))
+
+    def put(self, message, model, version, decision):
+        if not self.enabled:
+            return
+        key = (normalize_dispatch_key(message), model, version)
+        size = len(key[0]) + len(json.dumps(decision, ensure_ascii=False)) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (decision, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evicted += 1
+
+    def clear(self):
+        """Nach dem Laden eines Modells oder einer Änderung der Werkzeuge."""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def to_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'argument_mismatches': self.argument_mismatches,
+                'invalidations': self.invalidations,
+            }
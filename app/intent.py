@@ -0,0 +1,118 @@
+# Ordner: /coldNet/app/
+# Datei: intent.py
+
+import re
+from dataclasses import dataclass, field
+
+# Eindeutiger Small Talk, für den kein Werkzeug in Frage kommt.
+# Die Muster sind verankert: nur wenn die GESAMTE Nachricht Small Talk ist, greift der Fast-Path.
+SMALL_TALK_INTENTS = [
+    {"pattern": r"^(?:hallo|hi|hey|moin|servus|grüß dich|gruss dich|guten (?:morgen|tag|abend))(?: coldbot)?[\s!.,]*$", "confidence": 0.97},
+    {"pattern": r"^(?:danke|vielen dank|danke schön|dankeschön|merci|super,? danke)(?: dir)?[\s!.,]*$", "confidence": 0.97},
+    {"pattern": r"^(?:tschüss|tschüs|ciao|bis bald|bis später|gute nacht)[\s!.,]*$", "confidence": 0.97},
+    {"pattern": r"^wie geht(?:'s| es)(?: dir)?[\s?!.]*$", "confidence": 0.95},
+    {"pattern": r"^(?:ok|okay|alles klar|gut|cool|super)[\s!.,]*$", "confidence": 0.9},
+]
+
+# Abzug, wenn die Nachricht nach mehreren Aufträgen aussieht ("... und zeig mir dann ...").
+COMPOUND_PENALTY = 0.25
+COMPOUND_PATTERN = re.compile(r"\b(?:und dann|und danach|danach|außerdem|und zeig|und lösch|und such)\b|\d+\s*(?:,|und)\s*\d+")
+MAX_TITLE_LENGTH = 60
+
+
+@dataclass
+class IntentMatch:
+    tool_name: str
+    arguments: dict = field(default_factory=dict)
+    confidence: float = 0.0
+
+
+def _clean(text):
+    """Leerzeichen vereinheitlichen (Zeilenumbrüche bleiben für Notizinhalte erhalten) und Anführungszeichen angleichen."""
+    text = text.strip().replace('’', "'").replace('„', '"').replace('“', '"')
+    return re.sub(r'[ \t]+', ' ', text)
+
+
+def normalize_message(text):
+    return _clean(text).lower()
+
+
+def _short_title(text):
+    first_line = text.strip().splitlines()[0] if text.strip() else ''
+    if len(first_line) <= MAX_TITLE_LENGTH:
+        return first_line
+    return first_line[:MAX_TITLE_LENGTH].rsplit(' ', 1)[0] + '...'
+
+
+class IntentClassifier:
+    """
+    Deterministischer Vor-Dispatcher für /api/chat.
+
+    Jedes Werkzeug in der Registry kann unter "intents" Regex-Muster mit einer
+    Konfidenz hinterlegen. Benannte Gruppen im Muster werden zu Argumenten und
+    anhand des Parametertyps aus der Registry konvertiert. Nur wenn ein Treffer
+    die Schwelle erreicht, wird der LLM-Dispatcher übersprungen.
+    """
+
+    def __init__(self, tools, small_talk=SMALL_TALK_INTENTS):
+        self._rules = []
+        for tool_name, tool_data in tools.items():
+            param_types = {p['name']: p.get('type') for p in tool_data.get('parameters', [])}
+            for intent in tool_data.get('intents', []):
+                self._rules.append((tool_name, re.compile(intent['pattern'], re.IGNORECASE | re.DOTALL), intent, param_types))
+        for intent in small_talk:
+            self._rules.append(('none', re.compile(intent['pattern'], re.IGNORECASE | re.DOTALL), intent, {}))
+
+    @staticmethod
+    def _convert(value, param_type):
+        value = value.strip()
+        if param_type == 'integer':
+            return int(value)
+        return value
+
+    def _build_arguments(self, match, intent, param_types):
+        arguments = {}
+        for name, value in match.groupdict().items():
+            if value is None or name not in param_types:
+                continue
+            arguments[name] = self._convert(value, param_types[name])
+            if arguments[name] == '':
+                return None
+        for target, source in intent.get('derive', {}).items():
+            if target not in arguments and source in arguments:
+                arguments[target] = _short_title(arguments[source])
+        arguments.update({k: v for k, v in intent.get('defaults', {}).items() if k not in arguments})
+        return arguments
+
+    def candidates(self, message):
+        """Alle Treffer, absteigend nach Konfidenz."""
+        # Die Muster sind case-insensitive, die Argumente behalten so die Originalschreibweise.
+        cleaned = _clean(message)
+        found = []
+        for tool_name, regex, intent, param_types in self._rules:
+            match = regex.search(cleaned)
+            if not match:
+                continue
+            try:
+                arguments = self._build_arguments(match, intent, param_types)
+            except ValueError:
+                continue
+            if arguments is None:
+                continue
+            found.append(IntentMatch(tool_name, arguments, intent['confidence']))
+        found.sort(key=lambda m: m.confidence, reverse=True)
+        return found
+
+    def classify(self, message):
+        """Liefert den besten Treffer (mit bereinigter Konfidenz) oder None."""
+        found = self.candidates(message)
+        if not found:
+            return None
+        best = found[0]
+        confidence = best.confidence
+        # Konkurrierende Werkzeuge mit ähnlicher Konfidenz machen die Entscheidung unsicher.
+        if any(m.tool_name != best.tool_name and m.confidence >= confidence - 0.1 for m in found[1:]):
+            confidence -= 0.3
+        if COMPOUND_PATTERN.search(normalize_message(message)):
+            confidence -= COMPOUND_PENALTY
+        return IntentMatch(best.tool_name, best.arguments, round(max(confidence, 0.0), 3))
@@ -0,0 +1,251 @@
+# Ordner: /coldNet/app/
+# Datei: ki_admission.py
+
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Kleinere Zahl = höhere Priorität. Generierungen dürfen nicht alle Plätze belegen,
+# damit kurze Dispatcher-Aufrufe nie hinter minutenlangen Antworten warten.
+DEFAULT_LANES = {
+    'dispatcher': {'priority': 0, 'limit': 4, 'max_queue': 32, 'max_wait': 10},
+    'generation': {'priority': 1, 'limit': 3, 'max_queue': 32, 'max_wait': 120},
+    # Zusammenfassungen alter Chatrunden laufen im Hintergrund und dürfen warten.
+    'summary': {'priority': 2, 'limit': 1, 'max_queue': 16, 'max_wait': 60},
+}
+
+
+class AdmissionRejected(Exception):
+    """Anfrage wird abgewiesen: 429 (Warteschlange voll) oder 503 (Wartezeit überschritten)."""
+
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+    def to_dict(self):
+        return {'error': self.message, 'retry_after': self.retry_after}
+
+
+class Ticket:
+    """Platz in der Warteschlange eines Modells; nach dem Aufruf mit release() wieder freigeben."""
+
+    def __init__(self, admission, model, lane, priority, seq):
+        self._admission = admission
+        self.model = model
+        self.lane = lane
+        self.sort_key = (priority, seq)
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+        self.granted = threading.Event()
+        self.released = False
+
+    @property
+    def position(self):
+        """1 = als Nächstes dran (innerhalb der eigenen Spur), 0 = bereits zugelassen."""
+        return self._admission.position(self)
+
+    def wait(self, timeout=None):
+        """
+        Wartet höchstens `timeout` Sekunden auf die Zulassung und gibt zurück, ob sie erfolgt ist.
+        Nach Ablauf von max_wait der Spur wird das Ticket entfernt und AdmissionRejected (503) geworfen.
+        """
+        return self._admission.wait(self, timeout)
+
+    def release(self):
+        self._admission.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _ModelQueue:
+    def __init__(self, lanes):
+        self.waiting = []          # Tickets, sortiert nach (Priorität, Ankunft)
+        self.active = {lane: 0 for lane in lanes}
+        self.total = 0
+
+
+class KIAdmission:
+    """
+    Zulassungssteuerung vor allen Aufrufen an den KI-Server.
+
+    Pro Modell dürfen höchstens KI_ADMISSION_MAX_ACTIVE Aufrufe gleichzeitig laufen, jede
+    Spur (Dispatcher, Generierung) zusätzlich nur bis zu ihrem eigenen Limit. Wird ein Platz
+    frei, kommt das wartende Ticket mit der höchsten Priorität dran, innerhalb einer Priorität
+    in Ankunftsreihenfolge. Ist eine Warteschlange voll oder wartet ihr ältestes Ticket schon
+    länger als max_wait, wird sofort mit 429 bzw. 503 abgewiesen statt alle Anfragen
+    gemeinsam in den Timeout laufen zu lassen.
+
+    Die Limits gelten pro Prozess: bei mehreren gunicorn-Workern (und dem Chat-Gateway)
+    KI_ADMISSION_MAX_ACTIVE entsprechend aufteilen.
+    """
+
+    def __init__(self, app=None):
+        self._cond = threading.Condition()
+        self._queues = {}          # Modell -> _ModelQueue
+        self._seq = itertools.count()
+        self.enabled = True
+        self.max_active = 4
+        self.lanes = DEFAULT_LANES
+        self._reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('KI_ADMISSION_ENABLED', self.enabled)
+        app.config.setdefault('KI_ADMISSION_MAX_ACTIVE', self.max_active)
+        app.config.setdefault('KI_ADMISSION_LANES', {})
+        self.enabled = app.config['KI_ADMISSION_ENABLED']
+        self.max_active = app.config['KI_ADMISSION_MAX_ACTIVE']
+        self.lanes = {lane: {**config, **app.config['KI_ADMISSION_LANES'].get(lane, {})}
+                      for lane, config in DEFAULT_LANES.items()}
+        with self._cond:
+            self._queues = {}
+            self._reset_stats()
+        app.extensions['ki_admission'] = self
+
+    def _reset_stats(self):
+        self.stats = {lane: {'admitted': 0, 'queued': 0, 'rejected_full': 0, 'rejected_wait': 0, 'cancelled': 0,
+                             'wait_seconds': 0.0, 'hold_avg': 0.0} for lane in DEFAULT_LANES}
+
+    # --- Interne Helfer (nur unter self._cond aufrufen) ---
+    def _queue(self, model):
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = _ModelQueue(self.lanes)
+        return queue
+
+    def _dispatch(self, queue):
+        """Vergibt freie Plätze in Prioritätsreihenfolge; eine volle Spur blockiert die anderen nicht."""
+        now = time.monotonic()
+        for ticket in list(queue.waiting):
+            if queue.total >= self.max_active:
+                break
+            if queue.active[ticket.lane] >= self.lanes[ticket.lane]['limit']:
+                continue
+            queue.waiting.remove(ticket)
+            queue.active[ticket.lane] += 1
+            queue.total += 1
+            ticket.granted_at = now
+            self.stats[ticket.lane]['admitted'] += 1
+            self.stats[ticket.lane]['wait_seconds'] += now - ticket.enqueued_at
+            ticket.granted.set()
+
+    def _retry_after(self, queue, lane):
+        """Grobe Schätzung in Sekunden: wartende Tickets der Spur x mittlere Belegungsdauer / Limit."""
+        waiting = sum(1 for ticket in queue.waiting if ticket.lane == lane) + 1
+        hold = self.stats[lane]['hold_avg'] or 1.0
+        return max(1, math.ceil(waiting * hold / self.lanes[lane]['limit']))
+
+    # --- Öffentliche API ---
+    def enter(self, lane, model):
+        """Reiht eine Anfrage ein (oder lässt sie sofort zu) und gibt das Ticket zurück."""
+        config = self.lanes[lane]
+        ticket = Ticket(self, model, lane, config['priority'], next(self._seq))
+        if not self.enabled:
+            ticket.released = True     # release() ist dann ein No-op
+            ticket.granted.set()
+            return ticket
+        with self._cond:
+            queue = self._queue(model)
+            waiting = [t for t in queue.waiting if t.lane == lane]
+            if len(waiting) >= config['max_queue']:
+                self.stats[lane]['rejected_full'] += 1
+                raise AdmissionRejected(429, "Der KI-Server ist gerade ausgelastet. Bitte versuche es gleich noch einmal.",
+                                        self._retry_after(queue, lane))
+            if waiting and ticket.enqueued_at - waiting[0].enqueued_at > config['max_wait']:
+                # Die Spur kommt nicht voran: sofort abweisen, statt ein weiteres Ticket ins Leere warten zu lassen.
+                self.stats[lane]['rejected_wait'] += 1
+                raise AdmissionRejected(503, "Der KI-Server kommt gerade nicht hinterher. Bitte versuche es in einem Moment erneut.",
+                                        self._retry_after(queue, lane))
+            queue.waiting.append(ticket)
+            queue.waiting.sort(key=lambda t: t.sort_key)
+            self._dispatch(queue)
+            if not ticket.granted.is_set():
+                self.stats[lane]['queued'] += 1
+        return ticket
+
+    def try_enter(self, lane, model):
+        """Nur zulassen, wenn sofort ein Platz frei ist (z.B. für spekulative Generierung); sonst None."""
+        if not self.enabled:
+            return self.enter(lane, model)
+        with self._cond:
+            queue = self._queue(model)
+            if queue.total >= self.max_active or queue.active[lane] >= self.lanes[lane]['limit'] \
+                    or any(t.lane == lane for t in queue.waiting):
+                return None
+            return self.enter(lane, model)
+
+    def wait(self, ticket, timeout=None):
+        deadline = ticket.enqueued_at + self.lanes[ticket.lane]['max_wait']
+        remaining = deadline - time.monotonic()
+        if ticket.granted.wait(remaining if timeout is None else max(0, min(timeout, remaining))):
+            return True
+        with self._cond:
+            if ticket.granted.is_set():
+                return True
+            if time.monotonic() < deadline:
+                return False
+            queue = self._queue(ticket.model)
+            if ticket in queue.waiting:
+                queue.waiting.remove(ticket)
+            ticket.released = True
+            self.stats[ticket.lane]['rejected_wait'] += 1
+            raise AdmissionRejected(503, "Der KI-Server ist gerade ausgelastet, die Wartezeit wurde überschritten. "
+                                         "Bitte versuche es in einem Moment erneut.", self._retry_after(queue, ticket.lane))
+
+    @contextmanager
+    def slot(self, lane, model):
+        """Blockierend: einreihen, auf den Platz warten, nach dem Block freigeben."""
+        ticket = self.enter(lane, model)
+        try:
+            ticket.wait()
+            yield ticket
+        finally:
+            ticket.release()
+
+    def release(self, ticket):
+        """Gibt den Platz frei bzw. nimmt ein noch wartendes Ticket aus der Schlange. Mehrfacher Aufruf ist harmlos."""
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            queue = self._queue(ticket.model)
+            stats = self.stats[ticket.lane]
+            if ticket.granted.is_set():
+                queue.active[ticket.lane] -= 1
+                queue.total -= 1
+                held = time.monotonic() - ticket.granted_at
+                stats['hold_avg'] = held if not stats['hold_avg'] else 0.8 * stats['hold_avg'] + 0.2 * held
+            else:
+                queue.waiting.remove(ticket)
+                stats['cancelled'] += 1
+            self._dispatch(queue)
+
+    def position(self, ticket):
+        with self._cond:
+            if ticket.granted.is_set():
+                return 0
+            waiting = self._queues.get(ticket.model)
+            ahead = [t for t in waiting.waiting if t.lane == ticket.lane] if waiting else []
+            return ahead.index(ticket) + 1 if ticket in ahead else 0
+
+    def to_dict(self):
+        with self._cond:
+            return {
+                'enabled': self.enabled,
+                'max_active': self.max_active,
+                'lanes': self.lanes,
+                'models': {model: {'active': dict(queue.active), 'waiting': {lane: sum(1 for t in queue.waiting if t.lane == lane)
+                                                                             for lane in self.lanes}}
+                           for model, queue in self._queues.items()},
+                'stats': {lane: {**stats, 'wait_seconds': round(stats['wait_seconds'], 3), 'hold_avg': round(stats['hold_avg'], 3)}
+                          for lane, stats in self.stats.items()},
+            }
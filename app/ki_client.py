@@ -0,0 +1,96 @@
+# Ordner: /coldNet/app/
+# Datei: ki_client.py
+
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class KIClient:
+    """
+    Gemeinsame HTTP-Schicht für den gesamten Verkehr zum KI-Server.
+
+    Pro KI-Endpunkt (Schema + Host + Port) gibt es genau einen Connection-Pool,
+    der von allen Threads geteilt wird. Jeder Thread bekommt eine eigene
+    requests.Session, die diesen Pool einbindet – so bleiben die Verbindungen
+    per Keep-Alive offen, ohne dass sich Threads eine Session teilen müssen.
+    """
+
+    def __init__(self, app=None, pool_size=10, retries=2, backoff=0.2):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self._adapters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('KI_POOL_SIZE', self.pool_size)
+        app.config.setdefault('KI_POOL_RETRIES', self.retries)
+        app.config.setdefault('KI_POOL_BACKOFF', self.backoff)
+        self.pool_size = app.config['KI_POOL_SIZE']
+        self.retries = app.config['KI_POOL_RETRIES']
+        self.backoff = app.config['KI_POOL_BACKOFF']
+        app.extensions['ki_client'] = self
+
+    # --- Interne Helfer ---
+    @staticmethod
+    def _endpoint(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _get_adapter(self, endpoint, retry):
+        key = (endpoint, retry)
+        adapter = self._adapters.get(key)
+        if adapter is None:
+            with self._lock:
+                adapter = self._adapters.get(key)
+                if adapter is None:
+                    # Verbindungsfehler werden für alle Methoden wiederholt (die Anfrage
+                    # wurde dann nie gesendet), Lese-Fehler nur bei idempotenten Methoden.
+                    # Gesundheitsprüfungen laufen ohne Wiederholung, damit ein toter
+                    # Server nicht mehrfach den vollen Timeout kostet.
+                    max_retries = Retry(
+                        total=self.retries, connect=self.retries, read=self.retries, status=0,
+                        backoff_factor=self.backoff, allowed_methods=frozenset({'GET', 'HEAD'}),
+                        raise_on_status=False
+                    ) if retry else Retry(0, read=False)
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                                          max_retries=max_retries, pool_block=False)
+                    self._adapters[key] = adapter
+        return adapter
+
+    def _session(self, url, retry):
+        endpoint = self._endpoint(url)
+        sessions = getattr(self._local, 'sessions', None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        session = sessions.get((endpoint, retry))
+        if session is None:
+            session = requests.Session()
+            session.mount(f"{endpoint}/", self._get_adapter(endpoint, retry))
+            sessions[(endpoint, retry)] = session
+        return session
+
+    # --- Öffentliche API (Signatur wie requests.get/post) ---
+    def request(self, method, url, retry=True, **kwargs):
+        return self._session(url, retry).request(method, url, **kwargs)
+
+    def get(self, url, retry=True, **kwargs):
+        return self.request('GET', url, retry=retry, **kwargs)
+
+    def post(self, url, retry=True, **kwargs):
+        return self.request('POST', url, retry=retry, **kwargs)
+
+    def close(self):
+        """Schließt alle Pools, z.B. beim Herunterfahren oder in Benchmarks."""
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._adapters.clear()
+        self._local = threading.local()
@@ -0,0 +1,362 @@
+# Ordner: /coldNet/app/
+# Datei: ki_state.py
+
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .ki_client import KIClient
+
+logger = logging.getLogger(__name__)
+
+
+def is_backend_failure(error):
+    """Verbindungsfehler, Timeouts und 5xx zählen gegen ein Backend; 4xx liegt an der Anfrage, nicht am Server."""
+    if error is None:
+        return False
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is None or error.response.status_code >= 500
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+class KIBackend:
+    """Ein KI-Server im Pool: letzter Health-Check, ausstehende Anfragen und Zustand des Circuit Breakers."""
+
+    def __init__(self, url, name=None, fallback=False):
+        self.url = url.rstrip('/')
+        self.name = name or self.url
+        # Fallback-Backends (z.B. der öffentliche Zugang zum lokalen Server) nur, wenn kein anderes verfügbar ist.
+        self.fallback = fallback
+        self.healthy = False
+        self.health = {}
+        self.models = []
+        self.error = None
+        self.updated_at = None
+        self.outstanding = 0
+        # Circuit Breaker: 'closed' -> nach N Fehlern in Folge 'open' -> nach der Abkühlzeit eine Probeanfrage ('half_open')
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.latency_avg = None
+        self.requests = 0
+        self.errors = 0
+        self.trips = 0
+
+    @property
+    def loaded_model(self):
+        return self.health.get('loaded_model_name')
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'url': self.url,
+            'fallback': self.fallback,
+            'healthy': self.healthy,
+            'loaded_model': self.loaded_model,
+            'error': self.error,
+            'updated_at': self.updated_at,
+            'outstanding': self.outstanding,
+            'breaker': self.state,
+            'consecutive_failures': self.failures,
+            'latency_avg': round(self.latency_avg, 4) if self.latency_avg is not None else None,
+            'requests': self.requests,
+            'errors': self.errors,
+            'trips': self.trips,
+        }
+
+
+class KILease:
+    """Eine ausstehende Anfrage an ein Backend; release() ist idempotent (wie Ticket.release)."""
+
+    def __init__(self, state, backend):
+        self._state = state
+        self.backend = backend
+        self.started_at = time.monotonic()
+        self.released = False
+
+    @property
+    def url(self):
+        return self.backend.url
+
+    def release(self, failed=False):
+        self._state.release(self, failed)
+
+
+class KIState:
+    """
+    Prozessweiter Zustand des KI-Backend-Pools.
+
+    Ein Hintergrund-Thread prüft alle Backends aus KI_BACKENDS parallel (/health, /models)
+    und merkt sich pro Backend das geladene Modell. acquire() wählt für jede Anfrage ein
+    Backend: verfügbar (erreichbar, Circuit Breaker nicht offen), bevorzugt mit dem
+    angefragten Modell bereits geladen, darunter das mit den wenigsten ausstehenden
+    Anfragen (bei Gleichstand das bisher schnellere). release() zählt Erfolg bzw.
+    Fehler für den Circuit Breaker; post() wiederholt eine Anfrage, die an einem Backend
+    scheitert, auf einem anderen. Request-Handler lösen selbst keine Health-Checks aus.
+    """
+
+    def __init__(self, client: KIClient, app=None):
+        self.client = client
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._refreshed = False
+        self._executor = None
+        self.backends = []
+        self.interval = 15
+        self.probe_timeout = 1
+        self.background = True
+        self.breaker_failures = 3
+        self.breaker_cooldown = 30
+        self.attempts = 2
+        self.models = []
+        self.updated_at = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('KI_STATE_REFRESH_INTERVAL', self.interval)
+        app.config.setdefault('KI_STATE_PROBE_TIMEOUT', self.probe_timeout)
+        app.config.setdefault('KI_STATE_BACKGROUND', self.background)
+        app.config.setdefault('KI_BREAKER_FAILURES', self.breaker_failures)
+        app.config.setdefault('KI_BREAKER_COOLDOWN', self.breaker_cooldown)
+        app.config.setdefault('KI_BACKEND_ATTEMPTS', self.attempts)
+        # Ohne KI_BACKENDS wie bisher: lokaler Server, der öffentliche Zugang nur als Fallback.
+        entries = app.config.get('KI_BACKENDS') or [
+            {'url': app.config['KI_SERVER_URL_LOCAL'], 'name': 'local'},
+            {'url': app.config['KI_SERVER_URL_PUBLIC'], 'name': 'public', 'fallback': True},
+        ]
+        backends = {}
+        for entry in entries:
+            backend = KIBackend(**entry) if isinstance(entry, dict) else KIBackend(entry)
+            backends.setdefault(backend.url, backend)
+        with self._lock:
+            self.backends = list(backends.values())
+            self.models = []
+            self._refreshed = False
+        self.interval = app.config['KI_STATE_REFRESH_INTERVAL']
+        self.probe_timeout = app.config['KI_STATE_PROBE_TIMEOUT']
+        self.background = app.config['KI_STATE_BACKGROUND']
+        self.breaker_failures = app.config['KI_BREAKER_FAILURES']
+        self.breaker_cooldown = app.config['KI_BREAKER_COOLDOWN']
+        self.attempts = app.config['KI_BACKEND_ATTEMPTS']
+        app.extensions['ki_state'] = self
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ki-probe')
+        return self._executor
+
+    # --- Aktualisierung ---
+    def _probe(self, url):
+        health_response = self.client.get(f"{url}/health", timeout=self.probe_timeout, retry=False)
+        health_response.raise_for_status()
+        health = health_response.json()
+        try:
+            models_response = self.client.get(f"{url}/models", timeout=self.probe_timeout * 5)
+            models_response.raise_for_status()
+            models = models_response.json().get('models', [])
+        except (requests.exceptions.RequestException, ValueError):
+            models = None
+        return health, models
+
+    def _probe_backend(self, backend):
+        try:
+            return self._probe(backend.url) + (None,)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return None, None, e
+
+    def refresh(self):
+        """Prüft alle Backends parallel; ein langsames oder ausgefallenes Backend hält die anderen nicht auf."""
+        backends = list(self.backends)
+        results = list(self._pool().map(self._probe_backend, backends))
+        now = time.time()
+        with self._lock:
+            for backend, (health, models, error) in zip(backends, results):
+                backend.updated_at = now
+                if error is not None:
+                    backend.healthy, backend.health, backend.error = False, {}, str(error)
+                    continue
+                backend.healthy, backend.health, backend.error = True, health, None
+                if models is not None:
+                    backend.models = models
+            # Modellliste für die Admin-Seite: Vereinigung aller Backends, Reihenfolge wie konfiguriert.
+            seen = {}
+            for backend in backends:
+                for model in backend.models:
+                    seen.setdefault(model.get('name') if isinstance(model, dict) else model, model)
+            self.models = list(seen.values())
+            self.updated_at, self._refreshed = now, True
+
+    def invalidate(self):
+        """Erzwingt eine sofortige Aktualisierung im Hintergrund, z.B. nach einem Verbindungsfehler."""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Fehler beim Aktualisieren des KI-Zustands: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def _ensure_ready(self):
+        if self.background and self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='ki-state-refresher', daemon=True)
+                    self._thread.start()
+        if not self._refreshed:
+            # Kaltstart: nur der allererste Zugriff wartet einmalig auf eine Prüfung.
+            self.refresh()
+
+    # --- Auswahl (nur unter self._lock aufrufen) ---
+    def _available(self, backend, now):
+        if not backend.healthy:
+            return False
+        if backend.state == 'open':
+            return now - backend.opened_at >= self.breaker_cooldown
+        # half_open: die Probeanfrage läuft noch, bis dahin keine weiteren Anfragen
+        return backend.state == 'closed'
+
+    def _choose(self, model=None, exclude=()):
+        now = time.monotonic()
+        backends = [backend for backend in self.backends if backend not in exclude]
+        if not backends:
+            return None
+        available = [backend for backend in backends if self._available(backend, now)]
+        candidates = [backend for backend in available if not backend.fallback] or available
+        if model:
+            candidates = [backend for backend in candidates if backend.loaded_model == model] or candidates
+        if not candidates:
+            # Letzter Ausweg wie früher: lieber ein vermutlich ausgefallenes Backend versuchen als gar keins.
+            candidates = sorted(backends, key=lambda backend: (backend.fallback, backend.opened_at or 0))[:1]
+        # min() ist stabil: bei Gleichstand gewinnt das zuerst konfigurierte Backend.
+        return min(candidates, key=lambda backend: (backend.outstanding, backend.latency_avg or 0.0))
+
+    # --- Öffentliche API ---
+    def acquire(self, model=None, exclude=()):
+        """
+        Wählt ein Backend und zählt die Anfrage als ausstehend; das Lease danach immer freigeben.
+        None nur, wenn außer den ausgeschlossenen Backends keines konfiguriert ist.
+        """
+        self._ensure_ready()
+        with self._lock:
+            backend = self._choose(model, exclude)
+            if backend is None:
+                return None
+            if backend.state == 'open':
+                backend.state = 'half_open'
+            backend.outstanding += 1
+            backend.requests += 1
+        return KILease(self, backend)
+
+    def release(self, lease, failed=False):
+        with self._lock:
+            if lease.released:
+                return
+            lease.released = True
+            backend = lease.backend
+            elapsed = time.monotonic() - lease.started_at
+            backend.outstanding -= 1
+            if not failed:
+                backend.latency_avg = elapsed if backend.latency_avg is None else 0.8 * backend.latency_avg + 0.2 * elapsed
+                # Eine verspätete Erfolgsmeldung von vor dem Öffnen schließt den Breaker nicht.
+                if backend.state != 'open':
+                    backend.state, backend.failures = 'closed', 0
+                return
+            backend.errors += 1
+            backend.failures += 1
+            if backend.state == 'half_open' or backend.failures >= self.breaker_failures:
+                if backend.state != 'open':
+                    backend.trips += 1
+                    logger.warning(f"KI-Backend {backend.name} nach {backend.failures} Fehlern gesperrt")
+                backend.state, backend.opened_at = 'open', time.monotonic()
+
+    def post(self, model, path, **kwargs):
+        """
+        POST an ein Backend aus dem Pool; gibt (Antwort, Lease) zurück, das Lease gibt der Aufrufer frei
+        (bei Streams erst nach dem letzten Chunk). Scheitert die Anfrage an einem Backend (Verbindung,
+        Timeout, 5xx), wird sie auf einem anderen wiederholt, höchstens KI_BACKEND_ATTEMPTS Versuche.
+        """
+        tried, error = [], None
+        while True:
+            lease = self.acquire(model, exclude=tried)
+            if lease is None:
+                raise error or LookupError("Kein KI-Backend konfiguriert")
+            response = None
+            try:
+                response = self.client.post(f"{lease.url}{path}", **kwargs)
+                response.raise_for_status()
+                return response, lease
+            except requests.exceptions.RequestException as e:
+                if response is not None:
+                    response.close()
+                failed = is_backend_failure(e)
+                lease.release(failed)
+                tried.append(lease.backend)
+                if not failed or len(tried) >= self.attempts:
+                    raise
+                error = e
+                logger.warning(f"KI-Backend {lease.backend.name} fehlgeschlagen, neuer Versuch: {e}")
+            except BaseException:
+                lease.release()
+                raise
+
+    def load_model(self, model, target='all', timeout=300):
+        """Lädt das Modell auf einem Backend (Name oder URL) oder parallel auf allen; gibt die Ergebnisse pro Backend zurück."""
+        backends = [backend for backend in self.backends if target in ('all', backend.name, backend.url)]
+
+        def load(backend):
+            try:
+                response = self.client.post(f"{backend.url}/load_model", json={'model': model}, timeout=timeout)
+                response.raise_for_status()
+                return {'backend': backend.name, 'ok': True, 'message': response.json().get('message')}
+            except (requests.exceptions.RequestException, ValueError) as e:
+                return {'backend': backend.name, 'ok': False, 'error': str(e)}
+        results = list(self._pool().map(load, backends))
+        self.refresh()
+        return results
+
+    # --- Lesender Zugriff für die Routen ---
+    def snapshot(self):
+        self._ensure_ready()
+        with self._lock:
+            backend = self._choose(self._loaded_model())
+            available = self._available(backend, time.monotonic())
+            return {
+                'active_url': backend.url,
+                'healthy': available,
+                'health': dict(backend.health),
+                'loaded_model': backend.loaded_model,
+                'models': list(self.models),
+                'error': None if available else "; ".join(f"{b.name}: {b.error or b.state}" for b in self.backends),
+                'updated_at': self.updated_at,
+                'backends': [b.to_dict() for b in self.backends],
+            }
+
+    def get_active_url(self):
+        """Backend, das die nächste Anfrage bekäme (ohne sie zu zählen)."""
+        self._ensure_ready()
+        with self._lock:
+            return self._choose(self._loaded_model()).url
+
+    def _loaded_model(self):
+        now = time.monotonic()
+        available = [backend for backend in self.backends if self._available(backend, now) and backend.loaded_model]
+        available = [backend for backend in available if not backend.fallback] or available
+        if not available:
+            return None
+        # Das auf den meisten Backends geladene Modell; bei Gleichstand das des zuerst konfigurierten.
+        counts = Counter(backend.loaded_model for backend in available)
+        return max(available, key=lambda backend: counts[backend.loaded_model]).loaded_model
+
+    def get_loaded_model(self):
+        self._ensure_ready()
+        with self._lock:
+            return self._loaded_model()
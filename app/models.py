@@ -1,14 +1,22 @@
 # Ordner: /coldNet/app/
 # Datei: models.py
 
-from . import db, login_manager
+from . import db, login_manager, metrics, password_hasher, user_cache
+from .passwords import HashingBusy
+from .user_cache import CachedUser
 from flask_login import UserMixin
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Läuft bei jeder angemeldeten Anfrage: schlanker Datensatz aus dem Cache statt einer Abfrage (app/user_cache.py).
+    return user_cache.get(int(user_id), _load_cached_user)
+
+def _load_cached_user(user_id):
+    row = db.session.execute(db.select(User.id, User.email, User.is_admin).where(User.id == user_id)).first()
+    return CachedUser(*row) if row else None
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -17,15 +25,50 @@ class User(db.Model, UserMixin):
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     is_admin = db.Column(db.Boolean, nullable=False, default=False)
     notes = db.relationship('Note', backref='author', lazy=True)
+    conversations = db.relationship('Conversation', backref='owner', lazy=True)
 
     def __repr__(self):
         return f"User('{self.email}', Admin: {self.is_admin})"
+    # Hashen und Prüfen laufen im Prozess-Pool von app/passwords.py (HashingBusy bei Überlast).
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        with metrics.span('password_hash'):
+            self.password = password_hasher.hash(password)
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        with metrics.span('password_verify'):
+            return password_hasher.verify(self.password, password)
+    def upgrade_password_hash(self, password):
+        """Nach erfolgreicher Anmeldung: veraltete Hash-Parameter ersetzen. True, wenn gespeichert werden muss."""
+        try:
+            with metrics.span('password_rehash'):
+                new_hash = password_hasher.rehash(self.password, password)
+        except HashingBusy:
+            return False  # Anmeldung trotzdem erfolgreich; nächstes Mal erneut versuchen
+        if new_hash:
+            self.password = new_hash
+        return new_hash is not None
+
+# Geänderte oder gelöschte Benutzer aus dem user_loader-Cache entfernen: sofort beim Flush und noch einmal nach dem
+# Commit – dazwischen könnte eine parallele Anfrage den alten Stand nachgeladen haben.
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    user_cache.invalidate(target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _user_changes_committed(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _user_changes_rolled_back(session):
+    session.info.pop('changed_user_ids', None)
 
 class Note(db.Model):
+    # Jede Notiz-Abfrage filtert auf user_id und sortiert nach (created_at, id) – siehe Keyset-Paginierung.
+    __table_args__ = (db.Index('ix_note_user_created', 'user_id', 'created_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -36,6 +79,11 @@ class Note(db.Model):
         return f"Note('{self.title}', '{self.created_at}')"
 
 class Video(db.Model):
+    # Der Katalog sortiert nach (category, title) und filtert auf category. Die Titelsuche (ilike '%q%' bzw.
+    # app/video_index.py) kann keinen B-Baum-Index nutzen, deshalb keiner auf title allein.
+    __table_args__ = (
+        db.Index('ix_video_category_title', 'category', 'title'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     filepath = db.Column(db.String(1000), unique=True, nullable=False)
     filename = db.Column(db.String(255), nullable=False)
@@ -48,3 +96,32 @@ class Video(db.Model):
 
     def __repr__(self):
         return f"Video('{self.title}', '{self.filename}')"
+
+class Conversation(db.Model):
+    # Serverseitiger Chatverlauf; Nachrichten bis summary_until_id sind in `summary` zusammengefasst.
+    __table_args__ = (db.Index('ix_conversation_user_updated', 'user_id', 'updated_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    title = db.Column(db.String(100))
+    summary = db.Column(db.Text)
+    summary_until_id = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    messages = db.relationship('ConversationMessage', backref='conversation', lazy='dynamic',
+                               cascade='all, delete-orphan', order_by='ConversationMessage.id')
+
+    def __repr__(self):
+        return f"Conversation('{self.title}', '{self.updated_at}')"
+
+class ConversationMessage(db.Model):
+    # Das Kontextfenster liest die neuesten Nachrichten einer Unterhaltung rückwärts nach id.
+    __table_args__ = (db.Index('ix_conversation_message_conversation_id', 'conversation_id', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
+    role = db.Column(db.String(20), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    tokens = db.Column(db.Integer, nullable=False)  # geschätzt, siehe app/conversations.py
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"ConversationMessage('{self.role}', {self.tokens} Tokens)"
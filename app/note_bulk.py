@@ -0,0 +1,163 @@
+# Ordner: /coldNet/app/
+# Datei: note_bulk.py
+
+"""
+Massenänderungen an Notizen als NDJSON, eine Operation pro Zeile:
+
+    {"op": "create", "title": "...", "content": "...", "created_at": "2023-05-01T12:00:00"}
+    {"op": "update", "id": 17, "title": "...", "content": "..."}
+    {"op": "delete", "id": 17}
+
+Ohne "op" ist die Zeile ein create (ein eventuelles "id" wird ignoriert) – so lässt sich
+der Export von /api/notes/export unverändert wieder importieren.
+
+Die Zeilen werden in Blöcken von NOTES_BULK_CHUNK_SIZE gelesen, jeder Block ist eine
+Transaktion. Aufeinanderfolgende Operationen gleicher Art laufen zusammen als ein
+executemany bzw. ein DELETE ... IN; die Reihenfolge der Zeilen bleibt dabei erhalten.
+Jede Zeile bekommt ein eigenes Ergebnis.
+"""
+
+import json
+from datetime import datetime, timezone
+from itertools import groupby
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db, metrics
+from .models import Note
+
+OPERATIONS = ('create', 'update', 'delete')
+TITLE_MAX_LENGTH = Note.__table__.c.title.type.length
+
+
+def parse_operation(raw):
+    """Eine NDJSON-Zeile -> (op, id, Werte). ValueError mit einer Meldung für den Client."""
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        raise ValueError("Ungültiges JSON.")
+    if not isinstance(data, dict):
+        raise ValueError("Jede Zeile muss ein JSON-Objekt sein.")
+    op = data.get('op', 'create')
+    if op not in OPERATIONS:
+        raise ValueError(f"Unbekannte Operation: {op!r} (erlaubt: {', '.join(OPERATIONS)}).")
+
+    values = {}
+    for field in ('title', 'content'):
+        if field in data:
+            if not isinstance(data[field], str) or not data[field].strip():
+                raise ValueError(f"'{field}' muss ein nicht-leerer Text sein.")
+            values[field] = data[field]
+    if len(values.get('title', '')) > TITLE_MAX_LENGTH:
+        raise ValueError(f"Titel ist länger als {TITLE_MAX_LENGTH} Zeichen.")
+
+    if op == 'create':
+        if 'title' not in values or 'content' not in values:
+            raise ValueError("Titel und Inhalt sind für die Notiz erforderlich.")
+        created_at = data.get('created_at')
+        try:
+            created_at = datetime.fromisoformat(created_at) if created_at is not None else datetime.utcnow()
+        except (TypeError, ValueError):
+            raise ValueError(f"Ungültiges Datum in 'created_at': {created_at!r}.")
+        if created_at.tzinfo is not None:
+            # Die Datenbank speichert naive UTC-Zeitpunkte (datetime.utcnow).
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        return op, None, {**values, 'created_at': created_at}
+
+    note_id = data.get('id')
+    if not isinstance(note_id, int) or isinstance(note_id, bool):
+        raise ValueError("'id' (Ganzzahl) ist erforderlich.")
+    if op == 'update' and not values:
+        raise ValueError("Nichts zu ändern: 'title' oder 'content' fehlt.")
+    return op, note_id, values
+
+
+class NoteBulkProcessor:
+    """Wendet NDJSON-Zeilen für einen Benutzer an und liefert die Ergebnisse in Zeilenreihenfolge."""
+
+    def __init__(self, user_id, chunk_size=None):
+        self.user_id = user_id
+        self.chunk_size = chunk_size or current_app.config['NOTES_BULK_CHUNK_SIZE']
+        self.counts = {'created': 0, 'updated': 0, 'deleted': 0, 'failed': 0}
+
+    def process(self, lines):
+        """Generator: nimmt Zeilen (bytes oder str) entgegen und liefert ein Ergebnis-Dict pro nicht-leerer Zeile."""
+        chunk = []
+        for number, raw in enumerate(lines, start=1):
+            if not raw.strip():
+                continue
+            chunk.append((number, raw))
+            if len(chunk) >= self.chunk_size:
+                yield from self._apply_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._apply_chunk(chunk)
+
+    def _apply_chunk(self, chunk):
+        results, operations = {}, []
+        for number, raw in chunk:
+            try:
+                operations.append((number, *parse_operation(raw)))
+            except ValueError as e:
+                results[number] = {'line': number, 'ok': False, 'error': str(e)}
+
+        with metrics.span('notes_bulk_chunk'):
+            try:
+                # Nur direkt aufeinanderfolgende Operationen gleicher Art bündeln: "update 5, delete 5" bleibt in der Reihenfolge.
+                for op, run in groupby(operations, key=lambda operation: operation[1]):
+                    getattr(self, f"_{op}")(list(run), results)
+                db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                current_app.logger.error(f"Massenänderung an Notizen fehlgeschlagen, Block zurückgerollt: {e}")
+                for number, op, *_ in operations:
+                    results[number] = {'line': number, 'op': op, 'ok': False,
+                                       'error': "Datenbankfehler, dieser Block wurde nicht gespeichert."}
+
+        for number, _ in chunk:
+            result = results[number]
+            if result['ok']:
+                self.counts[{'create': 'created', 'update': 'updated', 'delete': 'deleted'}[result['op']]] += 1
+            else:
+                self.counts['failed'] += 1
+            yield result
+
+    def _owned(self, note_ids):
+        rows = db.session.execute(db.select(Note.id).where(Note.user_id == self.user_id, Note.id.in_(set(note_ids))))
+        return set(rows.scalars())
+
+    def _create(self, run, results):
+        rows = [{'user_id': self.user_id, **values} for _, _, _, values in run]
+        # RETURNING mit Parameterreihenfolge: die neuen IDs passen zu den Zeilen (SQLite >= 3.35).
+        stmt = insert(Note).returning(Note.id, sort_by_parameter_order=True)
+        new_ids = db.session.execute(stmt, rows).scalars().all()
+        for (number, *_), note_id in zip(run, new_ids):
+            results[number] = {'line': number, 'op': 'create', 'ok': True, 'id': note_id}
+
+    def _update(self, run, results):
+        owned = self._owned(note_id for _, _, note_id, _ in run)
+        batches = {}
+        for number, _, note_id, values in run:
+            if note_id not in owned:
+                results[number] = {'line': number, 'op': 'update', 'ok': False, 'id': note_id, 'error': "Notiz nicht gefunden."}
+                continue
+            # executemany braucht in jedem Parametersatz dieselben Spalten: nach geänderten Feldern gruppieren.
+            batches.setdefault(tuple(sorted(values)), []).append({**values, 'b_id': note_id})
+            results[number] = {'line': number, 'op': 'update', 'ok': True, 'id': note_id}
+        table = Note.__table__
+        for params in batches.values():
+            db.session.execute(update(table).where(table.c.id == bindparam('b_id')), params)
+
+    def _delete(self, run, results):
+        owned = self._owned(note_id for _, _, note_id, _ in run)
+        deleted = set()
+        for number, _, note_id, _ in run:
+            if note_id in owned and note_id not in deleted:
+                deleted.add(note_id)
+                results[number] = {'line': number, 'op': 'delete', 'ok': True, 'id': note_id}
+            else:
+                results[number] = {'line': number, 'op': 'delete', 'ok': False, 'id': note_id, 'error': "Notiz nicht gefunden."}
+        if deleted:
+            db.session.execute(delete(Note.__table__).where(Note.__table__.c.id.in_(deleted)))
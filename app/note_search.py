@@ -0,0 +1,109 @@
+# Ordner: /coldNet/app/
+# Datei: note_search.py
+
+import re
+
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from . import db
+from .models import Note
+
+FTS_TABLE = 'note_fts'
+
+# External-Content-Tabelle: der Index speichert nur Tokens, der Text bleibt in `note`.
+# remove_diacritics 2 faltet Umlaute/Akzente, damit "Aepfel"/"Äpfel"/"apfel" sich finden.
+_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, content, content='{Note.__tablename__}', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2"
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {Note.__tablename__} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {Note.__tablename__} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {Note.__tablename__} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+]
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def init_note_search(app):
+    """
+    Legt den FTS5-Index samt Triggern an (idempotent) und befüllt ihn beim ersten
+    Anlegen mit allen vorhandenen Notizen. Fehlt FTS5 im SQLite-Build, bleibt die
+    Suche beim bisherigen ilike-Pfad.
+    """
+    app.config.setdefault('NOTES_FTS_ENABLED', True)
+    state = app.extensions['note_search'] = {'fts5': False}
+    if not app.config['NOTES_FTS_ENABLED'] or db.engine.dialect.name != 'sqlite':
+        return
+    try:
+        with db.engine.begin() as conn:
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
+                                  {'name': FTS_TABLE}).first() is not None
+            for statement in _FTS_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # Backfill: baut den Index aus der Content-Tabelle neu auf.
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+                app.logger.info("FTS5-Index für Notizen angelegt und befüllt.")
+        state['fts5'] = True
+    except OperationalError as e:
+        app.logger.warning(f"FTS5 nicht verfügbar, Notizsuche nutzt ilike: {e}")
+
+
+def fts_available():
+    return current_app.extensions.get('note_search', {}).get('fts5', False)
+
+
+def _fts_query(query, operator):
+    # Jedes Wort als Phrase mit Präfix-Suche; Sonderzeichen der FTS5-Syntax fallen dabei weg.
+    tokens = _TOKEN_RE.findall(query)
+    return f" {operator} ".join(f'"{token}"*' for token in tokens)
+
+
+def search_notes_fts(user_id, query, limit=5, preview_tokens=24):
+    """BM25-sortierte Treffer als (id, title, snippet); Titeltreffer zählen zehnfach."""
+    sql = text(f"""
+        SELECT n.id, n.title, snippet({FTS_TABLE}, 1, '**', '**', '...', :tokens) AS preview
+        FROM {FTS_TABLE} JOIN {Note.__tablename__} AS n ON n.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH :match AND n.user_id = :user_id
+        ORDER BY bm25({FTS_TABLE}, 10.0, 1.0)
+        LIMIT :limit
+    """)
+    # Erst alle Wörter verlangen, ohne Treffer dann auf "irgendein Wort" lockern.
+    for operator in ('AND', 'OR'):
+        match = _fts_query(query, operator)
+        if not match:
+            return []
+        rows = db.session.execute(sql, {'match': match, 'user_id': user_id, 'limit': limit, 'tokens': preview_tokens}).all()
+        if rows:
+            return [(row.id, row.title, row.preview) for row in rows]
+    return []
+
+
+def search_notes_like(user_id, query, limit=5, preview_length=150):
+    """Bisheriger Pfad: Teilstring-Suche ohne Index, sortiert nach Erstellungsdatum."""
+    search_term = f"%{query}%"
+    notes = Note.query.filter(
+        Note.user_id == user_id,
+        db.or_(
+            Note.title.ilike(search_term),
+            Note.content.ilike(search_term)
+        )
+    ).order_by(Note.created_at.desc()).limit(limit).all()
+    return [(note.id, note.title, note.content[:preview_length] + "..." if len(note.content) > preview_length else note.content)
+            for note in notes]
+
+
+def search_notes(user_id, query, limit=5):
+    if fts_available():
+        return search_notes_fts(user_id, query, limit)
+    return search_notes_like(user_id, query, limit)
@@ -0,0 +1,36 @@
+# Ordner: /coldNet/app/
+# Datei: pagination.py
+
+import base64
+import json
+from datetime import datetime
+
+from . import db
+
+
+def encode_cursor(created_at, row_id):
+    """Opaker Cursor aus dem Sortierschlüssel (created_at, id) der letzten ausgelieferten Zeile."""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Gegenstück zu encode_cursor; wirft ValueError bei manipulierten oder kaputten Cursorn."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Ungültiger Cursor: {cursor}") from e
+
+
+def keyset_before(stmt, created_col, id_col, created_at, row_id):
+    """
+    Schränkt eine absteigend nach (created_at, id) sortierte Abfrage auf die Zeilen
+    nach dem Cursor ein. Im Gegensatz zu OFFSET bleibt das bei jeder Seitentiefe ein
+    Index-Seek statt eines Scans über alle übersprungenen Zeilen.
+    """
+    return stmt.where(db.or_(
+        created_col < created_at,
+        db.and_(created_col == created_at, id_col < row_id)
+    ))
@@ -0,0 +1,171 @@
+# Ordner: /coldNet/app/
+# Datei: passwords.py
+
+"""
+Passwort-Hashing außerhalb des Request-Threads.
+
+scrypt mit den Standardparametern braucht pro Hash ~50-100 ms CPU und 32 MB Speicher. Direkt im
+Request-Thread blockiert eine Welle von Anmeldungen (z.B. nach einem Deploy) alle anderen Anfragen
+des Workers. Hashen und Prüfen laufen deshalb in einem kleinen Prozess-Pool
+(PASSWORD_HASH_WORKERS, 0 = im aufrufenden Thread). Höchstens PASSWORD_HASH_MAX_CONCURRENT
+Vorgänge sind gleichzeitig unterwegs; wer länger als PASSWORD_HASH_MAX_WAIT Sekunden auf einen
+Platz wartet, bekommt HashingBusy (503 mit Retry-After) statt die Warteschlange zu verlängern.
+
+Die Parameter (PASSWORD_HASH_METHOD, z.B. "scrypt:32768:8:1" oder "pbkdf2:sha256:1000000") sind
+konfigurierbar. Gespeicherte Hashes stehen im Werkzeug-Format "methode$salt$hash"; stimmt die
+Methode nicht mit der konfigurierten überein, wird das Passwort bei der nächsten erfolgreichen
+Anmeldung neu gehasht (rehash()).
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingBusy(Exception):
+    """Zu viele Anmeldungen gleichzeitig: 503, der Client soll es nach retry_after Sekunden erneut versuchen."""
+
+    status = 503
+
+    def __init__(self, retry_after):
+        self.message = "Zu viele Anmeldungen gleichzeitig. Bitte versuche es in einem Moment erneut."
+        super().__init__(self.message)
+        self.retry_after = retry_after
+
+    def to_dict(self):
+        return {'error': self.message, 'retry_after': self.retry_after}
+
+
+def normalize_method(method):
+    """Methode mit allen Parametern, so wie werkzeug sie in den Hash schreibt ("scrypt" -> "scrypt:32768:8:1")."""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return DEFAULT_METHOD
+    if name == 'pbkdf2' and len(args) < 2:
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+    if name not in ('scrypt', 'pbkdf2'):
+        raise ValueError(f"Unbekannte Hash-Methode in PASSWORD_HASH_METHOD: {method!r}")
+    return method
+
+
+class PasswordHasher:
+    """Hashen und Prüfen von Passwörtern in einem begrenzten Prozess-Pool."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pool = None
+        self.method = DEFAULT_METHOD
+        self.salt_length = 16
+        self.workers = min(4, os.cpu_count() or 2)
+        self.max_concurrent = 2 * self.workers
+        self.max_wait = 5
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', self.method)
+        app.config.setdefault('PASSWORD_HASH_SALT_LENGTH', self.salt_length)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', self.workers)
+        app.config.setdefault('PASSWORD_HASH_MAX_CONCURRENT', self.max_concurrent)
+        app.config.setdefault('PASSWORD_HASH_MAX_WAIT', self.max_wait)
+        self.method = normalize_method(app.config['PASSWORD_HASH_METHOD'])
+        self.salt_length = app.config['PASSWORD_HASH_SALT_LENGTH']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.max_concurrent = max(1, app.config['PASSWORD_HASH_MAX_CONCURRENT'])
+        self.max_wait = app.config['PASSWORD_HASH_MAX_WAIT']
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            self._slots = threading.BoundedSemaphore(self.max_concurrent)
+            self._reset_stats()
+        app.extensions['password_hasher'] = self
+
+    def _reset_stats(self):
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self.active = 0
+        self.peak_active = 0
+        self.wait_seconds = 0.0
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # forkserver/spawn statt fork: der Request-Prozess hat Threads und offene DB-Verbindungen.
+                # Die Worker importieren das Hauptmodul neu – Startskripte brauchen den üblichen __main__-Schutz.
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(['werkzeug.security'])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _run(self, fn, *args, **kwargs):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.max_wait):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy(retry_after=max(1, round(self.max_wait)))
+        try:
+            with self._lock:
+                self.wait_seconds += time.perf_counter() - start
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+            if not self.workers:
+                return fn(*args, **kwargs)
+            try:
+                return self._executor().submit(fn, *args, **kwargs).result()
+            except BrokenProcessPool:
+                # Ein Worker ist abgestürzt (z.B. OOM bei zu hohen scrypt-Parametern): Pool neu anlegen, einmal wiederholen.
+                with self._lock:
+                    self._pool = None
+                return self._executor().submit(fn, *args, **kwargs).result()
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._slots.release()
+
+    def hash(self, password):
+        password_hash = self._run(generate_password_hash, password, method=self.method, salt_length=self.salt_length)
+        with self._lock:
+            self.hashed += 1
+        return password_hash
+
+    def verify(self, password_hash, password):
+        result = self._run(check_password_hash, password_hash, password)
+        with self._lock:
+            self.verified += 1
+        return result
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
+
+    def rehash(self, password_hash, password):
+        """Nach erfolgreicher Prüfung: neuer Hash mit den aktuellen Parametern oder None, wenn keiner nötig ist."""
+        if not self.needs_rehash(password_hash):
+            return None
+        new_hash = self.hash(password)
+        with self._lock:
+            self.rehashed += 1
+        return new_hash
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'method': self.method, 'workers': self.workers, 'max_concurrent': self.max_concurrent,
+                'max_wait': self.max_wait, 'active': self.active, 'peak_active': self.peak_active,
+                'hashed': self.hashed, 'verified': self.verified, 'rehashed': self.rehashed,
+                'rejected': self.rejected, 'wait_seconds': round(self.wait_seconds, 3),
+            }
@@ -0,0 +1,61 @@
+# Ordner: /coldNet/app/
+# Datei: query_plans.py
+
+from datetime import datetime
+
+import click
+
+from . import db
+from .models import Note
+from .pagination import keyset_before
+from .video_catalog import catalog_query
+
+
+def _hot_queries():
+    """(Name, Statement, erwarteter Index) für die Abfragen der heißen Pfade in routes.py."""
+    note_page = db.select(Note.id, Note.title, Note.created_at).where(Note.user_id == 1)\
+        .order_by(Note.created_at.desc(), Note.id.desc())
+    return [
+        ("Notizen eines Benutzers (get_notes, list_notes)", note_page.limit(51), 'ix_note_user_created'),
+        ("Notizen, Keyset-Folgeseite", keyset_before(note_page, Note.created_at, Note.id, datetime(2024, 1, 1), 100).limit(51),
+         'ix_note_user_created'),
+        # /video-stream und /api/videos lesen Seiten und Anzahl pro Kategorie aus dem Katalog-Snapshot;
+        # in der Datenbank läuft nur dessen Aufbau.
+        ("Video-Katalog (video_stream, /api/videos)", catalog_query(), 'ix_video_category_title'),
+    ]
+
+
+def explain(stmt):
+    compiled = stmt.compile(dialect=db.engine.dialect)
+    params = compiled.construct_params()
+    positional = tuple(params[name] for name in (compiled.positiontup or []))
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", positional).all()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans():
+    """
+    Prüft per EXPLAIN QUERY PLAN, dass die heißen Abfragen ihren Index nutzen und
+    nicht per temporärem B-Tree sortieren. Gibt eine Liste von (Name, Plan, Problem) zurück.
+    """
+    problems = []
+    for name, stmt, index_name in _hot_queries():
+        plan = explain(stmt)
+        plan_text = " | ".join(plan)
+        if index_name not in plan_text:
+            problems.append((name, plan_text, f"Index {index_name} wird nicht genutzt"))
+        elif 'TEMP B-TREE' in plan_text:
+            problems.append((name, plan_text, "Sortierung über temporären B-Tree"))
+    return problems
+
+
+@click.command('check-query-plans')
+def check_query_plans_command():
+    """Schlägt fehl, wenn eine heiße Abfrage ihren Index nicht mehr nutzt."""
+    problems = check_query_plans()
+    for name, plan, problem in problems:
+        click.echo(f"FEHLER  {name}: {problem}\n        Plan: {plan}", err=True)
+    if problems:
+        raise SystemExit(1)
+    click.echo(f"OK  Alle {len(_hot_queries())} heißen Abfragen nutzen ihre Indizes.")
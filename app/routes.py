@@ -3,18 +3,39 @@
 
 from flask import (
     render_template, request, jsonify, Blueprint, redirect, url_for,
-    abort, Response, stream_with_context, current_app, send_from_directory, flash
+    abort, Response, stream_with_context, current_app, send_from_directory, flash, make_response
 )
-from .models import User, Note, Video
-from . import db
+from .models import User, Note, Video, Conversation, ConversationMessage
+from .intent import IntentClassifier
+from .note_search import search_notes
+from .note_bulk import NoteBulkProcessor
+from .tool_calls import (UNEXPECTED_RESULT, decision_calls, dispatch_decision, in_tool_transaction, invoke_tool,
+                         parse_tool_calls)
+from .pagination import encode_cursor, decode_cursor, keyset_before
+from .video_scanner import scan_job
+from .video_watcher import video_watcher
+from .video_delivery import send_video
+from .video_catalog import video_catalog
+from .video_index import video_index
+from .thumbnails import thumbnail_srcset
+from .speculation import SpeculativeStream, SpeculationStats
+from .ki_admission import AdmissionRejected
+from .passwords import HashingBusy
+from .ki_state import is_backend_failure
+from .dispatch_cache import registry_version
+from .conversations import (ReplyRecorder, build_context, context_stats, finish_turn, get_conversation, load_history,
+                            start_turn)
+from . import db, ki_state, ki_admission, dispatch_cache, metrics, tool_calls, password_hasher, user_cache
 from flask_login import login_user, logout_user, login_required, current_user
 import requests
+import io
 import json
 import os
 import re
-import shutil
 import random
+import tempfile
 from functools import wraps
+from collections import namedtuple
 
 main = Blueprint('main', __name__)
 # Standard-Timeout für die meisten Anfragen
@@ -25,6 +46,14 @@ TOOL_DISPATCH_TIMEOUT = 30
 
 # --- KI-Werkzeuge ---
 
+def _commit_tool_write():
+    # In einer Werkzeugkette (app/tool_calls.py) nur flushen: alle Schreibzugriffe der Kette teilen sich einen Commit.
+    if in_tool_transaction():
+        db.session.flush()
+    else:
+        db.session.commit()
+
+@metrics.timed('tool_create_note')
 def _tool_create_note(title: str, content: str):
     """
     Erstellt eine neue Notiz für den aktuell angemeldeten Benutzer.
@@ -33,9 +62,9 @@ def _tool_create_note(title: str, content: str):
         return {"status": "error", "message": "Titel und Inhalt sind für die Notiz erforderlich."}
     
     try:
-        new_note = Note(title=title, content=content, author=current_user)
+        new_note = Note(title=title, content=content, user_id=current_user.id)
         db.session.add(new_note)
-        db.session.commit()
+        _commit_tool_write()
         confirmations = [
             f"Alles klar, ich habe die Notiz '{title}' für dich gespeichert.",
             f"Erledigt! Deine Notiz '{title}' wurde angelegt.",
@@ -43,10 +72,13 @@ def _tool_create_note(title: str, content: str):
         ]
         return {"status": "success", "message": random.choice(confirmations)}
     except Exception as e:
+        if in_tool_transaction():
+            raise  # Die Werkzeugkette rollt alle Änderungen gemeinsam zurück.
         db.session.rollback()
         current_app.logger.error(f"Fehler beim Erstellen der Notiz: {e}")
         return {"status": "error", "message": "Ein interner Fehler hat das Speichern der Notiz verhindert."}
 
+@metrics.timed('tool_search_notes')
 def _tool_search_notes(query: str):
     """
     Durchsucht die Notizen des aktuell angemeldeten Benutzers.
@@ -57,22 +89,15 @@ def _tool_search_notes(query: str):
         return {"status": "error", "message": "Ein Suchbegriff ist erforderlich."}
         
     try:
-        search_term = f"%{query}%"
-        notes = Note.query.filter(
-            Note.user_id == current_user.id,
-            db.or_(
-                Note.title.ilike(search_term),
-                Note.content.ilike(search_term)
-            )
-        ).order_by(Note.created_at.desc()).limit(5).all()
+        # FTS5 mit BM25-Ranking, falls verfügbar; sonst ilike (siehe app/note_search.py)
+        notes = search_notes(current_user.id, query, limit=5)
 
         if not notes:
             return {"status": "success", "message": f"Ich konnte keine Notizen zum Thema '{query}' finden."}
 
         result_string = f"Ich habe {len(notes)} relevante Notiz(en) zu '{query}' gefunden:\n\n"
-        for i, note in enumerate(notes, 1):
-            content_preview = note.content[:150] + "..." if len(note.content) > 150 else note.content
-            result_string += f"**{i}. {note.title}** (ID: {note.id})\n{content_preview}\n\n"
+        for i, (note_id, note_title, content_preview) in enumerate(notes, 1):
+            result_string += f"**{i}. {note_title}** (ID: {note_id})\n{content_preview}\n\n"
                     
         result_string += "---\n*Soll ich dir eine bestimmte Notiz vollständig anzeigen?*"
         return {"status": "success", "message": result_string}
@@ -80,40 +105,51 @@ def _tool_search_notes(query: str):
         current_app.logger.error(f"Fehler beim Durchsuchen der Notizen: {e}")
         return {"status": "error", "message": "Ein interner Fehler hat das Durchsuchen der Notizen verhindert."}
 
-def _tool_list_notes(limit: int = 5, offset: int = 0):
+@metrics.timed('tool_list_notes')
+def _tool_list_notes(limit: int = 5, offset: int = 0, after_note_id: int = None):
     """
-    Listet alle Notizen des Benutzers auf mit Paginierung.
+    Listet die Notizen des Benutzers auf, neueste zuerst.
+    Weitergeblättert wird per Keyset ab der zuletzt gezeigten Notiz (`after_note_id`);
+    `offset` bleibt für ältere Dispatcher-Antworten erhalten.
     """
     try:
         # KORREKTUR: Fängt None-Werte ab und setzt sie auf Standardwerte.
         limit = limit if limit is not None else 5
         offset = offset if offset is not None else 0
 
-        total_notes = Note.query.filter_by(user_id=current_user.id).count()
-        notes = Note.query.filter_by(user_id=current_user.id)\
-                         .order_by(Note.created_at.desc())\
-                         .offset(offset)\
-                         .limit(limit)\
-                         .all()
+        query = Note.query.filter_by(user_id=current_user.id)
+        if after_note_id is not None:
+            anchor = Note.query.filter_by(id=after_note_id, user_id=current_user.id).first()
+            if not anchor:
+                return {"status": "error", "message": f"Notiz mit ID {after_note_id} wurde nicht gefunden."}
+            query = keyset_before(query, Note.created_at, Note.id, anchor.created_at, anchor.id)
+            offset = 0
+        # Eine Zeile mehr laden statt count(): zeigt an, ob es weitere Notizen gibt.
+        notes = query.order_by(Note.created_at.desc(), Note.id.desc())\
+                     .offset(offset)\
+                     .limit(limit + 1)\
+                     .all()
+        has_more = len(notes) > limit
+        notes = notes[:limit]
 
         if not notes:
-            return {"status": "success", "message": "Du hast noch keine Notizen erstellt." if offset == 0 else "Keine weiteren Notizen vorhanden."}
+            return {"status": "success", "message": "Du hast noch keine Notizen erstellt." if offset == 0 and after_note_id is None else "Keine weiteren Notizen vorhanden."}
 
-        result_string = f"Hier sind deine Notizen ({offset + 1}-{offset + len(notes)} von {total_notes}):\n\n"
+        result_string = "Hier sind deine Notizen:\n\n" if offset == 0 and after_note_id is None else "Hier sind deine weiteren Notizen:\n\n"
                 
-        for i, note in enumerate(notes, 1):
+        for note in notes:
             content_preview = note.content[:100] + "..." if len(note.content) > 100 else note.content
-            result_string += f"**{offset + i}. {note.title}** (ID: {note.id})\n{content_preview}\n*Erstellt: {note.created_at.strftime('%d.%m.%Y %H:%M')}*\n\n"
+            result_string += f"**{note.title}** (ID: {note.id})\n{content_preview}\n*Erstellt: {note.created_at.strftime('%d.%m.%Y %H:%M')}*\n\n"
 
-        if offset + len(notes) < total_notes:
-            remaining = total_notes - (offset + len(notes))
-            result_string += f"---\n*Du hast noch {remaining} weitere Notiz(en). Soll ich die nächsten anzeigen?*"
+        if has_more:
+            result_string += f"---\n*Du hast noch weitere Notizen. Sag z.B. \"Zeig mir die nächsten Notizen nach ID {notes[-1].id}\", um die nächsten zu sehen.*"
             
         return {"status": "success", "message": result_string}
     except Exception as e:
         current_app.logger.error(f"Fehler beim Auflisten der Notizen: {e}")
         return {"status": "error", "message": "Ein Fehler ist beim Laden deiner Notizen aufgetreten."}
 
+@metrics.timed('tool_get_note_details')
 def _tool_get_note_details(note_id: int):
     """
     Zeigt die vollständigen Details einer spezifischen Notiz an.
@@ -133,6 +169,7 @@ def _tool_get_note_details(note_id: int):
         current_app.logger.error(f"Fehler beim Laden der Notiz-Details: {e}")
         return {"status": "error", "message": "Ein Fehler ist beim Laden der Notiz aufgetreten."}
 
+@metrics.timed('tool_delete_note')
 def _tool_delete_note(note_id: int):
     """
     Löscht eine spezifische Notiz des Benutzers.
@@ -148,7 +185,7 @@ def _tool_delete_note(note_id: int):
 
         note_title = note.title
         db.session.delete(note)
-        db.session.commit()
+        _commit_tool_write()
                 
         confirmations = [
             f"Die Notiz '{note_title}' wurde erfolgreich gelöscht.",
@@ -156,6 +193,8 @@ def _tool_delete_note(note_id: int):
         ]
         return {"status": "success", "message": random.choice(confirmations)}
     except Exception as e:
+        if in_tool_transaction():
+            raise
         db.session.rollback()
         current_app.logger.error(f"Fehler beim Löschen der Notiz: {e}")
         return {"status": "error", "message": "Ein Fehler ist beim Löschen der Notiz aufgetreten."}
@@ -165,42 +204,118 @@ AVAILABLE_TOOLS = {
     "create_note": {
         "description": "Erstellt eine neue Notiz, einen Gedanken oder eine Liste. Wird verwendet, wenn der Benutzer sagt 'notiere', 'schreib auf', 'erstell eine Notiz' oder ähnliches. Extrahiert immer einen Titel und den dazugehörigen Inhalt.",
         "function": _tool_create_note,
+        "read_only": False,
         "parameters": [
             {"name": "title", "type": "string", "description": "Der Titel der Notiz, z.B. 'Einkaufsliste'."},
             {"name": "content", "type": "string", "description": "Der eigentliche Text der Notiz, z.B. 'Milch, Brot, Eier'."}
+        ],
+        # Muster für den lokalen Fast-Path-Dispatcher (siehe app/intent.py). "Titel: Inhalt" nur mit Leerzeichen nach
+        # dem Doppelpunkt – "14:30" oder "abc:def" gehören zum Inhalt.
+        "intents": [
+            {"pattern": r"^(?:bitte )?(?:notiere|notier|schreib(?:e)? auf|merk dir)(?: dir| mir| bitte)*\s*:\s*(?P<title>[^:\n]{1,60}?)\s*:\s+(?P<content>.+)$", "confidence": 0.96},
+            {"pattern": r"^(?:bitte )?(?:notiere|notier|schreib(?:e)? auf|merk dir)(?: dir| mir| bitte)*\s*:\s*(?P<content>.+)$", "confidence": 0.95, "derive": {"title": "content"}},
+            {"pattern": r"^(?:bitte )?(?:notiere|notier|merk dir)(?: dir| mir| bitte)*,? (?:dass )?(?P<content>.+)$", "confidence": 0.85, "derive": {"title": "content"}}
         ]
     },
     "search_notes": {
         "description": "Durchsucht die persönlichen Notizen des Benutzers. Wird verwendet, wenn der Benutzer fragt 'suche in meinen Notizen', 'was weiß ich über', 'finde meine Notiz zu' usw.",
         "function": _tool_search_notes,
+        "read_only": True,
         "parameters": [
             {"name": "query", "type": "string", "description": "Der Suchbegriff, nach dem in den Notizen gesucht werden soll, z.B. 'Urlaub'."}
+        ],
+        "intents": [
+            {"pattern": r"^(?:bitte )?(?:such(?:e)?|durchsuche)(?: bitte)? (?:in )?(?:meinen |den |meine )?notizen nach (?P<query>.+?)[\s?!.]*$", "confidence": 0.95},
+            {"pattern": r"^(?:finde|such(?:e)?) (?:meine |die )?notiz(?:en)? (?:zu|über|zum|zur|mit) (?P<query>.+?)[\s?!.]*$", "confidence": 0.94},
+            {"pattern": r"^was weiß ich (?:über|zu|zum|zur) (?P<query>.+?)[\s?!.]*$", "confidence": 0.9},
+            {"pattern": r"^(?:hast du|habe ich) (?:infos|informationen|notizen|etwas|was) (?:über|zu|zum|zur) (?P<query>.+?)[\s?!.]*$", "confidence": 0.85}
         ]
     },
     "list_notes": {
         "description": "Listet alle Notizen des Benutzers auf. Wird verwendet bei Fragen wie 'welche Notizen habe ich', 'zeige meine Notizen', 'liste meine Notizen auf'. Unterstützt Paginierung.",
         "function": _tool_list_notes,
+        "read_only": True,
         "parameters": [
             {"name": "limit", "type": "integer", "description": "Anzahl der Notizen pro Seite (Standard: 5)."},
-            {"name": "offset", "type": "integer", "description": "Startposition für Paginierung (Standard: 0)."}
+            {"name": "offset", "type": "integer", "description": "Startposition für Paginierung (Standard: 0)."},
+            {"name": "after_note_id", "type": "integer", "description": "ID der zuletzt angezeigten Notiz; listet die älteren Notizen danach (zum Weiterblättern)."}
+        ],
+        "intents": [
+            {"pattern": r"^(?:welche|was für) notizen (?:habe|hab) ich(?: (?:gespeichert|noch|alles))?[\s?!.]*$", "confidence": 0.97},
+            {"pattern": r"^(?:bitte )?(?:zeig(?:e)?|liste|list|gib)(?: mir)?(?: bitte)?(?: (?:alle|all|meine|die))* notizen(?: auf| an)?(?: bitte)?[\s?!.]*$", "confidence": 0.96},
+            {"pattern": r"^meine notizen[\s?!.]*$", "confidence": 0.93},
+            {"pattern": r"^(?:bitte )?(?:zeig(?:e)?|liste|gib)(?: mir)?(?: bitte)?(?: die)? (?:nächsten|weiteren|restlichen) notizen (?:nach|ab)(?: der)?(?: notiz| id| notiz mit (?:der )?id)? ?#?(?P<after_note_id>\d+)[\s?!.]*$", "confidence": 0.96}
         ]
     },
     "get_note_details": {
         "description": "Zeigt die vollständigen Details einer spezifischen Notiz an. Wird verwendet, wenn der Benutzer nach einer bestimmten Notiz fragt oder mehr Details sehen möchte.",
         "function": _tool_get_note_details,
+        "read_only": True,
         "parameters": [
             {"name": "note_id", "type": "integer", "description": "Die ID der Notiz, die angezeigt werden soll."}
+        ],
+        "intents": [
+            {"pattern": r"^(?:bitte )?(?:zeig(?:e)?|öffne|gib)(?: mir)?(?: bitte)?(?: die| meine)? notiz(?: nr\.?| nummer| mit (?:der )?id| id)? ?#?(?P<note_id>\d+)(?: an| vollständig| ganz)?[\s?!.]*$", "confidence": 0.96},
+            {"pattern": r"^(?:die )?notiz(?: nr\.?| nummer| mit (?:der )?id| id)? ?#?(?P<note_id>\d+)(?: bitte)? (?:anzeigen|zeigen|öffnen)[\s?!.]*$", "confidence": 0.95},
+            {"pattern": r"^was steht in notiz(?: nr\.?| nummer| mit (?:der )?id| id)? ?#?(?P<note_id>\d+)[\s?!.]*$", "confidence": 0.93}
         ]
     },
     "delete_note": {
         "description": "Löscht eine spezifische Notiz. Wird verwendet, wenn der Benutzer sagt 'lösche Notiz', 'entferne die Notiz' oder ähnliches.",
         "function": _tool_delete_note,
+        "read_only": False,
         "parameters": [
             {"name": "note_id", "type": "integer", "description": "Die ID der Notiz, die gelöscht werden soll."}
+        ],
+        "intents": [
+            {"pattern": r"^(?:bitte )?(?:lösch(?:e)?|loesch(?:e)?|entfern(?:e)?)(?: bitte)? (?:die |meine )?notiz(?: nr\.?| nummer| mit (?:der )?id| id)? ?#?(?P<note_id>\d+)[\s!.]*$", "confidence": 0.96},
+            {"pattern": r"^(?:die )?notiz(?: nr\.?| nummer| mit (?:der )?id| id)? ?#?(?P<note_id>\d+)(?: bitte)? (?:löschen|loeschen|entfernen)[\s!.]*$", "confidence": 0.95}
         ]
     }
 }
 
+def build_tool_system_prompt(tools):
+    tools_for_prompt = {name: {k: v for k, v in tool_data.items() if k not in ('function', 'intents', 'read_only')} for name, tool_data in tools.items()}
+    return f"""Du bist ein Tool-Dispatcher. Deine Aufgabe ist es, die Benutzeranfrage zu analysieren und das passende Werkzeug auszuwählen.
+**WICHTIGE REGELN:**
+1. Bei JEDER Benutzeranfrage prüfst du ZUERST, ob sie mit Notizen zusammenhängt.
+2. Auch bei allgemeinen Fragen sollst du prüfen, ob der Benutzer relevante Notizen haben könnte.
+3. Antworte **ausschließlich** mit einem JSON-Objekt.
+4. Wenn ein Werkzeug passt: `{{"tool_name": "name", "arguments": {{"arg1": "wert1"}}}}`
+5. Wenn die Anfrage MEHRERE Aktionen verlangt, alle in der genannten Reihenfolge: `{{"tool_calls": [{{"tool_name": "name", "arguments": {{...}}}}, ...]}}`
+6. Wenn KEIN Werkzeug passt: `{{"tool_name": "none"}}`
+
+**BEISPIELE FÜR WERKZEUG-VERWENDUNG:**
+- "Welche Notizen habe ich?" → list_notes
+- "Was weiß ich über Urlaub?" → search_notes mit query="Urlaub"
+- "Notiere dir: Milch kaufen" → create_note
+- "Zeige mir Notiz 5" → get_note_details mit note_id=5
+- "Lösche die Notiz mit ID 3" → delete_note mit note_id=3
+- "Hast du Infos über Python?" → search_notes mit query="Python"
+- "Lösche Notiz 3 und 7 und zeig mir dann meine Notizen" → tool_calls: delete_note mit note_id=3, delete_note mit note_id=7, list_notes
+
+**VERFÜGBARE WERKZEUGE:**
+{json.dumps(tools_for_prompt, indent=2, ensure_ascii=False)}
+"""
+
+def refresh_tool_registry():
+    """
+    Baut Klassifikator und Dispatcher-Prompt aus AVAILABLE_TOOLS neu auf und verwirft zwischengespeicherte
+    Entscheidungen. Nach Änderungen an der Registry zur Laufzeit aufrufen; neue oder entfernte Werkzeuge
+    erkennt plan_chat() auch selbst.
+    """
+    global intent_classifier, TOOL_SYSTEM_PROMPT, TOOL_REGISTRY_VERSION, _tool_registry_names
+    intent_classifier = IntentClassifier(AVAILABLE_TOOLS)
+    TOOL_SYSTEM_PROMPT = build_tool_system_prompt(AVAILABLE_TOOLS)
+    TOOL_REGISTRY_VERSION = registry_version(TOOL_SYSTEM_PROMPT)
+    _tool_registry_names = set(AVAILABLE_TOOLS)
+    dispatch_cache.clear()
+
+# Wird einmal beim Import aus der Registry aufgebaut: Fast-Path-Klassifikator und statischer Dispatcher-Prompt.
+refresh_tool_registry()
+# Zähler für den spekulativen Chat-Modus (siehe /api/admin/speculation)
+speculation_stats = SpeculationStats()
+
 
 # --- Hilfsfunktionen (unverändert) ---
 def admin_required(f):
@@ -213,15 +328,6 @@ def admin_required(f):
 def allowed_video_file(filename):
     return '.' in filename and os.path.splitext(filename)[1].lower() in current_app.config['ALLOWED_VIDEO_EXTENSIONS']
 
-def get_active_ki_server_url():
-    local_url = current_app.config['KI_SERVER_URL_LOCAL']
-    public_url = current_app.config['KI_SERVER_URL_PUBLIC']
-    try:
-        requests.get(f"{local_url}/health", timeout=1)
-        return local_url
-    except requests.exceptions.RequestException:
-        return public_url
-
 # --- Seiten-Routen (unverändert) ---
 @main.route('/')
 def index():
@@ -252,75 +358,94 @@ def notes():
 @main.route('/video-stream')
 @login_required
 def video_stream():
-    search_query = request.args.get('search', '').lower()
+    search_query = request.args.get('search', '')
     selected_category = request.args.get('category', "Alle")
-    query = Video.query
-    if search_query:
-        query = query.filter(Video.title.ilike(f'%{search_query}%'))
-    if selected_category != "Alle":
-        query = query.filter_by(category=selected_category)
-    all_videos = query.order_by(Video.category, Video.title).all()
-    categories_from_db = db.session.query(Video.category).distinct().order_by(Video.category).all()
-    categories = ["Alle"] + [cat[0] for cat in categories_from_db if cat[0]]
-    videos_categorized = {}
-    for video in all_videos:
-        cat = video.category or 'Unkategorisiert'
-        if cat not in videos_categorized:
-            videos_categorized[cat] = []
-        videos_categorized[cat].append(video)
-    return render_template('video_stream.html', videos_categorized=videos_categorized, categories=categories,
-                           selected_category=selected_category, search_query=request.args.get('search', ''))
+    catalog = video_catalog.get(ttl=current_app.config['VIDEO_CATALOG_TTL'])
+    groups = catalog.filtered(selected_category, _search_video_ids(search_query))
+    # Pro Kategorie nur die erste Seite rendern, der Rest kommt per /api/videos nach.
+    page_size = current_app.config['VIDEO_CATALOG_PAGE_SIZE']
+    videos_categorized = {cat: rows[:page_size] for cat, rows in groups.items()}
+    category_totals = {cat: len(rows) for cat, rows in groups.items()}
+    return render_template('video_stream.html', videos_categorized=videos_categorized, category_totals=category_totals,
+                           categories=catalog.categories, selected_category=selected_category, search_query=search_query)
+
+@main.route('/api/videos', methods=['GET'])
+@login_required
+def get_videos():
+    """Seite einer Kategorie aus dem Katalog: ?category=...&offset=0&limit=N[&search=...]."""
+    category = request.args.get('category')
+    if not category or category == "Alle":
+        return jsonify({'error': 'Parameter "category" ist erforderlich.'}), 400
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', current_app.config['VIDEO_CATALOG_PAGE_SIZE'], type=int), 1), 200)
+    catalog = video_catalog.get(ttl=current_app.config['VIDEO_CATALOG_TTL'])
+    rows = catalog.filtered(category, _search_video_ids(request.args.get('search', ''))).get(category, ())
+    videos = [_serialize_catalog_row(row) for row in rows[offset:offset + limit]]
+    next_offset = offset + limit if offset + limit < len(rows) else None
+    return jsonify({'category': category, 'videos': videos, 'total': len(rows), 'next_offset': next_offset})
+
+@main.route('/api/videos/search', methods=['GET'])
+@login_required
+def search_videos():
+    """
+    Suche während des Tippens: ?q=...[&category=&genre=&year=&limit=20].
+    Liefert Treffer (Titeltreffer zuerst) und die Facettenzahlen für Kategorie, Genre und Jahr.
+    """
+    year = request.args.get('year', type=int)
+    if request.args.get('year') and year is None:
+        return jsonify({'error': 'Ungültiges Jahr.'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    video_index.ensure_built(current_app._get_current_object(), ttl=current_app.config['VIDEO_CATALOG_TTL'])
+    result = video_index.search(request.args.get('q', ''), category=request.args.get('category'),
+                                genre=request.args.get('genre'), year=year, limit=limit)
+    catalog = video_catalog.get(ttl=current_app.config['VIDEO_CATALOG_TTL'])
+    videos = [_serialize_catalog_row(catalog.by_id[video_id]) for video_id in result.ids if video_id in catalog.by_id]
+    return jsonify({'videos': videos, 'total': result.total, 'facets': result.facets})
+
+def _search_video_ids(search_query):
+    """IDs der Suchtreffer aus dem Suchindex oder None, wenn nicht gesucht wird."""
+    if not search_query.strip():
+        return None
+    video_index.ensure_built(current_app._get_current_object(), ttl=current_app.config['VIDEO_CATALOG_TTL'])
+    return video_index.match_ids(search_query)
+
+def _serialize_catalog_row(row):
+    return {
+        'id': row.id, 'title': row.title, 'category': row.category, 'year': row.year, 'description': row.description,
+        'src': url_for('main.serve_video_file', filepath=row.filepath), 'thumbnail_url': row.thumbnail_url,
+        'srcset': thumbnail_srcset(row.thumbnail_url, current_app.config['THUMBNAIL_WIDTHS']),
+    }
 
 @main.route('/video_files/<path:filepath>')
 @login_required
 def serve_video_file(filepath):
-    video_folder = current_app.config['VIDEO_FOLDER']
-    return send_from_directory(video_folder, filepath, as_attachment=False)
+    # Gemessen wird bis zur fertigen Antwort (Datei öffnen, Range, Header); die Übertragung selbst nicht.
+    with metrics.span('video_file'):
+        return send_video(current_app.config['VIDEO_FOLDER'], filepath,
+                          mode=current_app.config['VIDEO_DELIVERY_MODE'],
+                          accel_prefix=current_app.config['VIDEO_ACCEL_REDIRECT_PREFIX'])
+
+@main.route('/thumbnails/<path:filename>')
+def serve_thumbnail(filename):
+    # Dateinamen enthalten den Inhalts-Hash und ändern sich nie – der Browser darf sie dauerhaft cachen.
+    response = send_from_directory(current_app.config['THUMBNAIL_FOLDER'], filename, max_age=current_app.config['THUMBNAIL_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @main.route('/scan-videos')
 @login_required
 @admin_required
 def scan_videos():
-    base_path, thumbnail_dest_folder = current_app.config['VIDEO_FOLDER'], current_app.config['THUMBNAIL_FOLDER']
+    """Startet den inkrementellen Scan im Hintergrund; ?full=1 ignoriert das Manifest."""
+    base_path = current_app.config['VIDEO_FOLDER']
     if not os.path.exists(base_path): flash(f"Video-Ordner {base_path} nicht gefunden!", "error"); return redirect(url_for('main.video_stream'))
-    db_videos = {v.filepath: v for v in Video.query.all()}; fs_videos = set(); videos_added, thumbnails_found, metadata_found = 0, 0, 0
-    for dirpath, _, filenames in os.walk(base_path):
-        image_files = {f.lower() for f in filenames if f.lower().endswith(('.jpg', '.png', '.webp'))}; json_files = {f.lower() for f in filenames if f.lower().endswith('.json')}
-        for filename in filenames:
-            if not allowed_video_file(filename): continue
-            full_path, relative_path = os.path.join(dirpath, filename), os.path.relpath(full_path, base_path).replace('\\', '/')
-            fs_videos.add(relative_path)
-            if relative_path not in db_videos:
-                video_name_base = os.path.splitext(filename)[0]; metadata, thumbnail_url = {}, None
-                potential_json_file = f"{video_name_base.lower()}.json"
-                if potential_json_file in json_files:
-                    original_json_filename = next((f for f in filenames if f.lower() == potential_json_file), None)
-                    if original_json_filename:
-                        try:
-                            with open(os.path.join(dirpath, original_json_filename), 'r', encoding='utf-8') as f: metadata = json.load(f)
-                            metadata_found += 1
-                        except Exception as e: current_app.logger.error(f"JSON-Lesefehler: {e}")
-                for img_ext in ['.jpg', '.png', '.webp']:
-                    potential_thumb_name = f"{video_name_base.lower()}{img_ext}"
-                    if potential_thumb_name in image_files:
-                        original_thumb_filename = next((f for f in filenames if f.lower() == potential_thumb_name), None)
-                        if original_thumb_filename:
-                            try:
-                                unique_thumb_name = f"{video_name_base}_{hash(relative_path)}{img_ext}"; shutil.copy2(os.path.join(dirpath, original_thumb_filename), os.path.join(thumbnail_dest_folder, unique_thumb_name))
-                                thumbnail_url = url_for('static', filename=f'thumbnails/{unique_thumb_name}', _external=False); thumbnails_found += 1; break
-                            except Exception as e: current_app.logger.error(f"Thumbnail-Kopierfehler: {e}")
-                new_video = Video(filepath=relative_path, filename=filename, title=metadata.get('title', video_name_base.replace('.', ' ').strip()), category=os.path.basename(dirpath) if dirpath != base_path else "Unkategorisiert", year=metadata.get('year'), genre=metadata.get('genre'), description=metadata.get('description', 'Keine Beschreibung verfügbar.'), thumbnail_url=thumbnail_url)
-                db.session.add(new_video); videos_added += 1
-    videos_to_remove = set(db_videos.keys()) - fs_videos
-    if videos_to_remove:
-        for video_path in videos_to_remove:
-            video_obj = db_videos.get(video_path)
-            if video_obj and video_obj.thumbnail_url:
-                try: os.remove(os.path.join(thumbnail_dest_folder, os.path.basename(video_obj.thumbnail_url)))
-                except OSError as e: current_app.logger.error(f"Thumbnail-Löschfehler: {e}")
-        Video.query.filter(Video.filepath.in_(videos_to_remove)).delete(synchronize_session=False)
-    db.session.commit()
-    flash(f"Scan abgeschlossen. {videos_added} neue Videos, {metadata_found} Metadaten, {thumbnails_found} Thumbnails, {len(videos_to_remove)} entfernte Einträge.", "success")
+    with metrics.span('scan_start'):
+        started = scan_job.start(current_app._get_current_object(), full=request.args.get('full') == '1')
+    if started:
+        flash("Scan gestartet. Der Fortschritt ist im Admin-Bereich sichtbar.", "success")
+    else:
+        flash("Es läuft bereits ein Scan.", "info")
     return redirect(url_for('main.video_stream'))
 
 # --- API-Routen (unverändert) ---
@@ -336,20 +461,25 @@ def login():
     data=request.get_json();
     if not data or'email'not in data or'password'not in data:return jsonify({'error':'Fehlende Daten'}),400
     user=User.query.filter_by(email=data['email']).first()
-    if user and user.check_password(data['password']):login_user(user,remember=True);return jsonify({'message':'Anmeldung erfolgreich.','is_admin':user.is_admin}),200
+    if user and user.check_password(data['password']):
+        if user.upgrade_password_hash(data['password']):db.session.commit()
+        login_user(user,remember=True);return jsonify({'message':'Anmeldung erfolgreich.','is_admin':user.is_admin}),200
     return jsonify({'error':'Ungültige Anmeldedaten.'}),401
 
+@main.errorhandler(HashingBusy)
+def password_hashing_busy(e):return jsonify(e.to_dict()),e.status,retry_after_header(e.to_dict())
+
 @main.route('/api/logout',methods=['POST'])
 @login_required
-def logout():logout_user();return jsonify({'message':'Abmeldung erfolgreich.'}),200
+def logout():user_cache.invalidate(current_user.id);logout_user();return jsonify({'message':'Abmeldung erfolgreich.'}),200
 
 @main.route('/api/admin/status',methods=['GET'])
 @login_required
 @admin_required
 def get_ki_server_status():
-    try:
-        ki_server_url=get_active_ki_server_url();health_response=requests.get(f"{ki_server_url}/health",timeout=REQUESTS_TIMEOUT[0]);health_response.raise_for_status();models_response=requests.get(f"{ki_server_url}/models",timeout=REQUESTS_TIMEOUT[0]);models_response.raise_for_status();return jsonify({'ki_status':health_response.json(),'available_models':models_response.json().get('models',[])}),200
-    except requests.exceptions.RequestException as e:return jsonify({'error':f'KI-Server nicht erreichbar: {e}'}),502
+    state=ki_state.snapshot()
+    if not state['healthy']:return jsonify({'error':f"KI-Server nicht erreichbar: {state['error']}"}),502
+    return jsonify({'ki_status':state['health'],'available_models':state['models'],'active_url':state['active_url'],'backends':state['backends']}),200
 
 @main.route('/api/admin/load_model',methods=['POST'])
 @login_required
@@ -357,15 +487,183 @@ def get_ki_server_status():
 def load_ki_model():
     data=request.get_json();
     if not data or'model'not in data:return jsonify({'error':'Modellname fehlt'}),400
-    try:
-        ki_server_url=get_active_ki_server_url();response=requests.post(f"{ki_server_url}/load_model",json={'model':data['model']},timeout=REQUESTS_TIMEOUT[1]);response.raise_for_status();return jsonify(response.json()),response.status_code
-    except requests.exceptions.RequestException as e:return jsonify({'error':f'Fehler bei Kommunikation mit KI-Server: {e}'}),502
+    # 'backend': Name oder URL eines Backends aus KI_BACKENDS, Standard 'all' (parallel auf allen)
+    target=data.get('backend','all')
+    if target!='all'and not any(target in(b.name,b.url)for b in ki_state.backends):return jsonify({'error':f'Unbekanntes KI-Backend: {target}'}),404
+    results=ki_state.load_model(data['model'],target,timeout=REQUESTS_TIMEOUT[1]);dispatch_cache.clear()
+    loaded=[r['backend']for r in results if r['ok']];failed=[f"{r['backend']}: {r['error']}"for r in results if not r['ok']]
+    if not loaded:return jsonify({'error':f"Fehler bei Kommunikation mit KI-Server: {'; '.join(failed)}",'backends':results}),502
+    message=f"Modell {data['model']} geladen auf: {', '.join(loaded)}."+(f" Fehlgeschlagen: {'; '.join(failed)}"if failed else'')
+    return jsonify({'message':message,'backends':results}),200
+
+@main.route('/api/admin/scan',methods=['GET'])
+@login_required
+@admin_required
+def get_scan_status():return jsonify({**scan_job.progress.to_dict(),'watcher':video_watcher.status()}),200
+
+@main.route('/api/admin/scan',methods=['POST'])
+@login_required
+@admin_required
+def start_scan():
+    data=request.get_json(silent=True) or {}
+    if not os.path.exists(current_app.config['VIDEO_FOLDER']):return jsonify({'error':f"Video-Ordner {current_app.config['VIDEO_FOLDER']} nicht gefunden!"}),404
+    if not scan_job.start(current_app._get_current_object(),full=bool(data.get('full'))):return jsonify({'error':'Es läuft bereits ein Scan.','progress':scan_job.progress.to_dict()}),409
+    return jsonify({'message':'Scan gestartet.','progress':scan_job.progress.to_dict()}),202
+
+@main.route('/api/admin/speculation',methods=['GET'])
+@login_required
+@admin_required
+def get_speculation_stats():return jsonify(speculation_stats.to_dict()),200
+
+@main.route('/api/admin/tool_calls',methods=['GET'])
+@login_required
+@admin_required
+def get_tool_call_stats():return jsonify(tool_calls.to_dict()),200
+
+@main.route('/api/admin/passwords',methods=['GET'])
+@login_required
+@admin_required
+def get_password_hashing_stats():return jsonify(password_hasher.to_dict()),200
+
+@main.route('/api/admin/user_cache',methods=['GET'])
+@login_required
+@admin_required
+def get_user_cache_stats():return jsonify(user_cache.to_dict()),200
+
+@main.route('/api/admin/user_cache',methods=['DELETE'])
+@login_required
+@admin_required
+def clear_user_cache():user_cache.clear();return jsonify(user_cache.to_dict()),200
+
+@main.route('/api/admin/admission',methods=['GET'])
+@login_required
+@admin_required
+def get_admission_status():return jsonify(ki_admission.to_dict()),200
+
+@main.route('/api/admin/chat_context',methods=['GET'])
+@login_required
+@admin_required
+def get_chat_context_stats():return jsonify(context_stats.to_dict()),200
+
+@main.route('/api/admin/dispatch_cache',methods=['GET'])
+@login_required
+@admin_required
+def get_dispatch_cache_stats():return jsonify(dispatch_cache.to_dict()),200
+
+@main.route('/api/admin/dispatch_cache',methods=['DELETE'])
+@login_required
+@admin_required
+def clear_dispatch_cache():dispatch_cache.clear();return jsonify(dispatch_cache.to_dict()),200
+
+@main.route('/metrics',methods=['GET'])
+def prometheus_metrics():
+    # Prometheus per "Authorization: Bearer <METRICS_TOKEN>", im Browser als angemeldeter Admin
+    if not metrics.authorized(request):
+        if not current_user.is_authenticated:abort(401)
+        if not current_user.is_admin:abort(403)
+    return Response(metrics.render(_metrics_extra()),content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _metrics_extra():
+    """Zustand, den die Komponenten ohnehin zählen, zusätzlich zu den Zeitmessungen aus app/timing.py."""
+    backends=ki_state.snapshot()['backends'];cache=dispatch_cache.to_dict();admission=ki_admission.to_dict();chains=tool_calls.to_dict();hashing=password_hasher.to_dict();users=user_cache.to_dict()
+    return [
+        ('coldnet_ki_backend_up','gauge','1 = erreichbar und Circuit Breaker nicht offen',[({'backend':b['name']},int(b['healthy'] and b['breaker']!='open'))for b in backends]),
+        ('coldnet_ki_backend_outstanding','gauge','Laufende Anfragen pro KI-Backend',[({'backend':b['name']},b['outstanding'])for b in backends]),
+        ('coldnet_ki_backend_requests_total','counter','Anfragen pro KI-Backend',[({'backend':b['name']},b['requests'])for b in backends]),
+        ('coldnet_ki_backend_errors_total','counter','Fehlgeschlagene Anfragen pro KI-Backend',[({'backend':b['name']},b['errors'])for b in backends]),
+        ('coldnet_dispatch_cache_lookups_total','counter','Dispatcher-Cache: Treffer und Fehlgriffe',[({'result':'hit'},cache['hits']),({'result':'miss'},cache['misses'])]),
+        ('coldnet_dispatch_cache_entries','gauge','Einträge im Dispatcher-Cache',[({},cache['entries'])]),
+        ('coldnet_admission_total','counter','Zulassungssteuerung pro Spur und Ergebnis',
+         [({'lane':lane,'result':result},stats[result])for lane,stats in admission['stats'].items()for result in('admitted','queued','rejected_full','rejected_wait','cancelled')]),
+        ('coldnet_tool_calls_total','counter','Werkzeugaufrufe in Ketten mit mehreren Aufrufen',[({},chains['calls'])]),
+        ('coldnet_tool_call_round_trips_saved_total','counter','Eingesparte Dispatcher-Runden durch Werkzeugketten',[({},chains['round_trips_saved'])]),
+        ('coldnet_password_hash_operations_total','counter','Passwort-Hashes im Prozess-Pool nach Art',
+         [({'operation':operation},hashing[operation])for operation in('hashed','verified','rehashed','rejected')]),
+        ('coldnet_password_hash_active','gauge','Laufende Passwort-Hash-Vorgänge',[({},hashing['active'])]),
+        ('coldnet_user_cache_lookups_total','counter','user_loader-Cache: Treffer und Fehlgriffe',[({'result':'hit'},users['hits']),({'result':'miss'},users['misses'])]),
+        ('coldnet_user_cache_entries','gauge','Einträge im user_loader-Cache',[({},users['entries'])]),
+    ]
+
+NOTE_FIELDS = ('id', 'title', 'content', 'preview', 'created_at')
+NOTE_DEFAULT_FIELDS = ('id', 'title', 'content', 'created_at')
+NOTE_PREVIEW_LENGTH = 200
+
+def _note_columns(fields):
+    """Lädt nur die angefragten Spalten; id und created_at werden für den Cursor immer gebraucht."""
+    columns = [Note.id, Note.created_at]
+    if 'title' in fields: columns.append(Note.title)
+    if 'content' in fields: columns.append(Note.content)
+    if 'preview' in fields: columns.append(db.func.substr(Note.content, 1, NOTE_PREVIEW_LENGTH).label('preview'))
+    return columns
+
+def _serialize_note_row(row, fields):
+    return {field: (row.created_at.isoformat() if field == 'created_at' else getattr(row, field)) for field in fields}
 
 @main.route('/api/notes', methods=['GET'])
 @login_required
 def get_notes():
-    notes = Note.query.filter_by(user_id=current_user.id).order_by(Note.created_at.desc()).all()
-    return jsonify([{'id': note.id, 'title': note.title, 'content': note.content, 'created_at': note.created_at.isoformat()} for note in notes])
+    """
+    Ohne Parameter: vollständige Liste (bisheriges Format).
+    ?limit=N[&cursor=...]: Keyset-Seite als {"notes": [...], "next_cursor": ...}.
+    ?format=ndjson: alle Notizen zeilenweise gestreamt, Speicherbedarf unabhängig von der Anzahl.
+    ?fields=id,title,preview: nur diese Felder (preview = die ersten 200 Zeichen des Inhalts).
+    """
+    fields = tuple(f.strip() for f in request.args['fields'].split(',')) if request.args.get('fields') else NOTE_DEFAULT_FIELDS
+    if not fields or any(f not in NOTE_FIELDS for f in fields):
+        return jsonify({'error': f"Ungültige Felder. Erlaubt: {', '.join(NOTE_FIELDS)}"}), 400
+    stmt = db.select(*_note_columns(fields)).where(Note.user_id == current_user.id).order_by(Note.created_at.desc(), Note.id.desc())
+
+    if request.args.get('format') == 'ndjson':
+        return _ndjson_notes(stmt, fields)
+
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return jsonify([_serialize_note_row(row, fields) for row in db.session.execute(stmt)])
+
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    if request.args.get('cursor'):
+        try:
+            created_at, note_id = decode_cursor(request.args['cursor'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        stmt = keyset_before(stmt, Note.created_at, Note.id, created_at, note_id)
+    rows = db.session.execute(stmt.limit(limit + 1)).all()
+    next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    return jsonify({'notes': [_serialize_note_row(row, fields) for row in rows[:limit]], 'next_cursor': next_cursor})
+
+def _ndjson_notes(stmt, fields, headers=None):
+    """Zeilenweise gestreamt (yield_per): Speicherbedarf unabhängig von der Anzahl der Notizen."""
+    def generate():
+        for row in db.session.execute(stmt.execution_options(yield_per=500)):
+            yield json.dumps(_serialize_note_row(row, fields), ensure_ascii=False) + "\n"
+    return Response(stream_with_context(generate()), content_type='application/x-ndjson', headers=headers)
+
+@main.route('/api/notes/export', methods=['GET'])
+@login_required
+def export_notes():
+    """Alle Notizen als NDJSON-Download, älteste zuerst; lässt sich unverändert über /api/notes/bulk importieren."""
+    stmt = db.select(*_note_columns(NOTE_DEFAULT_FIELDS)).where(Note.user_id == current_user.id).order_by(Note.id)
+    return _ndjson_notes(stmt, NOTE_DEFAULT_FIELDS, {'Content-Disposition': 'attachment; filename="notizen.ndjson"'})
+
+@main.route('/api/notes/bulk', methods=['POST'])
+@login_required
+def bulk_notes():
+    """
+    NDJSON-Stream aus create/update/delete-Operationen (Format siehe app/note_bulk.py), blockweise in
+    Transaktionen angewendet. Antwort: ein Ergebnis pro Zeile als NDJSON, in derselben Reihenfolge.
+    Die Ergebnisse werden erst nach dem Lesen der ganzen Anfrage gesendet: ein Client, der zuerst alles
+    hochlädt, würde sonst bei großen Importen auf beiden Seiten blockieren.
+    """
+    processor = NoteBulkProcessor(current_user.id)
+    results = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    # request.stream ist ungepuffert: zeilenweises Lesen ginge sonst Byte für Byte.
+    for result in processor.process(io.BufferedReader(request.stream, 64 * 1024)):
+        results.write(json.dumps(result, ensure_ascii=False).encode('utf-8') + b"\n")
+    results.seek(0)
+    counts = processor.counts
+    current_app.logger.info(f"Notiz-Massenänderung: {counts['created']} angelegt, {counts['updated']} geändert, "
+                            f"{counts['deleted']} gelöscht, {counts['failed']} fehlgeschlagen")
+    headers = {f"X-Notes-{key.capitalize()}": str(value) for key, value in counts.items()}
+    return Response(results, content_type='application/x-ndjson', headers=headers)
 
 @main.route('/api/notes', methods=['POST'])
 @login_required
@@ -383,107 +681,319 @@ def delete_note(note_id):
     db.session.delete(note);db.session.commit()
     return jsonify({'message':'Notiz gelöscht'})
 
+@main.route('/api/conversations', methods=['GET'])
+@login_required
+def get_conversations():
+    """Die letzten Unterhaltungen des Benutzers (ohne Nachrichten)."""
+    rows = db.session.execute(
+        db.select(Conversation.id, Conversation.title, Conversation.updated_at)
+        .where(Conversation.user_id == current_user.id).order_by(Conversation.updated_at.desc()).limit(50)
+    ).all()
+    return jsonify([{'id': row.id, 'title': row.title, 'updated_at': row.updated_at.isoformat()} for row in rows])
+
+@main.route('/api/conversations/<int:conversation_id>', methods=['GET'])
+@login_required
+def get_conversation_messages(conversation_id):
+    conversation = get_conversation(current_user.id, conversation_id)
+    if conversation is None:
+        return jsonify({'error': 'Unterhaltung nicht gefunden.'}), 404
+    rows = db.session.execute(
+        db.select(ConversationMessage.role, ConversationMessage.content, ConversationMessage.created_at)
+        .where(ConversationMessage.conversation_id == conversation.id).order_by(ConversationMessage.id)
+    ).all()
+    return jsonify({'id': conversation.id, 'title': conversation.title, 'summary': conversation.summary,
+                    'messages': [{'role': row.role, 'content': row.content, 'created_at': row.created_at.isoformat()} for row in rows]})
+
+@main.route('/api/conversations/<int:conversation_id>', methods=['DELETE'])
+@login_required
+def delete_conversation(conversation_id):
+    conversation = get_conversation(current_user.id, conversation_id)
+    if conversation is None:
+        return jsonify({'error': 'Unterhaltung nicht gefunden.'}), 404
+    db.session.delete(conversation)
+    db.session.commit()
+    return jsonify({'message': 'Unterhaltung gelöscht'})
+
 
 # --- FINALE CHAT-ROUTE ---
 @main.route('/api/chat', methods=['POST'])
 @login_required
 def api_chat():
-    data = request.get_json()
-    if not data or 'messages' not in data or not data['messages']:
-        return jsonify({'error': 'Fehlende Nachrichten'}), 400
+    speculative = None
+
+    def start_speculation(final_payload):
+        # Spekulativer Modus: die coldBot-Antwort startet schon parallel zum Dispatcher und wird
+        # zurückgehalten, bis feststeht, ob stattdessen ein Werkzeug ausgeführt wird.
+        # Nur wenn sofort ein Generierungsplatz frei ist – spekuliert wird nicht auf Kosten wartender Benutzer.
+        nonlocal speculative
+        if current_app.config['CHAT_SPECULATIVE_DISPATCH']:
+            ticket = ki_admission.try_enter('generation', final_payload['model'])
+            if ticket:
+                speculative = SpeculativeStream(
+                    lambda: ki_state.post(final_payload['model'], '/api/chat', json=final_payload, stream=True, timeout=REQUESTS_TIMEOUT[1]),
+                    speculation_stats, on_finish=lambda error: ticket.release())
+
+    plan = plan_chat(request.get_json(), before_llm_dispatch=start_speculation)
+    response = make_response(_chat_response(plan, speculative))
+    response.headers.update(chat_headers(plan))
+    return response
+
+def _chat_response(plan, speculative):
+    if plan.json_body is not None:
+        if speculative:
+            speculative.cancel()
+        return jsonify(plan.json_body), plan.status, retry_after_header(plan.json_body)
+    if plan.events is not None:
+        if speculative:
+            speculative.cancel()
+        events = plan.events
+        if not isinstance(events, list):
+            # Werkzeugkette: ein Generator, der die Werkzeuge erst beim Senden ausführt.
+            events = stream_with_context(events)
+        return Response(iter(events), content_type='text/event-stream', status=plan.status)
+
+    # Fall 2: Kein Werkzeug, normales Gespräch
+    ticket = None
+    try:
+        if speculative:
+            speculative.wait_ready()
+            return Response(stream_with_context(recorded_reply(metrics.stream(iter(speculative), 'ki'), plan)),
+                            content_type=speculative.content_type)
+
+        ticket = ki_admission.enter('generation', plan.payload['model'])
+        if not ticket.granted.is_set():
+            # Warteschlange: Position per SSE melden, danach wie gewohnt streamen.
+            response = Response(stream_with_context(_queued_chat_stream(ticket, plan)), content_type='text/event-stream')
+            response.call_on_close(ticket.release)
+            return response
+
+        ki_response, lease = open_ki_stream(plan)
+
+        def proxy_stream():
+            try:
+                yield from relay_ki_stream(ki_response, lease, plan)
+            finally:
+                ticket.release()
+        response = Response(stream_with_context(proxy_stream()), content_type=ki_response.headers['Content-Type'])
+        response.call_on_close(ticket.release)
+        response.call_on_close(lease.release)
+        return response
+    except AdmissionRejected as e:
+        return jsonify(e.to_dict()), e.status, retry_after_header(e.to_dict())
+    except Exception as e:
+        if speculative:
+            speculative.cancel()
+        if ticket:
+            ticket.release()
+        status, event = _chat_exception_event(e)
+        return Response(iter([event]), content_type='text/event-stream', status=status)
+
+def _queued_chat_stream(ticket, plan):
+    try:
+        yield from queue_events(ticket)
+        ki_response, lease = open_ki_stream(plan)
+        yield from relay_ki_stream(ki_response, lease, plan)
+    except AdmissionRejected as e:
+        # Header sind schon gesendet (200): Abweisung als letzte Nachricht.
+        yield sse_message(e.message)
+    except Exception as e:
+        yield _chat_exception_event(e)[1]
+    finally:
+        ticket.release()
+
+def open_ki_stream(plan):
+    """Startet die Generierung (ggf. auf einem zweiten Backend, solange noch nichts gesendet ist); gibt (Antwort, Lease) zurück."""
+    with metrics.span('ki_connect'):
+        return ki_state.post(plan.payload['model'], plan.stream_path, json=plan.payload, stream=True, timeout=REQUESTS_TIMEOUT[1])
+
+def relay_ki_stream(ki_response, lease, plan):
+    """Reicht die Antwort durch; Verbindung und Backend werden auch bei Abbruch durch den Client freigegeben."""
+    error = None
+    try:
+        yield from recorded_reply(metrics.stream(ki_response.iter_content(chunk_size=1024), 'ki'), plan)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        ki_response.close()
+        lease.release(failed=is_backend_failure(error))
+
+def recorded_reply(chunks, plan):
+    """Reicht die Chunks durch und speichert am Ende (auch bei Abbruch) die Antwort im serverseitigen Verlauf."""
+    if plan.conversation_id is None:
+        yield from chunks
+        return
+    recorder = ReplyRecorder()
+    try:
+        for chunk in chunks:
+            recorder.feed(chunk)
+            yield chunk
+    finally:
+        finish_turn(plan.conversation_id, recorder.text, plan.context)
+
+# Ergebnis von Schritt 1 in api_chat; genau eines von json_body, events oder stream_path ist gesetzt.
+# stream_path ist relativ zum Backend, das erst beim Streamen gewählt wird (ki_state.post).
+# conversation_id/context nur beim serverseitigen Verlauf bzw. wenn ein Prompt für coldBot gebaut wurde.
+ChatPlan = namedtuple('ChatPlan', 'status json_body events stream_path payload conversation_id context', defaults=(None, None))
+
+def chat_headers(plan):
+    """Unterhaltungs-ID für den Client und die Größe des an den KI-Server geschickten Prompts."""
+    headers = {}
+    if plan.conversation_id is not None:
+        headers['X-Conversation-Id'] = str(plan.conversation_id)
+    if plan.stream_path is not None and plan.context is not None:
+        headers['X-Prompt-Tokens'] = str(plan.context.tokens)
+        headers['X-Prompt-Bytes'] = str(plan.context.bytes)
+    return headers
+
+def sse_message(content):
+    return f"data: {json.dumps({'message': {'content': content}})}\n\n"
+
+def tool_call_events(calls, conversation_id):
+    """SSE-Ereignisse einer Werkzeugkette; im Verlauf landet der Text so, wie der Client ihn angezeigt hat."""
+    calls, skipped = tool_calls.limit(calls)
+    replies = []
+    try:
+        for index, call, result in tool_calls.run(calls, AVAILABLE_TOOLS, db.session):
+            reply = result.get("message", UNEXPECTED_RESULT)
+            # Der Client hängt die Inhalte aneinander: Leerzeile als Trenner zwischen den Ergebnissen.
+            content = f"\n\n{reply}" if replies else reply
+            replies.append(reply)
+            tool = {'index': index, 'name': call['tool_name'], 'status': result.get('status', 'error')}
+            yield f"data: {json.dumps({'message': {'content': content}, 'tool': tool})}\n\n"
+        if skipped:
+            note = f"Es wurden nur die ersten {len(calls)} Aktionen ausgeführt; {skipped} weitere bitte erneut anfragen."
+            replies.append(note)
+            yield sse_message(f"\n\n{note}")
+    finally:
+        if conversation_id is not None:
+            finish_turn(conversation_id, "\n\n".join(replies))
+
+def sse_queue_position(ticket):
+    return f"data: {json.dumps({'queue': {'position': ticket.position, 'lane': ticket.lane}})}\n\n"
+
+QUEUE_EVENT_INTERVAL = 1.0
+
+def queue_events(ticket):
+    """Meldet die Warteschlangenposition, bis das Ticket zugelassen ist; dient zugleich als Heartbeat,
+    damit ein getrennter Client seinen Platz sofort wieder freigibt."""
+    timeout = 0
+    while not ticket.wait(timeout):
+        yield sse_queue_position(ticket)
+        timeout = QUEUE_EVENT_INTERVAL
+
+def retry_after_header(body):
+    return {'Retry-After': str(body['retry_after'])} if 'retry_after' in body else {}
+
+def chat_timeout_event(e):
+    current_app.logger.error(f"Timeout-Fehler in /api/chat: {e}", exc_info=True)
+    return 504, sse_message("Der KI-Server hat zu lange für eine Antwort gebraucht. Bitte versuche es in einem Moment erneut.")  # 504 Gateway Timeout
+
+def chat_failure_event(e, connection_error=False):
+    if connection_error:
+        # Endpunkt sofort neu prüfen, damit die nächste Anfrage schon den Fallback nutzt.
+        ki_state.invalidate()
+    current_app.logger.error(f"Schwerer Fehler in /api/chat: {e}", exc_info=True)
+    return 500, sse_message(f"Es ist ein schwerwiegender Serverfehler aufgetreten. (Fehlertyp: {type(e).__name__})")
+
+def _chat_exception_event(e):
+    if isinstance(e, requests.exceptions.ReadTimeout):
+        return chat_timeout_event(e)
+    return chat_failure_event(e, connection_error=isinstance(e, requests.exceptions.ConnectionError))
+
+def plan_chat(data, before_llm_dispatch=None):
+    """
+    Schritt 1 von /api/chat (Dispatcher und ggf. Werkzeug), gemeinsam für api_chat und das
+    asynchrone Chat-Gateway. Braucht einen Request-Kontext mit angemeldetem Benutzer.
+    """
+    if not data or not (data.get('message') or data.get('messages')):
+        return ChatPlan(400, {'error': 'Fehlende Nachrichten'}, None, None, None)
+    if not isinstance(data.get('conversation_id'), (int, type(None))):
+        return ChatPlan(400, {'error': 'Ungültige conversation_id'}, None, None, None)
 
+    conversation_id = None
     try:
-        ki_server_url = get_active_ki_server_url()
-        loaded_model = requests.get(f"{ki_server_url}/health").json().get('loaded_model_name')
+        with metrics.span('ki_state'):
+            loaded_model = ki_state.get_loaded_model()
         if not loaded_model:
-            return jsonify({'error': 'Kein Modell auf dem KI-Server geladen.'}), 503
+            return ChatPlan(503, {'error': 'Kein Modell auf dem KI-Server geladen.'}, None, None, None)
 
-        user_history = data['messages']
-        last_user_message = user_history[-1]['content']
-        
-        # --- 1. SCHRITT: Werkzeug-Dispatcher ---
-        tools_for_prompt = {name: {k: v for k, v in tool_data.items() if k != 'function'} for name, tool_data in AVAILABLE_TOOLS.items()}
-        tool_system_prompt = f"""Du bist ein Tool-Dispatcher. Deine Aufgabe ist es, die Benutzeranfrage zu analysieren und das passende Werkzeug auszuwählen.
-**WICHTIGE REGELN:**
-1. Bei JEDER Benutzeranfrage prüfst du ZUERST, ob sie mit Notizen zusammenhängt.
-2. Auch bei allgemeinen Fragen sollst du prüfen, ob der Benutzer relevante Notizen haben könnte.
-3. Antworte **ausschließlich** mit einem JSON-Objekt.
-4. Wenn ein Werkzeug passt: `{{"tool_name": "name", "arguments": {{"arg1": "wert1"}}}}`
-5. Wenn KEIN Werkzeug passt: `{{"tool_name": "none"}}`
+        if _tool_registry_names != AVAILABLE_TOOLS.keys():
+            refresh_tool_registry()
 
-**BEISPIELE FÜR WERKZEUG-VERWENDUNG:**
-- "Welche Notizen habe ich?" → list_notes
-- "Was weiß ich über Urlaub?" → search_notes mit query="Urlaub"
-- "Notiere dir: Milch kaufen" → create_note
-- "Zeige mir Notiz 5" → get_note_details mit note_id=5
-- "Lösche die Notiz mit ID 3" → delete_note mit note_id=3
-- "Hast du Infos über Python?" → search_notes mit query="Python"
+        max_messages = current_app.config['CHAT_CONTEXT_MAX_MESSAGES']
+        if data.get('messages'):
+            # Bisheriges Format: der Client schickt die gesamte Historie – gekürzt wird trotzdem.
+            user_history, summary = data['messages'], None
+        else:
+            with metrics.span('history'):
+                conversation = start_turn(current_user.id, data.get('conversation_id'), data['message'])
+                if conversation is None:
+                    return ChatPlan(404, {'error': 'Unterhaltung nicht gefunden.'}, None, None, None)
+                conversation_id = conversation.id
+                user_history, summary = load_history(conversation, max_messages), conversation.summary
+        last_user_message = user_history[-1]['content']
 
-**VERFÜGBARE WERKZEUGE:**
-{json.dumps(tools_for_prompt, indent=2, ensure_ascii=False)}
-"""
+        final_system_prompt = "Du bist coldBot, ein freundlicher und hilfsbereiter KI-Assistent. Antworte immer auf Deutsch und formuliere natürliche, konversationelle Antworten."
+        # Nur so viel Verlauf, wie ins Token-Budget passt (neueste Nachrichten zuerst, ältere ggf. als Zusammenfassung).
+        context = build_context(final_system_prompt, user_history, current_app.config['CHAT_CONTEXT_TOKEN_BUDGET'],
+                                max_messages, summary)
+        final_payload = {"model": loaded_model, "messages": context.messages, "stream": True}
         
-        tool_check_payload = {"model": loaded_model, "messages": [{"role": "system", "content": tool_system_prompt}, {"role": "user", "content": last_user_message}], "stream": False, "temperature": 0.0}
-        # KORREKTUR: Längerer Timeout für diese spezifische Anfrage
-        tool_response = requests.post(f"{ki_server_url}/api/chat", json=tool_check_payload, timeout=TOOL_DISPATCH_TIMEOUT)
-        tool_response_content = tool_response.json().get('message', {}).get('content', '')
-        current_app.logger.info(f"Dispatcher KI-Antwort: '{tool_response_content}'")
-
-        # --- 2. SCHRITT: Werkzeug ausführen oder normales Gespräch ---
-        tool_name = None
-        try:
-            json_match = re.search(r'\{.*\}', tool_response_content, re.DOTALL)
-            if json_match:
-                call_data = json.loads(json_match.group())
-                tool_name = call_data.get('tool_name')
-        except (json.JSONDecodeError, KeyError) as e:
-            current_app.logger.error(f"Fehler beim Parsen der Dispatcher-Antwort: {e}. Fahre mit normalem Chat fort.")
-            tool_name = 'none'
-
-        # Fall 1: Ein Werkzeug wurde ausgewählt
-        if tool_name and tool_name != 'none':
-            tool_args = call_data.get('arguments', {})
-            if tool_name in AVAILABLE_TOOLS:
-                tool_function = AVAILABLE_TOOLS[tool_name]["function"]
-                func_params = AVAILABLE_TOOLS[tool_name].get("parameters", [])
-                final_args = {p['name']: tool_args.get(p['name']) for p in func_params if p['name'] in tool_args}
-
-                tool_result = tool_function(**final_args)
-                
-                def tool_result_stream():
-                    sse_data = {"message": {"content": tool_result.get("message", "Ein unerwarteter Fehler im Werkzeug ist aufgetreten.")}}
-                    yield f"data: {json.dumps(sse_data)}\n\n"
-                return Response(tool_result_stream(), content_type='text/event-stream')
-            else:
-                def error_stream():
-                    sse_data = {"message": {"content": f"Die KI wollte ein unbekanntes Werkzeug namens '{tool_name}' verwenden."}}
-                    yield f"data: {json.dumps(sse_data)}\n\n"
-                return Response(error_stream(), content_type='text/event-stream')
-
-        # Fall 2: Kein Werkzeug, normales Gespräch
+        # --- 1. SCHRITT: Werkzeug-Dispatcher ---
+        # Eindeutige Anfragen (z.B. "Zeige mir Notiz 5", "Hallo") entscheidet der lokale Klassifikator
+        # ohne LLM-Aufruf; alles Unsichere geht wie bisher an den Dispatcher.
+        fast_intent = intent_classifier.classify(last_user_message) if current_app.config['INTENT_FASTPATH_ENABLED'] else None
+        if fast_intent and fast_intent.confidence >= current_app.config['INTENT_CONFIDENCE_THRESHOLD']:
+            current_app.logger.info(f"Fast-Path-Dispatcher: {fast_intent}")
+            calls = decision_calls({'tool_name': fast_intent.tool_name, 'arguments': fast_intent.arguments})
+        elif (cached := dispatch_cache.get(last_user_message, loaded_model, TOOL_REGISTRY_VERSION)) is not None:
+            current_app.logger.info(f"Dispatcher-Entscheidung aus dem Cache: {cached}")
+            calls = decision_calls(cached)
         else:
-            final_system_prompt = "Du bist coldBot, ein freundlicher und hilfsbereiter KI-Assistent. Antworte immer auf Deutsch und formuliere natürliche, konversationelle Antworten."
-            messages_for_final_response = [{"role": "system", "content": final_system_prompt}] + user_history
-            
-            final_payload = {"model": loaded_model, "messages": messages_for_final_response, "stream": True}
-            ki_response = requests.post(f"{ki_server_url}/api/chat", json=final_payload, stream=True, timeout=REQUESTS_TIMEOUT[1])
-            ki_response.raise_for_status()
-
-            return Response(stream_with_context(ki_response.iter_content(chunk_size=1024)), content_type=ki_response.headers['Content-Type'])
-
-    except requests.exceptions.ReadTimeout as e:
-        current_app.logger.error(f"Timeout-Fehler in /api/chat: {e}", exc_info=True)
-        error_payload = {"message": {"content": "Der KI-Server hat zu lange für eine Antwort gebraucht. Bitte versuche es in einem Moment erneut."}}
-        def error_stream():
-            yield f"data: {json.dumps(error_payload)}\n\n"
-        return Response(error_stream(), content_type='text/event-stream', status=504) # 504 Gateway Timeout
+            if before_llm_dispatch:
+                before_llm_dispatch(final_payload)
+            tool_check_payload = {"model": loaded_model, "messages": [{"role": "system", "content": TOOL_SYSTEM_PROMPT}, {"role": "user", "content": last_user_message}], "stream": False, "temperature": 0.0}
+            # KORREKTUR: Längerer Timeout für diese spezifische Anfrage
+            # Phase 'dispatcher' inkl. Wartezeit in der Zulassungssteuerung
+            with metrics.span('dispatcher'), ki_admission.slot('dispatcher', loaded_model):
+                tool_response, lease = ki_state.post(loaded_model, '/api/chat', json=tool_check_payload, timeout=TOOL_DISPATCH_TIMEOUT)
+                lease.release()
+            with metrics.span('dispatch_parse'):
+                tool_response_content = tool_response.json().get('message', {}).get('content', '')
+                current_app.logger.info(f"Dispatcher KI-Antwort: '{tool_response_content}'")
+
+                # Ein Aufruf, eine Liste ({"tool_calls": [...]}) oder keiner (siehe app/tool_calls.py)
+                calls = parse_tool_calls(tool_response_content)
+                if calls is None:
+                    current_app.logger.error("Dispatcher-Antwort enthält keine lesbare Entscheidung. Fahre mit normalem Chat fort.")
+                    calls = []
+                # Nur gültige Entscheidungen merken; unbekannte Werkzeuge soll der Dispatcher erneut prüfen.
+                elif all(c['tool_name'] in AVAILABLE_TOOLS and isinstance(c['arguments'], dict) for c in calls):
+                    dispatch_cache.put(last_user_message, loaded_model, TOOL_REGISTRY_VERSION, dispatch_decision(calls))
+
+        # --- 2. SCHRITT: Werkzeug(e) ausführen oder normales Gespräch ---
+        # Fall 1: Ein Werkzeug wurde ausgewählt
+        if len(calls) == 1:
+            tool_result = invoke_tool(AVAILABLE_TOOLS, calls[0])
+            reply = tool_result.get("message", UNEXPECTED_RESULT)
+            if conversation_id is not None:
+                finish_turn(conversation_id, reply)
+            return ChatPlan(200, None, [sse_message(reply)], None, None, conversation_id)
+        # Fall 1b: Mehrere Werkzeuge – jedes Ergebnis als eigenes Ereignis, sobald es feststeht
+        if calls:
+            # Die Kette läuft erst beim Senden, mit einer neuen DB-Session; current_user ist ein gelöster
+            # CachedUser (app/user_cache.py) und bleibt dort lesbar.
+            return ChatPlan(200, None, tool_call_events(calls, conversation_id), None, None, conversation_id)
+
+        # Fall 2: Kein Werkzeug – der Aufrufer streamt die coldBot-Antwort
+        context_stats.record_turn(context, conversation_id)
+        current_app.logger.info(f"Prompt für coldBot: {context.window_messages} Nachrichten, ~{context.tokens} Tokens, "
+                                f"{context.bytes} Bytes, {context.dropped} ausgelassen, Zusammenfassung: {context.summarized}")
+        return ChatPlan(200, None, None, '/api/chat', final_payload, conversation_id, context)
+
+    except AdmissionRejected as e:
+        return ChatPlan(e.status, e.to_dict(), None, None, None, conversation_id)
     except Exception as e:
-        current_app.logger.error(f"Schwerer Fehler in /api/chat: {e}", exc_info=True)
-        error_payload = {
-            "message": {
-                "content": f"Es ist ein schwerwiegender Serverfehler aufgetreten. (Fehlertyp: {type(e).__name__})"
-            }
-        }
-        def error_stream():
-            yield f"data: {json.dumps(error_payload)}\n\n"
-        return Response(error_stream(), content_type='text/event-stream', status=500)
+        status, event = _chat_exception_event(e)
+        return ChatPlan(status, None, [event], None, None, conversation_id)
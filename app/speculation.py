@@ -0,0 +1,168 @@
+# Ordner: /coldNet/app/
+# Datei: speculation.py
+
+import queue
+import threading
+import time
+
+from .ki_state import is_backend_failure
+
+_END = object()
+
+
+class SpeculationStats:
+    """Threadsichere Zähler dafür, was die spekulative Generierung bringt und kostet."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = 0
+            self.flushed = 0
+            self.cancelled = 0
+            self.failed = 0
+            self.wasted_bytes = 0
+            self.wasted_chunks = 0
+            self.wasted_seconds = 0.0
+
+    def record_start(self):
+        with self._lock:
+            self.started += 1
+
+    def record_flush(self):
+        with self._lock:
+            self.flushed += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def record_cancel(self, stream):
+        with self._lock:
+            self.cancelled += 1
+            self.wasted_bytes += stream.bytes_received
+            self.wasted_chunks += stream.chunks_received
+            self.wasted_seconds += time.perf_counter() - stream.started_at
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'started': self.started,
+                'flushed': self.flushed,
+                'cancelled': self.cancelled,
+                'failed': self.failed,
+                'cancel_rate': round(self.cancelled / self.started, 4) if self.started else 0.0,
+                'wasted_bytes': self.wasted_bytes,
+                'wasted_chunks': self.wasted_chunks,
+                'wasted_seconds': round(self.wasted_seconds, 3),
+            }
+
+
+class SpeculativeStream:
+    """
+    Startet die Streaming-Antwort von coldBot in einem Hintergrund-Thread, während
+    der Dispatcher noch entscheidet. Die Chunks werden zurückgehalten, bis die
+    Route sie entweder ausliefert (Iteration) oder verwirft (cancel()).
+
+    open_upstream() liefert (Antwort, Lease) wie ki_state.post() – mit derselben Wiederholung
+    auf einem anderen Backend. Das Lease gibt der Stream nach dem letzten Chunk selbst frei.
+    """
+
+    def __init__(self, open_upstream, stats, on_finish=None):
+        self._open_upstream = open_upstream
+        self._on_finish = on_finish
+        self._stats = stats
+        self._queue = queue.Queue()
+        self._ready = threading.Event()
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self.response = None
+        self.lease = None
+        self.error = None
+        self.content_type = 'text/event-stream'
+        self.bytes_received = 0
+        self.chunks_received = 0
+        self.started_at = time.perf_counter()
+        stats.record_start()
+        self._thread = threading.Thread(target=self._run, name='ki-speculative-stream', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._stream()
+        finally:
+            if self.lease is not None:
+                self.lease.release(failed=is_backend_failure(self.error))
+            # z.B. den Generierungsplatz der Zulassungssteuerung freigeben
+            if self._on_finish:
+                self._on_finish(self.error)
+
+    def _stream(self):
+        try:
+            response, self.lease = self._open_upstream()
+            self.content_type = response.headers.get('Content-Type', self.content_type)
+        except Exception as e:
+            self.error = e
+            self._ready.set()
+            self._queue.put(_END)
+            return
+        with self._lock:
+            self.response = response
+            if self._cancelled.is_set():
+                # Schon verworfen, während die Verbindung aufgebaut wurde.
+                response.close()
+        self._ready.set()
+        try:
+            for chunk in self.response.iter_content(chunk_size=1024):
+                if self._cancelled.is_set():
+                    break
+                self.bytes_received += len(chunk)
+                self.chunks_received += 1
+                self._queue.put(chunk)
+        except Exception as e:
+            if not self._cancelled.is_set():
+                self.error = e
+        finally:
+            self.response.close()
+            self._queue.put(_END)
+
+    def wait_ready(self):
+        """Blockiert bis die Antwort-Header da sind und wirft Fehler der Upstream-Anfrage weiter."""
+        self._ready.wait()
+        if self.error is not None:
+            self._stats.record_failure()
+            raise self.error
+        self._stats.record_flush()
+
+    def cancel(self):
+        """Verwirft die Generierung und schließt die Upstream-Verbindung sofort – coldBot bricht dann ab."""
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self._cancelled.set()
+            if self.response is not None:
+                # shutdown() (urllib3 >= 2.3) weckt auch einen Lese-Thread, der gerade in recv() hängt; der
+                # Fehler, den er dadurch bekommt, zählt wegen _cancelled nicht. Den Rest erledigt _stream().
+                shutdown = getattr(self.response.raw, 'shutdown', None)
+                if shutdown is not None:
+                    try:
+                        shutdown()
+                    except RuntimeError:
+                        pass   # Antwort schon vollständig gelesen, Verbindung liegt wieder im Pool
+                else:
+                    self.response.close()
+        if self.error is None:
+            self._stats.record_cancel(self)
+
+    def __iter__(self):
+        try:
+            while True:
+                chunk = self._queue.get()
+                if chunk is _END:
+                    break
+                yield chunk
+        finally:
+            # Client hat die Verbindung getrennt (oder Stream ist fertig): Upstream nicht weiterlaufen lassen.
+            self._cancelled.set()
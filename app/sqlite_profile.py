@@ -0,0 +1,32 @@
+# Ordner: /coldNet/app/
+# Datei: sqlite_profile.py
+
+from sqlalchemy import event
+
+# Standardprofil für coldnet.db: WAL erlaubt paralleles Lesen während eines Schreibvorgangs,
+# NORMAL ist unter WAL absturzsicher und spart das fsync pro Commit.
+DEFAULT_SQLITE_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,          # ms warten statt sofort "database is locked"
+    'cache_size': -64000,          # negativ = KiB, also ~64 MB Page-Cache pro Verbindung
+    'mmap_size': 268435456,        # 256 MB memory-mapped I/O
+    'temp_store': 'MEMORY',
+}
+
+
+def init_sqlite_profile(app, engine):
+    """Setzt die PRAGMAs aus SQLITE_PROFILE bei jeder neuen SQLite-Verbindung."""
+    app.config.setdefault('SQLITE_PROFILE', dict(DEFAULT_SQLITE_PROFILE))
+    profile = app.config['SQLITE_PROFILE']
+    if not profile or engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _apply_profile(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in profile.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
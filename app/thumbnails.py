@@ -0,0 +1,120 @@
+# Ordner: /coldNet/app/
+# Datei: thumbnails.py
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow ist optional: ohne wird das Original unter seinem Inhalts-Hash abgelegt.
+    Image = None
+
+# Muss zur Route serve_thumbnail in routes.py passen.
+THUMBNAIL_URL_PREFIX = '/thumbnails/'
+_VARIANT_RE = re.compile(r'^(?P<digest>[0-9a-f]{16})-(?P<width>\d+)\.webp$')
+
+
+def content_digest(path, chunk_size=1024 * 1024):
+    """Stabiler Name aus dem Dateiinhalt – gleiche Bilder ergeben denselben Namen, auch nach Neustarts."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class ThumbnailPipeline:
+    """
+    Erzeugt Thumbnails in einem Thread-Pool: pro Quellbild eine WebP-Variante je
+    Breite aus THUMBNAIL_WIDTHS, benannt nach dem Inhalts-Hash. Existieren die
+    Varianten schon, wird nichts neu kodiert.
+    """
+
+    def __init__(self, app):
+        self.logger = app.logger
+        self.folder = app.config['THUMBNAIL_FOLDER']
+        self.widths = sorted(app.config['THUMBNAIL_WIDTHS'])
+        self.quality = app.config['THUMBNAIL_WEBP_QUALITY']
+        self._executor = ThreadPoolExecutor(max_workers=app.config['THUMBNAIL_WORKERS'], thread_name_prefix='thumbnail')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._executor.shutdown(wait=True)
+
+    def submit(self, source_path):
+        """Future mit der URL der kleinsten Variante (oder None bei Fehlern)."""
+        return self._executor.submit(self._process, source_path)
+
+    def _write_atomic(self, name, write):
+        target = os.path.join(self.folder, name)
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, target)
+
+    def _process(self, source_path):
+        try:
+            digest = content_digest(source_path)
+            if Image is None:
+                name = f"{digest}{os.path.splitext(source_path)[1].lower()}"
+                if not os.path.exists(os.path.join(self.folder, name)):
+                    self._write_atomic(name, lambda tmp: shutil.copyfile(source_path, tmp))
+                return f"{THUMBNAIL_URL_PREFIX}{name}"
+
+            names = [f"{digest}-{width}.webp" for width in self.widths]
+            if not all(os.path.exists(os.path.join(self.folder, name)) for name in names):
+                with Image.open(source_path) as original:
+                    image = ImageOps.exif_transpose(original)
+                    image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+                    for width, name in zip(self.widths, names):
+                        variant = image.copy()
+                        # Nie hochskalieren: kleinere Originale behalten ihre Größe.
+                        variant.thumbnail((width, width * 10), Image.LANCZOS)
+                        self._write_atomic(name, lambda tmp: variant.save(tmp, 'WEBP', quality=self.quality, method=4))
+            return f"{THUMBNAIL_URL_PREFIX}{names[0]}"
+        except Exception as e:
+            self.logger.error(f"Thumbnail-Fehler für {source_path}: {e}")
+            return None
+
+
+def thumbnail_srcset(thumbnail_url, widths):
+    """Template-Filter: srcset aller Varianten zu einer gespeicherten Thumbnail-URL."""
+    if not thumbnail_url:
+        return ''
+    match = _VARIANT_RE.match(os.path.basename(thumbnail_url))
+    if not match:
+        return ''
+    return ", ".join(f"{THUMBNAIL_URL_PREFIX}{match['digest']}-{width}.webp {width}w" for width in sorted(widths))
+
+
+def collect_garbage(folder, referenced_urls):
+    """Löscht alle Thumbnails, auf die kein Video mehr verweist. Gibt die Anzahl gelöschter Dateien zurück."""
+    keep_names, keep_digests = set(), set()
+    for url in referenced_urls:
+        if not url:
+            continue
+        name = os.path.basename(url)
+        match = _VARIANT_RE.match(name)
+        if match:
+            keep_digests.add(match['digest'])
+        else:
+            keep_names.add(name)
+    removed = 0
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name in keep_names:
+                continue
+            match = _VARIANT_RE.match(entry.name)
+            if match and match['digest'] in keep_digests:
+                continue
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
@@ -0,0 +1,214 @@
+# Ordner: /coldNet/app/
+# Datei: timing.py
+
+"""
+Zeitmessung der heißen Pfade (Spans) mit Export im Prometheus-Textformat.
+
+`with metrics.span('dispatcher'):` misst eine Phase. Die Dauer landet im Histogramm
+coldnet_phase_seconds{phase="dispatcher"} und innerhalb eines Requests zusätzlich in dessen
+Phasenliste. Daraus entstehen der Server-Timing-Header (alle Phasen bis zum Senden der
+Header) und ab METRICS_SLOW_REQUEST_MS ein Log-Eintrag mit allen Phasen inkl. Streaming.
+Ist METRICS_ENABLED aus, liefert span() ein geteiltes No-op-Objekt und die Request-Hooks
+werden gar nicht erst registriert.
+"""
+
+import bisect
+import hmac
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_NOOP = nullcontext()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}' if labels else ''
+
+
+class _Span:
+    __slots__ = ('_metrics', '_name', '_start')
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.record(self._name, time.perf_counter() - self._start)
+
+
+class Metrics:
+    """Threadsichere Histogramme und Zähler; ein Prozess, ein Satz Werte (pro gunicorn-Worker getrennt)."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._histograms = {}      # (Name, Labels) -> [Bucket-Zähler..., Summe, Anzahl]
+        self._counters = {}        # (Name, Labels) -> Wert
+        self._help = {}
+        self.enabled = True
+        self.buckets = DEFAULT_BUCKETS
+        self.slow_request_ms = 0
+        self.token = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', self.enabled)
+        app.config.setdefault('METRICS_BUCKETS', self.buckets)
+        app.config.setdefault('METRICS_SLOW_REQUEST_MS', self.slow_request_ms)
+        app.config.setdefault('METRICS_TOKEN', self.token)
+        self.enabled = app.config['METRICS_ENABLED']
+        self.buckets = tuple(sorted(app.config['METRICS_BUCKETS']))
+        self.slow_request_ms = app.config['METRICS_SLOW_REQUEST_MS']
+        self.token = app.config['METRICS_TOKEN']
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+        if self.enabled:
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+            app.teardown_request(self._teardown_request)
+        app.extensions['metrics'] = self
+
+    # --- Erfassen ---
+    def observe(self, name, value, labels=(), help=None):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = [0] * (len(self.buckets) + 2)
+                self._help.setdefault(name, help)
+            if index < len(self.buckets):
+                histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def inc(self, name, labels=(), amount=1, help=None):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + amount
+            self._help.setdefault(name, help)
+
+    def record(self, phase, seconds):
+        """Eine gemessene Phase: Histogramm und – im Request – Phasenliste für Server-Timing und Slow-Log."""
+        if not self.enabled:
+            return
+        self.observe('coldnet_phase_seconds', seconds, (('phase', phase),), 'Dauer einzelner Phasen (Spans) in Sekunden')
+        if has_request_context():
+            g.setdefault('timing_spans', []).append((phase, seconds))
+
+    def span(self, phase):
+        return _Span(self, phase) if self.enabled else _NOOP
+
+    def timed(self, phase):
+        """Decorator: misst jeden Aufruf der Funktion als Phase (z.B. die _tool_*-Funktionen)."""
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+                with _Span(self, phase):
+                    return f(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stream(self, chunks, prefix):
+        """Reicht die Chunks durch und misst <prefix>_first_token (bis zum ersten Chunk) und <prefix>_stream (gesamt)."""
+        if not self.enabled:
+            return chunks
+        return self._timed_stream(chunks, prefix)
+
+    def _timed_stream(self, chunks, prefix):
+        start = time.perf_counter()
+        first = True
+        try:
+            for chunk in chunks:
+                if first:
+                    self.record(f"{prefix}_first_token", time.perf_counter() - start)
+                    first = False
+                yield chunk
+        finally:
+            self.record(f"{prefix}_stream", time.perf_counter() - start)
+
+    # --- Request-Hooks (nur registriert, wenn aktiviert) ---
+    def _before_request(self):
+        g.timing_start = time.perf_counter()
+
+    def server_timing(self):
+        """Server-Timing-Header aus den bisherigen Phasen des Requests (Browser-DevTools zeigen sie an)."""
+        spans = g.get('timing_spans', ())
+        parts = [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in spans]
+        if 'timing_start' in g:
+            parts.append(f"app;dur={(time.perf_counter() - g.timing_start) * 1000:.1f}")
+        return ', '.join(parts)
+
+    def _after_request(self, response):
+        g.timing_status = response.status_code
+        header = self.server_timing()
+        if header:
+            response.headers['Server-Timing'] = header
+        return response
+
+    def _teardown_request(self, exc):
+        # Läuft bei stream_with_context erst nach dem letzten Chunk: die Dauer umfasst das Streaming.
+        if 'timing_start' not in g:
+            return
+        seconds = time.perf_counter() - g.timing_start
+        endpoint = request.endpoint or 'unmatched'
+        status = g.get('timing_status', 500)
+        self.observe('coldnet_http_request_seconds', seconds, (('endpoint', endpoint),),
+                     'Dauer der Requests in Sekunden (bei Streams bis zum letzten Chunk)')
+        self.inc('coldnet_http_requests_total', (('endpoint', endpoint), ('method', request.method), ('status', status)),
+                 help='Anzahl der Requests')
+        if self.slow_request_ms and seconds * 1000 >= self.slow_request_ms:
+            self.inc('coldnet_slow_requests_total', (('endpoint', endpoint),), help='Requests über METRICS_SLOW_REQUEST_MS')
+            phases = ', '.join(f"{phase} {value * 1000:.1f} ms" for phase, value in g.get('timing_spans', ()))
+            current_app.logger.warning(f"Langsame Anfrage: {request.method} {request.path} {status} in "
+                                       f"{seconds * 1000:.0f} ms ({phases or 'keine Phasen gemessen'})")
+
+    # --- Export ---
+    def authorized(self, req):
+        """Bearer-Token für Prometheus (METRICS_TOKEN); ohne Token nur angemeldete Admins (prüft die Route)."""
+        header = req.headers.get('Authorization', '')
+        return bool(self.token) and hmac.compare_digest(header, f"Bearer {self.token}")
+
+    def render(self, extra=()):
+        """
+        Prometheus-Textformat. extra: Werte, die andere Komponenten selbst zählen, als
+        (Name, 'gauge'/'counter', Hilfetext, [(Labels, Wert), ...]), z.B. Zustand der KI-Backends.
+        """
+        lines = []
+        with self._lock:
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+            counters = dict(self._counters)
+            help_texts = dict(self._help)
+        for name in sorted({name for name, _ in histograms}):
+            lines += [f"# HELP {name} {help_texts.get(name) or name}", f"# TYPE {name} histogram"]
+            for (metric, labels), values in sorted(histograms.items(), key=lambda item: item[0][1]):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+        for name in sorted({name for name, _ in counters}):
+            lines += [f"# HELP {name} {help_texts.get(name) or name}", f"# TYPE {name} counter"]
+            lines += [f"{name}{_format_labels(labels)} {value}"
+                      for (metric, labels), value in sorted(counters.items(), key=lambda item: str(item[0][1])) if metric == name]
+        for name, kind, help_text, samples in extra:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_format_labels(tuple(labels.items()))} {value}" for labels, value in samples]
+        return '\n'.join(lines) + '\n'
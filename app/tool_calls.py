@@ -0,0 +1,202 @@
+# Ordner: /coldNet/app/
+# Datei: tool_calls.py
+
+"""
+Mehrere Werkzeugaufrufe pro Dispatcher-Antwort.
+
+Statt eines Objekts {"tool_name", "arguments"} darf der Dispatcher {"tool_calls": [...]}
+liefern, z.B. für "lösche Notiz 3 und 7 und zeig mir dann meine Notizen". Die Aufrufe
+werden in ihrer Reihenfolge in Phasen zerlegt: aufeinanderfolgende lesende Werkzeuge
+("read_only" in AVAILABLE_TOOLS) laufen parallel in einem Thread-Pool, aufeinanderfolgende
+schreibende nacheinander in einer gemeinsamen Transaktion. Eine Phase beginnt erst, wenn
+die vorige fertig (bzw. committet) ist – "lösche 3, dann zeig meine Notizen" sieht die
+Löschung. Ohne Liste wäre jede weitere Aktion eine eigene Runde Benutzer -> Dispatcher-LLM;
+diese Runden zählt round_trips_saved.
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import copy_current_request_context, current_app, g
+
+UNEXPECTED_RESULT = "Ein unerwarteter Fehler im Werkzeug ist aufgetreten."
+
+
+def parse_tool_calls(content):
+    """
+    Werkzeugaufrufe aus der Dispatcher-Antwort: ein Objekt, {"tool_calls": [...]}, eine Liste oder mehrere
+    Objekte hintereinander, auch mit Text drumherum. Gibt [{"tool_name", "arguments"}, ...] zurück
+    ([] = kein Werkzeug) oder None, wenn keine Entscheidung lesbar ist.
+    """
+    decoder = json.JSONDecoder()
+    values, index = [], 0
+    while True:
+        starts = [i for i in (content.find('{', index), content.find('[', index)) if i >= 0]
+        if not starts:
+            break
+        try:
+            value, index = decoder.raw_decode(content, min(starts))
+            values.append(value)
+        except ValueError:
+            index = min(starts) + 1
+
+    calls = []
+    for value in values:
+        items = value['tool_calls'] if isinstance(value, dict) and 'tool_calls' in value else value
+        for item in items if isinstance(items, list) else [items]:
+            if isinstance(item, dict) and isinstance(item.get('tool_name'), str):
+                calls.append({'tool_name': item['tool_name'], 'arguments': item.get('arguments', {})})
+    if not calls:
+        return None
+    return [call for call in calls if call['tool_name'] != 'none']
+
+
+def dispatch_decision(calls):
+    """Form für den Dispatcher-Cache; ein einzelner Aufruf bleibt im bisherigen Format."""
+    if not calls:
+        return {'tool_name': 'none', 'arguments': {}}
+    if len(calls) == 1:
+        return {'tool_name': calls[0]['tool_name'], 'arguments': calls[0]['arguments']}
+    return {'tool_calls': calls}
+
+
+def decision_calls(decision):
+    """Gegenstück zu dispatch_decision()."""
+    if 'tool_calls' in decision:
+        return decision['tool_calls']
+    if decision.get('tool_name') in (None, 'none'):
+        return []
+    return [{'tool_name': decision['tool_name'], 'arguments': decision.get('arguments', {})}]
+
+
+def invoke_tool(tools, call):
+    """Führt einen Aufruf aus; nur die deklarierten Parameter werden übergeben."""
+    tool = tools.get(call['tool_name'])
+    if tool is None:
+        return {"status": "error", "message": f"Die KI wollte ein unbekanntes Werkzeug namens '{call['tool_name']}' verwenden."}
+    arguments = call.get('arguments') if isinstance(call.get('arguments'), dict) else {}
+    final_args = {p['name']: arguments.get(p['name']) for p in tool.get('parameters', []) if p['name'] in arguments}
+    return tool['function'](**final_args)
+
+
+def in_tool_transaction():
+    """True, während eine Werkzeugkette schreibt: Werkzeuge flushen dann nur, committet wird am Ende der Phase."""
+    return g.get('tool_transaction', False)
+
+
+class ToolCallExecutor:
+    """Führt die Werkzeugaufrufe einer Dispatcher-Antwort aus und zählt, wie viele Dispatcher-Runden das spart."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pool = None
+        self.max_calls = 8
+        self.max_parallel = 4
+        self._reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TOOL_CALLS_MAX', self.max_calls)
+        app.config.setdefault('TOOL_CALLS_MAX_PARALLEL', self.max_parallel)
+        self.max_calls = app.config['TOOL_CALLS_MAX']
+        self.max_parallel = app.config['TOOL_CALLS_MAX_PARALLEL']
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            self._reset_stats()
+        app.extensions['tool_calls'] = self
+
+    def _reset_stats(self):
+        self.multi_call_turns = 0
+        self.calls = 0
+        self.parallel_reads = 0
+        self.write_transactions = 0
+        self.rollbacks = 0
+        self.truncated = 0
+        self.round_trips_saved = 0
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix='tool-call')
+            return self._pool
+
+    def limit(self, calls):
+        """Kürzt auf TOOL_CALLS_MAX Aufrufe; gibt (ausgeführte Aufrufe, Anzahl weggelassener) zurück."""
+        if len(calls) <= self.max_calls:
+            return calls, 0
+        with self._lock:
+            self.truncated += 1
+        return calls[:self.max_calls], len(calls) - self.max_calls
+
+    def run(self, calls, tools, session):
+        """
+        Generator: liefert (Index, Aufruf, Ergebnis) in der Reihenfolge, in der die Ergebnisse feststehen –
+        lesende Werkzeuge sobald sie fertig sind, schreibende erst nach dem Commit ihrer Phase.
+        Braucht einen Request-Kontext mit angemeldetem Benutzer; session ist die DB-Session des Requests.
+        """
+        with self._lock:
+            self.multi_call_turns += 1
+            self.calls += len(calls)
+            self.round_trips_saved += len(calls) - 1
+        phases = []
+        for index, call in enumerate(calls):
+            read_only = tools.get(call['tool_name'], {}).get('read_only', True)
+            if phases and phases[-1][0] == read_only:
+                phases[-1][1].append((index, call))
+            else:
+                phases.append((read_only, [(index, call)]))
+        for read_only, items in phases:
+            yield from self._run_reads(items, tools) if read_only else self._run_writes(items, tools, session)
+
+    def _run_reads(self, items, tools):
+        if len(items) == 1:
+            index, call = items[0]
+            yield index, call, self._safe_invoke(tools, call)
+            return
+        with self._lock:
+            self.parallel_reads += len(items)
+        # Eigener Request-Kontext pro Thread: eigene DB-Session, current_user wird dort neu geladen.
+        futures = {self._executor().submit(copy_current_request_context(self._safe_invoke), tools, call): (index, call)
+                   for index, call in items}
+        for future in as_completed(futures):
+            index, call = futures[future]
+            yield index, call, future.result()
+
+    def _run_writes(self, items, tools, session):
+        g.tool_transaction = True
+        try:
+            results = [(index, call, invoke_tool(tools, call)) for index, call in items]
+            session.commit()
+            with self._lock:
+                self.write_transactions += 1
+        except Exception as e:
+            session.rollback()
+            current_app.logger.error(f"Werkzeugkette fehlgeschlagen, Änderungen zurückgerollt: {e}", exc_info=True)
+            with self._lock:
+                self.rollbacks += 1
+            message = "Ein interner Fehler ist aufgetreten; keine dieser Änderungen wurde gespeichert."
+            results = [(index, call, {"status": "error", "message": message}) for index, call in items]
+        finally:
+            g.tool_transaction = False
+        yield from results
+
+    @staticmethod
+    def _safe_invoke(tools, call):
+        try:
+            return invoke_tool(tools, call)
+        except Exception as e:
+            current_app.logger.error(f"Werkzeug {call['tool_name']} fehlgeschlagen: {e}", exc_info=True)
+            return {"status": "error", "message": UNEXPECTED_RESULT}
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'max_calls': self.max_calls, 'max_parallel': self.max_parallel,
+                'multi_call_turns': self.multi_call_turns, 'calls': self.calls,
+                'parallel_reads': self.parallel_reads, 'write_transactions': self.write_transactions,
+                'rollbacks': self.rollbacks, 'truncated': self.truncated, 'round_trips_saved': self.round_trips_saved,
+            }
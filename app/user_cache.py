@@ -0,0 +1,127 @@
+# Ordner: /coldNet/app/
+# Datei: user_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+
+class CachedUser(UserMixin):
+    """
+    Schlanke, von der DB-Session gelöste Kopie eines Benutzers für current_user: id, E-Mail und
+    Admin-Flag reichen für login_required, admin_required und die Templates. Vergleiche mit
+    einem User-Objekt (note.author != current_user) laufen über die ID (UserMixin.__eq__).
+    """
+
+    __slots__ = ('id', 'email', 'is_admin')
+
+    def __init__(self, id, email, is_admin):
+        self.id = id
+        self.email = email
+        self.is_admin = bool(is_admin)
+
+    def __repr__(self):
+        return f"CachedUser('{self.email}', Admin: {self.is_admin})"
+
+
+class UserCache:
+    """
+    Zwischenspeicher für den user_loader von Flask-Login.
+
+    Ohne Cache kostet jede angemeldete Anfrage – auch jeder Range-Request auf /video_files und
+    jede Chatrunde – eine Abfrage der user-Tabelle. Gespeichert werden CachedUser-Datensätze
+    pro Benutzer-ID, verdrängt nach LRU und nach USER_CACHE_TTL Sekunden. Änderungen an einem
+    User (Admin-Flag, Passwort, Löschen) entfernen den Eintrag, siehe die Events in app/models.py;
+    ebenso die Abmeldung. Der Cache gilt pro Prozess: in anderen gunicorn-Workern begrenzt die TTL,
+    wie lange eine Änderung noch nicht sichtbar ist.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # Benutzer-ID -> (CachedUser, Ablaufzeit)
+        self._generation = 0            # zählt invalidate()/clear(), siehe get()
+        self.enabled = True
+        self.max_entries = 1024
+        self.ttl = 60
+        self._reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_ENABLED', self.enabled)
+        app.config.setdefault('USER_CACHE_MAX_ENTRIES', self.max_entries)
+        app.config.setdefault('USER_CACHE_TTL', self.ttl)
+        self.enabled = app.config['USER_CACHE_ENABLED']
+        self.max_entries = app.config['USER_CACHE_MAX_ENTRIES']
+        self.ttl = app.config['USER_CACHE_TTL']
+        with self._lock:
+            self._entries.clear()
+            self._reset_stats()
+        app.extensions['user_cache'] = self
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidations = 0
+
+    def get(self, user_id, loader):
+        """CachedUser für user_id; bei einem Fehlgriff lädt loader(user_id) den Datensatz (None = unbekannt)."""
+        if not self.enabled:
+            return loader(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                if time.monotonic() < entry[1]:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[user_id]
+                self.expired += 1
+            self.misses += 1
+            generation = self._generation
+        user = loader(user_id)
+        # Unbekannte IDs (gelöschte Benutzer) werden nicht gespeichert. Ebenso nichts, wenn während des Ladens
+        # invalidiert wurde: der geladene Stand kann dann schon veraltet sein (z.B. Admin-Recht gerade entzogen).
+        if user is not None:
+            with self._lock:
+                if generation != self._generation:
+                    return user
+                self._entries[user_id] = (user, time.monotonic() + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evicted += 1
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def to_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,85 @@
+# Ordner: /coldNet/app/
+# Datei: video_catalog.py
+
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from . import db
+from .models import Video
+
+# Nur die Spalten, die das Grid anzeigt; die Beschreibung wird auf die zwei sichtbaren Zeilen gekürzt.
+CatalogRow = namedtuple('CatalogRow', 'id filepath title category year description thumbnail_url')
+DESCRIPTION_PREVIEW_CHARS = 240
+UNCATEGORIZED = 'Unkategorisiert'
+
+
+def catalog_query():
+    """Die einzige SQL-Abfrage des Katalogs; Seiten und Zählungen pro Kategorie entstehen daraus im Speicher."""
+    return db.select(Video.id, Video.filepath, Video.title, Video.category, Video.year,
+                     func.substr(Video.description, 1, DESCRIPTION_PREVIEW_CHARS), Video.thumbnail_url)\
+        .order_by(Video.category, Video.title)
+
+
+class CatalogSnapshot:
+    """Unveränderlicher Stand des Katalogs: Zeilen nach (category, title), fertig gruppiert."""
+
+    def __init__(self, rows, built_at):
+        self.built_at = built_at
+        self.by_id = {row.id: row for row in rows}
+        self.by_category = {}
+        for row in rows:
+            self.by_category.setdefault(row.category or UNCATEGORIZED, []).append(row)
+        self.by_category = {cat: tuple(items) for cat, items in self.by_category.items()}
+        self.categories = ["Alle"] + sorted({row.category for row in rows if row.category})
+        self.total = len(rows)
+
+    def filtered(self, category="Alle", ids=None):
+        """{Kategorie: Zeilen} für die Auswahl; ids schränkt auf Suchtreffer aus dem Suchindex ein."""
+        groups = self.by_category if category == "Alle" else \
+            {cat: rows for cat, rows in self.by_category.items() if cat == category}
+        if ids is None:
+            return groups
+        result = {}
+        for cat, rows in groups.items():
+            matches = tuple(row for row in rows if row.id in ids)
+            if matches:
+                result[cat] = matches
+        return result
+
+
+class VideoCatalog:
+    """
+    In-Prozess-Cache für /video-stream. Wird nach jedem Video-Scan verworfen; die TTL
+    sorgt dafür, dass auch andere Worker-Prozesse Scans spätestens nach VIDEO_CATALOG_TTL sehen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.builds = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def get(self, ttl=None):
+        snapshot = self._snapshot
+        if snapshot is not None and (not ttl or time.time() - snapshot.built_at < ttl):
+            return snapshot
+        with self._lock:
+            # Nur ein Thread baut neu, die übrigen nehmen danach dessen Ergebnis.
+            snapshot = self._snapshot
+            if snapshot is None or (ttl and time.time() - snapshot.built_at >= ttl):
+                snapshot = self._snapshot = self._build()
+            return snapshot
+
+    def _build(self):
+        rows = [CatalogRow(*row) for row in db.session.execute(catalog_query())]
+        self.builds += 1
+        return CatalogSnapshot(rows, time.time())
+
+
+video_catalog = VideoCatalog()
@@ -0,0 +1,136 @@
+# Ordner: /coldNet/app/
+# Datei: video_delivery.py
+
+"""
+Auslieferung der NAS-Videos für /video_files.
+
+VIDEO_DELIVERY_MODE:
+- 'flask'      bisheriges send_from_directory (Worker streamt die Datei selbst)
+- 'sendfile'   eigener Range-Responder; unter Servern mit wsgi.file_wrapper (z.B. gunicorn)
+               überträgt der Kernel die Bytes per sendfile() ohne Kopie durch Python
+- 'x-accel'    nginx: Flask prüft nur die Anmeldung, nginx liefert über eine interne Location aus:
+                   location /protected_videos/ { internal; alias /mnt/nas_videos/.../videos/; }
+               (VIDEO_ACCEL_REDIRECT_PREFIX = '/protected_videos/')
+- 'x-sendfile' Apache mod_xsendfile / lighttpd: Header mit dem absoluten Dateipfad
+"""
+
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Response, abort, request, send_from_directory
+from werkzeug.security import safe_join
+
+DELIVERY_MODES = ('flask', 'sendfile', 'x-accel', 'x-sendfile')
+BLOCK_SIZE = 256 * 1024
+
+
+def _etag(stat_result):
+    return f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+
+
+class _RangeFile:
+    """Liest genau `length` Bytes ab der aktuellen Position – Fallback ohne wsgi.file_wrapper."""
+
+    def __init__(self, f, length):
+        self.f, self.remaining = f, length
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.remaining <= 0:
+            raise StopIteration
+        data = self.f.read(min(BLOCK_SIZE, self.remaining))
+        if not data:
+            raise StopIteration
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def _base_response(full_path, stat_result, mimetype):
+    response = Response(status=200, mimetype=mimetype)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(_etag(stat_result))
+    response.last_modified = stat_result.st_mtime
+    # Nur für angemeldete Benutzer: nicht in geteilten Caches ablegen.
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response
+
+
+def _range_response(full_path, stat_result, mimetype):
+    """200/206/304/416 mit korrekter Range-, ETag- und If-None-Match-Behandlung."""
+    size = stat_result.st_size
+    response = _base_response(full_path, stat_result, mimetype)
+    etag = _etag(stat_result)
+
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and request.if_modified_since
+            and int(stat_result.st_mtime) <= request.if_modified_since.timestamp()):
+        response.status_code = 304
+        return response
+
+    start, end = 0, size
+    byte_range = request.range
+    # If-Range: Range nur anwenden, wenn sich die Datei seit dem Teil-Download nicht geändert hat.
+    if byte_range and request.if_range.etag and request.if_range.etag != etag:
+        byte_range = None
+    if byte_range and byte_range.units == 'bytes' and len(byte_range.ranges) == 1:
+        requested = byte_range.range_for_length(size)
+        if requested is None:
+            response.status_code = 416
+            response.headers['Content-Range'] = f"bytes */{size}"
+            return response
+        start, end = requested
+        response.status_code = 206
+        response.headers['Content-Range'] = f"bytes {start}-{end - 1}/{size}"
+
+    f = open(full_path, 'rb')
+    f.seek(start)
+    length = end - start
+    response.content_length = length
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    # Player fragen fast immer "bytes=N-" an: bis zum Dateiende darf der Server (gunicorn & Co.)
+    # ab der aktuellen Position per sendfile() senden. Nicht jeder file_wrapper hält sich an
+    # Content-Length, deshalb Teilbereiche mitten aus der Datei über den begrenzten Leser.
+    if file_wrapper and end == size:
+        response.response = file_wrapper(f, BLOCK_SIZE)
+    else:
+        response.response = _RangeFile(f, length)
+    response.direct_passthrough = True
+    return response
+
+
+def send_video(video_folder, filepath, mode='flask', accel_prefix='/protected_videos/'):
+    if mode == 'flask':
+        return send_from_directory(video_folder, filepath, as_attachment=False)
+
+    full_path = safe_join(video_folder, filepath)
+    if full_path is None:
+        abort(404)
+    try:
+        stat_result = os.stat(full_path)
+    except OSError:
+        abort(404)
+    if not os.path.isfile(full_path):
+        abort(404)
+    mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    if mode == 'x-accel':
+        response = _base_response(full_path, stat_result, mimetype)
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(filepath)}"
+        return response
+    if mode == 'x-sendfile':
+        response = _base_response(full_path, stat_result, mimetype)
+        response.headers['X-Sendfile'] = os.path.abspath(full_path)
+        return response
+    return _range_response(full_path, stat_result, mimetype)
+
+
+def init_video_delivery(app):
+    if app.config['VIDEO_DELIVERY_MODE'] not in DELIVERY_MODES:
+        raise ValueError(f"Unbekannter VIDEO_DELIVERY_MODE: {app.config['VIDEO_DELIVERY_MODE']}")
@@ -0,0 +1,249 @@
+# Ordner: /coldNet/app/
+# Datei: video_index.py
+
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict, namedtuple
+
+from . import db
+from .models import Video
+from .video_catalog import UNCATEGORIZED
+
+_TOKEN_RE = re.compile(r'\w+')
+FACETS = ('category', 'genre', 'year')
+PREFIX_CACHE_SIZE = 512
+# Bis zu dieser Treffermenge wird direkt sortiert, darüber die vorsortierte Titelreihenfolge abgelaufen.
+SORT_THRESHOLD = 2000
+SearchResult = namedtuple('SearchResult', 'ids total facets')
+
+
+class _FoldTable(dict):
+    """str.translate-Tabelle, die jedes Zeichen beim ersten Auftreten zerlegt und die Diakritika entfernt."""
+
+    def __missing__(self, codepoint):
+        decomposed = unicodedata.normalize('NFKD', chr(codepoint))
+        self[codepoint] = folded = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+        return folded
+
+
+_FOLD_TABLE = _FoldTable()
+
+
+def fold(text):
+    """Kleinschreibung ohne Diakritika: 'Amélie' -> 'amelie', 'Straße' -> 'strasse'."""
+    if text.isascii():
+        return text.casefold()
+    return text.translate(_FOLD_TABLE).casefold()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(fold(text)) if text else []
+
+
+class VideoSearchIndex:
+    """
+    Invertierter Index über Titel, Beschreibung und Genre aller Videos.
+
+    Jeder Suchbegriff wird als Präfix behandelt (Suche während des Tippens), mehrere
+    Begriffe werden UND-verknüpft. Zu jeder Suche werden die Facetten Kategorie, Genre
+    und Jahr gezählt – jeweils mit allen Filtern außer dem der eigenen Facette, damit
+    die Auswahl einer Kategorie die übrigen Kategorien nicht ausblendet. Alle Mengen-
+    operationen laufen über Python-Sets, also ohne Schleife pro Video.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._generation = 0       # zählt inkrementelle Änderungen, siehe build()
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}            # id -> (Sortierschlüssel, Facettenwerte, Tokens, Titel-Tokens)
+        self._by_path = {}
+        self._postings = {}        # Token -> Menge von Video-IDs
+        self._title_postings = {}
+        self._facets = {facet: {} for facet in FACETS}   # Facette -> Wert -> Menge von Video-IDs
+        self._order = []           # (Sortierschlüssel, id) in Titelreihenfolge
+        self._vocabulary = None    # sortierte Tokens für die Präfixsuche, nach Änderungen neu aufgebaut
+        self._prefix_cache = OrderedDict()
+        self.built_at = None
+
+    # --- Aufbau ---
+    def _add(self, video_id, filepath, title, category, genre, year, description, ordered=False):
+        title_tokens = frozenset(tokenize(title))
+        tokens = title_tokens | frozenset(tokenize(description)) | frozenset(tokenize(genre))
+        values = (category or UNCATEGORIZED, genre or None, year)
+        sort_key = (fold(title or ''), video_id)
+        self._docs[video_id] = (sort_key, values, tokens, title_tokens)
+        self._by_path[filepath] = video_id
+        for token in tokens:
+            self._postings.setdefault(token, set()).add(video_id)
+        for token in title_tokens:
+            self._title_postings.setdefault(token, set()).add(video_id)
+        for facet, value in zip(FACETS, values):
+            if value is not None:
+                self._facets[facet].setdefault(value, set()).add(video_id)
+        if ordered:
+            insort(self._order, sort_key)
+
+    def _remove(self, video_id):
+        doc = self._docs.pop(video_id, None)
+        if doc is None:
+            return
+        sort_key, values, tokens, title_tokens = doc
+        for index, keys in ((self._postings, tokens), (self._title_postings, title_tokens),
+                            *((self._facets[facet], (value,)) for facet, value in zip(FACETS, values) if value is not None)):
+            for key in keys:
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(video_id)
+                    if not ids:
+                        del index[key]
+        position = bisect_left(self._order, sort_key)
+        if position < len(self._order) and self._order[position] == sort_key:
+            del self._order[position]
+
+    @staticmethod
+    def _select():
+        return db.select(Video.id, Video.filepath, Video.title, Video.category, Video.genre, Video.year,
+                         Video.description)
+
+    def build(self):
+        """Baut den Index neben dem alten auf und tauscht ihn danach aus – Suchen laufen währenddessen weiter."""
+        generation = self._generation
+        rows = db.session.execute(self._select()).all()
+        fresh = VideoSearchIndex()
+        for row in rows:
+            fresh._add(*row)
+        fresh._order = sorted(doc[0] for doc in fresh._docs.values())
+        with self._lock:
+            if generation != self._generation and self.built_at is not None:
+                return  # Während des Aufbaus kam ein Scan-Ergebnis hinzu; der alte Stand ist aktueller.
+            for name in ('_docs', '_by_path', '_postings', '_title_postings', '_facets', '_order'):
+                setattr(self, name, getattr(fresh, name))
+            self._vocabulary = None
+            self._prefix_cache.clear()
+            self.built_at = time.time()
+
+    def ensure_built(self, app, ttl=None):
+        """
+        Erster Aufruf baut synchron. Nach Ablauf der TTL (Scans aus anderen Worker-Prozessen)
+        wird im Hintergrund neu gebaut, bis dahin gilt der bisherige Stand.
+        """
+        if self.built_at is None:
+            with self._build_lock:
+                if self.built_at is None:
+                    self.build()
+        elif ttl and time.time() - self.built_at >= ttl and self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild, args=(app,), name='video-index', daemon=True).start()
+
+    def _rebuild(self, app):
+        try:
+            with app.app_context():
+                self.build()
+        except Exception as e:
+            app.logger.error(f"Suchindex konnte nicht neu aufgebaut werden: {e}")
+        finally:
+            self._build_lock.release()
+
+    def invalidate(self):
+        with self._lock:
+            self.built_at = None
+
+    def apply_changes(self, changed_paths, removed_paths, chunk_size=500):
+        """Nach einem Scan nur die geänderten Videos neu indizieren."""
+        if self.built_at is None:
+            return
+        changed_paths = list(changed_paths)
+        rows = []
+        for start in range(0, len(changed_paths), chunk_size):
+            chunk = changed_paths[start:start + chunk_size]
+            rows.extend(db.session.execute(self._select().where(Video.filepath.in_(chunk))).all())
+        with self._lock:
+            for path in list(removed_paths) + changed_paths:
+                video_id = self._by_path.pop(path, None)
+                if video_id is not None:
+                    self._remove(video_id)
+            for row in rows:
+                self._add(*row, ordered=True)
+            self._generation += 1
+            self._vocabulary = None
+            self._prefix_cache.clear()
+
+    # --- Suche ---
+    def _prefix(self, term, postings):
+        """Vereinigung der Postings aller Tokens mit diesem Präfix; beim Tippen wiederholen sich Präfixe."""
+        cache_key = (term, postings is self._title_postings)
+        cached = self._prefix_cache.get(cache_key)
+        if cached is not None:
+            self._prefix_cache.move_to_end(cache_key)
+            return cached
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary, ids, i = self._vocabulary, set(), bisect_left(self._vocabulary, term)
+        while i < len(vocabulary) and vocabulary[i].startswith(term):
+            ids.update(postings.get(vocabulary[i], ()))
+            i += 1
+        self._prefix_cache[cache_key] = ids = frozenset(ids)
+        if len(self._prefix_cache) > PREFIX_CACHE_SIZE:
+            self._prefix_cache.popitem(last=False)
+        return ids
+
+    def _match(self, terms, postings):
+        matched = None
+        for term in terms:
+            ids = self._prefix(term, postings)
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                break
+        return matched
+
+    def match_ids(self, query):
+        """Alle Treffer als Menge (unsortiert, ohne Facetten) – für das Filtern des Katalogs."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            return set(self._match(terms, self._postings)) if terms else set(self._docs)
+
+    def _top(self, ids, limit):
+        if len(ids) <= SORT_THRESHOLD:
+            return [key[1] for key in sorted(self._docs[video_id][0] for video_id in ids)[:limit]]
+        top = []
+        for _, video_id in self._order:
+            if video_id in ids:
+                top.append(video_id)
+                if len(top) == limit:
+                    break
+        return top
+
+    def search(self, query, category=None, genre=None, year=None, limit=20):
+        filters = {'category': category, 'genre': genre, 'year': year}
+        filters = {facet: value for facet, value in filters.items() if value not in (None, '', "Alle")}
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            matched = self._match(terms, self._postings) if terms else self._docs.keys()
+            filter_sets = {facet: self._facets[facet].get(value, frozenset()) for facet, value in filters.items()}
+
+            facets = {}
+            for facet in FACETS:
+                base = set(matched)
+                for other, ids in filter_sets.items():
+                    if other != facet:
+                        base &= ids
+                counts = ((value, len(base & ids)) for value, ids in self._facets[facet].items())
+                facets[facet] = dict(sorted(((v, n) for v, n in counts if n), key=lambda item: -item[1]))
+
+            results = set(matched)
+            for ids in filter_sets.values():
+                results &= ids
+            # Treffer aller Begriffe im Titel zuerst, danach alphabetisch.
+            title_hits = results & self._match(terms, self._title_postings) if terms else set()
+            top = self._top(title_hits, limit)
+            if len(top) < limit:
+                top += self._top(results - title_hits, limit - len(top))
+        return SearchResult(top, len(results), facets)
+
+
+video_index = VideoSearchIndex()
@@ -0,0 +1,345 @@
+# Ordner: /coldNet/app/
+# Datei: video_scanner.py
+
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import bindparam, delete, insert, update
+
+from . import db, metrics
+from .models import Video
+from .thumbnails import ThumbnailPipeline, collect_garbage
+from .video_catalog import video_catalog
+from .video_index import video_index
+
+IMAGE_EXTENSIONS = ('.jpg', '.png', '.webp')
+# Version 2: Thumbnails mit Inhalts-Hash (app/thumbnails.py) – ältere Manifeste erzwingen einen Neuaufbau.
+MANIFEST_VERSION = 2
+
+
+class ScanProgress:
+    """Threadsicherer Fortschritt des laufenden bzw. letzten Scans für den Admin-Endpunkt."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {'state': 'idle'}
+
+    def reset(self, **initial):
+        with self._lock:
+            self._data = {
+                'state': 'running', 'started_at': time.time(), 'finished_at': None, 'error': None,
+                'current_dir': None, 'dirs_scanned': 0, 'dirs_skipped': 0, 'files_seen': 0,
+                'videos_added': 0, 'videos_updated': 0, 'videos_removed': 0, 'videos_unchanged': 0,
+                'metadata_found': 0, 'thumbnails_found': 0, 'thumbnails_removed': 0,
+            }
+            self._data.update(initial)
+
+    def update(self, **values):
+        with self._lock:
+            self._data.update(values)
+
+    def increment(self, key, amount=1):
+        with self._lock:
+            self._data[key] = self._data.get(key, 0) + amount
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self._data)
+
+
+def load_manifest(path, base_path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('base_path') != base_path:
+        return None
+    return manifest
+
+
+def save_manifest(path, manifest):
+    # Atomar schreiben, damit ein abgebrochener Scan kein halbes Manifest hinterlässt.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+class VideoScanner:
+    """
+    Inkrementeller Scan von VIDEO_FOLDER.
+
+    Das Manifest merkt sich pro Verzeichnis dessen mtime, die enthaltenen Videos,
+    Sidecar-JSONs und Bilder mit (Größe, mtime) sowie die Unterverzeichnisse.
+    Unveränderte Verzeichnisse werden nicht erneut gelistet, nur ihre Sidecars
+    werden neu gestat'et (In-place-Bearbeitungen ändern die Verzeichnis-mtime nicht).
+    Datenbankänderungen werden gesammelt und in Batches geschrieben.
+
+    Mit `dirs` (relative Verzeichnisse, z.B. vom VideoWatcher) werden nur diese
+    Verzeichnisse neu gelistet, neu hinzugekommene Unterverzeichnisse rekursiv.
+    Alles andere wird unverändert aus dem Manifest übernommen.
+    """
+
+    def __init__(self, app, progress, full=False, dirs=None):
+        self.app = app
+        self.progress = progress
+        self.full = full
+        self.dirs = None if full or dirs is None else set(dirs)
+        self.base_path = app.config['VIDEO_FOLDER']
+        self.thumbnail_folder = app.config['THUMBNAIL_FOLDER']
+        self.manifest_path = app.config['VIDEO_MANIFEST_PATH']
+        self.batch_size = app.config['VIDEO_SCAN_BATCH_SIZE']
+        self.video_extensions = app.config['ALLOWED_VIDEO_EXTENSIONS']
+        self._inserts, self._updates = [], []
+        # Für die inkrementelle Aktualisierung des Suchindex
+        self.changed_paths, self.removed_paths = [], []
+        # Verzeichnisse, deren Videos dieser Lauf verbindlich kennt (Löschkandidaten)
+        self._touched_dirs = set()
+        # (Zeile, Manifest-Eintrag, Future) – Thumbnails laufen parallel und werden vor dem Schreiben eingesammelt.
+        self._pending = []
+        self.pipeline = None
+
+    # --- Dateisystem ---
+    def _classify(self, name):
+        ext = os.path.splitext(name)[1].lower()
+        if ext in self.video_extensions:
+            return 'video'
+        if ext == '.json' or ext in IMAGE_EXTENSIONS:
+            return 'sidecar'
+        return None
+
+    def _list_directory(self, abs_dir):
+        files, subdirs = {}, []
+        with os.scandir(abs_dir) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif self._classify(entry.name) and entry.is_file():
+                    st = entry.stat()
+                    files[entry.name] = [st.st_size, st.st_mtime]
+        return files, sorted(subdirs)
+
+    def _restat_sidecars(self, abs_dir, cached_files):
+        files = {}
+        for name, signature in cached_files.items():
+            if self._classify(name) != 'sidecar':
+                files[name] = signature
+                continue
+            try:
+                st = os.stat(os.path.join(abs_dir, name))
+                files[name] = [st.st_size, st.st_mtime]
+            except FileNotFoundError:
+                pass
+        return files
+
+    # --- Metadaten & Thumbnails ---
+    def _read_metadata(self, abs_dir, json_name):
+        if not json_name:
+            return {}
+        try:
+            with open(os.path.join(abs_dir, json_name), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            self.progress.increment('metadata_found')
+            return metadata if isinstance(metadata, dict) else {}
+        except Exception as e:
+            self.app.logger.error(f"JSON-Lesefehler: {e}")
+            return {}
+
+    # --- Datenbank in Batches ---
+    def _resolve_thumbnails(self):
+        for row, manifest_entry, future in self._pending:
+            thumbnail_url = future.result() if future else None
+            if thumbnail_url:
+                self.progress.increment('thumbnails_found')
+            row['thumbnail_url'] = manifest_entry['thumb'] = thumbnail_url
+        self._pending = []
+
+    def _flush(self, force=False):
+        if not force and len(self._pending) < self.batch_size:
+            return
+        self._resolve_thumbnails()
+        if self._inserts:
+            db.session.execute(insert(Video), self._inserts)
+            self.progress.increment('videos_added', len(self._inserts))
+            self._inserts = []
+        if self._updates:
+            # Core-executemany: alle übrigen Schlüssel der Zeilen werden zu SET-Spalten.
+            table = Video.__table__
+            stmt = update(table).where(table.c.filepath == bindparam('b_filepath'))
+            db.session.execute(stmt, [{**{k: v for k, v in row.items() if k != 'filepath'}, 'b_filepath': row['filepath']}
+                                      for row in self._updates])
+            self.progress.increment('videos_updated', len(self._updates))
+            self._updates = []
+        db.session.commit()
+
+    def _process_directory(self, rel_dir, abs_dir, files, db_videos, old_videos, new_videos):
+        by_lower = {name.lower(): name for name in files}
+        category = os.path.basename(abs_dir) if rel_dir else "Unkategorisiert"
+        for name in files:
+            if self._classify(name) != 'video':
+                continue
+            self.progress.increment('files_seen')
+            relative_path = f"{rel_dir}/{name}" if rel_dir else name
+            video_name_base = os.path.splitext(name)[0]
+            json_name = by_lower.get(f"{video_name_base.lower()}.json")
+            image_name = next((by_lower[f"{video_name_base.lower()}{ext}"] for ext in IMAGE_EXTENSIONS
+                               if f"{video_name_base.lower()}{ext}" in by_lower), None)
+            signature = [files[name], [json_name, files.get(json_name)], [image_name, files.get(image_name)]]
+
+            previous = old_videos.get(relative_path)
+            exists = relative_path in db_videos
+            if exists and not self.full and previous and previous['sig'] == signature:
+                new_videos[relative_path] = previous
+                self.progress.increment('videos_unchanged')
+                continue
+
+            metadata = self._read_metadata(abs_dir, json_name)
+            row = {
+                'filepath': relative_path, 'filename': name,
+                'title': metadata.get('title', video_name_base.replace('.', ' ').strip()),
+                'category': category, 'year': metadata.get('year'), 'genre': metadata.get('genre'),
+                'description': metadata.get('description', 'Keine Beschreibung verfügbar.'),
+                'thumbnail_url': None,
+            }
+            (self._updates if exists else self._inserts).append(row)
+            self.changed_paths.append(relative_path)
+            new_videos[relative_path] = {'sig': signature, 'thumb': None}
+            future = self.pipeline.submit(os.path.join(abs_dir, image_name)) if image_name else None
+            self._pending.append((row, new_videos[relative_path], future))
+            self._flush()
+
+    def run(self):
+        if not os.path.exists(self.base_path):
+            raise FileNotFoundError(f"Video-Ordner {self.base_path} nicht gefunden!")
+        old_manifest = None if self.full else load_manifest(self.manifest_path, self.base_path)
+        if old_manifest is None:
+            self.dirs = None  # Ohne Manifest fehlt die Grundlage für einen Teil-Scan.
+        old_dirs = old_manifest['dirs'] if old_manifest else {}
+        old_videos = old_manifest['videos'] if old_manifest else {}
+        if self.dirs is None:
+            new_dirs, new_videos, stack = {}, {}, ['']
+        else:
+            new_dirs, new_videos, stack = dict(old_dirs), dict(old_videos), sorted(self.dirs, reverse=True)
+        # Nur zwei Spalten laden statt aller Video-Objekte.
+        db_videos = dict(db.session.execute(db.select(Video.filepath, Video.thumbnail_url)).all())
+
+        with metrics.span('scan_walk'), ThumbnailPipeline(self.app) as self.pipeline:
+            self._walk(stack, old_dirs, old_videos, new_dirs, new_videos, db_videos)
+            self._flush(force=True)
+
+        videos_to_remove = self.removed_paths = [
+            path for path in db_videos if path not in new_videos
+            and (self.dirs is None or os.path.dirname(path) in self._touched_dirs)]
+        with metrics.span('scan_remove'):
+            for start in range(0, len(videos_to_remove), self.batch_size):
+                chunk = videos_to_remove[start:start + self.batch_size]
+                db.session.execute(delete(Video).where(Video.filepath.in_(chunk)))
+                db.session.commit()
+                self.progress.increment('videos_removed', len(chunk))
+
+        # Thumbnails sind per Inhalt geteilt: gelöscht wird erst, wenn kein Video mehr darauf verweist.
+        with metrics.span('scan_thumbnail_gc'):
+            referenced = db.session.execute(db.select(Video.thumbnail_url).where(Video.thumbnail_url.isnot(None))).scalars()
+            self.progress.update(thumbnails_removed=collect_garbage(self.thumbnail_folder, referenced))
+
+        save_manifest(self.manifest_path, {'version': MANIFEST_VERSION, 'base_path': self.base_path,
+                                           'dirs': new_dirs, 'videos': new_videos})
+
+    def _drop_subtree(self, rel_dir, new_dirs, new_videos):
+        """Teil-Scan: ein gelöschtes oder verschobenes Verzeichnis samt Inhalt aus dem Manifest nehmen."""
+        prefix = f"{rel_dir}/"
+        for key in [key for key in new_dirs if key == rel_dir or key.startswith(prefix)]:
+            del new_dirs[key]
+            self._touched_dirs.add(key)
+        for key in [key for key in new_videos if key.startswith(prefix)]:
+            del new_videos[key]
+
+    def _walk(self, stack, old_dirs, old_videos, new_dirs, new_videos, db_videos):
+        scoped = self.dirs is not None
+        seen = set()
+        while stack:
+            rel_dir = stack.pop()
+            if rel_dir in seen:
+                continue
+            seen.add(rel_dir)
+            abs_dir = os.path.join(self.base_path, rel_dir) if rel_dir else self.base_path
+            try:
+                dir_mtime = os.stat(abs_dir).st_mtime
+                # Beim Teil-Scan ist jedes angefragte Verzeichnis per Definition geändert.
+                cached = None if scoped else old_dirs.get(rel_dir)
+                if cached and cached['mtime'] == dir_mtime:
+                    files, subdirs = self._restat_sidecars(abs_dir, cached['files']), cached['subdirs']
+                    self.progress.increment('dirs_skipped')
+                else:
+                    files, subdirs = self._list_directory(abs_dir)
+                    self.progress.increment('dirs_scanned')
+            except FileNotFoundError:
+                if scoped and rel_dir:
+                    self._drop_subtree(rel_dir, new_dirs, new_videos)
+                continue
+            except OSError as e:
+                self.app.logger.error(f"Verzeichnis nicht lesbar: {abs_dir}: {e}")
+                continue
+            self.progress.update(current_dir=rel_dir or '/')
+            if scoped:
+                previous = old_dirs.get(rel_dir)
+                if previous:
+                    for sub in set(previous['subdirs']) - set(subdirs):
+                        self._drop_subtree(f"{rel_dir}/{sub}" if rel_dir else sub, new_dirs, new_videos)
+                    for name in previous['files']:
+                        new_videos.pop(f"{rel_dir}/{name}" if rel_dir else name, None)
+                self._touched_dirs.add(rel_dir)
+            new_dirs[rel_dir] = {'mtime': dir_mtime, 'files': files, 'subdirs': subdirs}
+            self._process_directory(rel_dir, abs_dir, files, db_videos, old_videos, new_videos)
+            children = (f"{rel_dir}/{sub}" if rel_dir else sub for sub in reversed(subdirs))
+            # Teil-Scan: bekannte Unterverzeichnisse bleiben, wie sie im Manifest stehen.
+            stack.extend(child for child in children if not scoped or child not in old_dirs)
+
+
+class VideoScanJob:
+    """Führt höchstens einen Scan gleichzeitig in einem Hintergrund-Thread aus."""
+
+    def __init__(self):
+        self.progress = ScanProgress()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app, full=False, dirs=None):
+        with self._lock:
+            if self.is_running():
+                return False
+            self.progress.reset(full=full, dirs=sorted(dirs) if dirs is not None else None)
+            self._thread = threading.Thread(target=self._run, args=(app, full, dirs), name='video-scan', daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, app, full, dirs):
+        with app.app_context():
+            try:
+                scanner = VideoScanner(app, self.progress, full=full, dirs=dirs)
+                with metrics.span('scan'):
+                    scanner.run()
+                with metrics.span('scan_index'):
+                    video_index.apply_changes(scanner.changed_paths, scanner.removed_paths)
+                self.progress.update(state='done', finished_at=time.time(), current_dir=None)
+            except Exception as e:
+                db.session.rollback()
+                video_index.invalidate()
+                app.logger.error(f"Video-Scan fehlgeschlagen: {e}", exc_info=True)
+                self.progress.update(state='error', error=str(e), finished_at=time.time())
+            finally:
+                # Auch ein abgebrochener Scan hat schon Batches geschrieben.
+                video_catalog.invalidate()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+scan_job = VideoScanJob()
@@ -0,0 +1,350 @@
+# Ordner: /coldNet/app/
+# Datei: video_watcher.py
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+import click
+from flask import current_app
+
+from .video_scanner import IMAGE_EXTENSIONS, load_manifest, scan_job
+
+logger = logging.getLogger(__name__)
+
+# inotify(7)
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x002, 0x004, 0x008
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x040, 0x080, 0x100, 0x200
+IN_DELETE_SELF, IN_MOVE_SELF = 0x400, 0x800
+IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR = 0x4000, 0x8000, 0x40000000
+# Kein IN_MODIFY: beim Kopieren großer Videos käme es für jeden Block – IN_CLOSE_WRITE reicht.
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct('iIII')
+# Netzwerk-Dateisysteme liefern keine inotify-Ereignisse für Änderungen anderer Rechner.
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'fuse.sshfs', 'fuse.rclone', '9p'}
+
+
+def filesystem_type(path):
+    """Dateisystemtyp des Mountpoints, unter dem `path` liegt (Linux, sonst None)."""
+    try:
+        with open('/proc/mounts', 'r', encoding='utf-8') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return None
+    path = os.path.realpath(path)
+    best = max((m for m in mounts if path == m[0] or path.startswith(m[0].rstrip('/') + '/')),
+               key=lambda m: len(m[0]), default=None)
+    return best[1] if best else None
+
+
+class Inotify:
+    """Minimaler inotify-Wrapper über ctypes; eine Überwachung pro Verzeichnis (inotify ist nicht rekursiv)."""
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify gibt es nur unter Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fehlgeschlagen")
+        self.watches = {}          # Watch-Deskriptor -> relatives Verzeichnis
+
+    def add(self, abs_dir, rel_dir):
+        wd = self._add_watch(self.fd, os.fsencode(abs_dir), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, f"inotify_add_watch({abs_dir}): {os.strerror(code)}")
+        self.watches[wd] = rel_dir
+
+    def remove_subtree(self, rel_dir):
+        prefix = f"{rel_dir}/"
+        for wd, watched in list(self.watches.items()):
+            if watched == rel_dir or watched.startswith(prefix):
+                self._rm_watch(self.fd, wd)
+                self.watches.pop(wd, None)
+
+    def read(self, timeout):
+        """Liste von (relatives Verzeichnis, Maske, Name) – leer nach Ablauf von `timeout`."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events, offset = [], 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            rel_dir = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+            events.append((rel_dir, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class VideoWatcher:
+    """
+    Hält den Video-Katalog ohne manuellen Scan aktuell.
+
+    Ereignisse (inotify) bzw. geänderte mtimes von Verzeichnissen und Sidecars (Polling, für NAS-Mounts)
+    sammeln betroffene Verzeichnisse. Erst wenn VIDEO_WATCH_DEBOUNCE Sekunden Ruhe
+    ist – spätestens nach VIDEO_WATCH_MAX_DELAY – wird ein Teil-Scan nur über diese
+    Verzeichnisse gestartet. Eine ganze kopierte Staffel wird so zu einem Scan.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = set()
+        self._rescan_all = False
+        self._first_event = self._last_event = None
+        self._stop = threading.Event()
+        self._threads = []
+        self._inotify = None
+        self.mode = None
+        self.stats = {'events': 0, 'batches': 0, 'dirs_applied': 0, 'overflows': 0, 'last_batch_at': None}
+
+    # --- Steuerung ---
+    def start(self, app):
+        if self._threads:
+            return
+        self.base_path = app.config['VIDEO_FOLDER']
+        self.video_extensions = app.config['ALLOWED_VIDEO_EXTENSIONS']
+        self.debounce = app.config['VIDEO_WATCH_DEBOUNCE']
+        self.max_delay = app.config['VIDEO_WATCH_MAX_DELAY']
+        self.poll_interval = app.config['VIDEO_WATCH_POLL_INTERVAL']
+        self.manifest_path = app.config['VIDEO_MANIFEST_PATH']
+        self._stop.clear()
+
+        mode = app.config['VIDEO_WATCH_MODE']
+        if mode == 'auto':
+            fs_type = filesystem_type(self.base_path)
+            mode = 'poll' if fs_type in NETWORK_FILESYSTEMS else 'inotify'
+        if mode == 'inotify':
+            try:
+                self._inotify = Inotify()
+                self._watch_tree('')
+            except OSError as e:
+                # z.B. kein Linux oder fs.inotify.max_user_watches erschöpft
+                app.logger.warning(f"inotify nicht verfügbar ({e}), Video-Watcher nutzt Polling.")
+                if self._inotify:
+                    self._inotify.close()
+                self._inotify, mode = None, 'poll'
+        self.mode = mode
+        source = self._inotify_loop if mode == 'inotify' else self._poll_loop
+        self._threads = [threading.Thread(target=source, name='video-watch', daemon=True),
+                         threading.Thread(target=self._apply_loop, args=(app,), name='video-watch-apply', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        app.logger.info(f"Video-Watcher gestartet ({mode}) für {self.base_path}")
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def status(self):
+        with self._cond:
+            return {'mode': self.mode, 'running': bool(self._threads), 'pending_dirs': len(self._pending), **self.stats}
+
+    # --- Ereignisse sammeln ---
+    def mark(self, rel_dirs=(), rescan_all=False):
+        rel_dirs = set(rel_dirs)
+        if not rel_dirs and not rescan_all:
+            return
+        with self._cond:
+            # Jedes Ereignis verlängert die Ruhephase, auch wenn das Verzeichnis schon vorgemerkt ist.
+            now = time.monotonic()
+            self._pending |= rel_dirs
+            self._rescan_all = self._rescan_all or rescan_all
+            if self._first_event is None:
+                self._first_event = now
+            self._last_event = now
+            self._cond.notify_all()
+
+    def _relevant(self, name):
+        ext = os.path.splitext(name)[1].lower()
+        return ext in self.video_extensions or ext == '.json' or ext in IMAGE_EXTENSIONS
+
+    def _watch_tree(self, rel_dir):
+        abs_root = os.path.join(self.base_path, rel_dir) if rel_dir else self.base_path
+        for abs_dir, _, _ in os.walk(abs_root):
+            rel = os.path.relpath(abs_dir, self.base_path).replace(os.sep, '/')
+            self._inotify.add(abs_dir, '' if rel == '.' else rel)
+
+    def _inotify_loop(self):
+        while not self._stop.is_set():
+            try:
+                events = self._inotify.read(timeout=1.0)
+            except OSError as e:
+                if self._stop.is_set():
+                    return
+                # Ohne Ereignisquelle bliebe der Katalog stehen: auf Polling umschalten statt den Thread zu beenden.
+                logger.error(f"inotify-Lesefehler ({e}), Video-Watcher wechselt auf Polling.")
+                self._fall_back_to_polling()
+                return
+            dirs = set()
+            for rel_dir, mask, name in events:
+                self.stats['events'] += 1
+                if mask & IN_Q_OVERFLOW:
+                    # Ereignisse verloren: ein normaler inkrementeller Scan gleicht alles ab.
+                    self.stats['overflows'] += 1
+                    self.mark(rescan_all=True)
+                    continue
+                if rel_dir is None:
+                    continue
+                child = f"{rel_dir}/{name}" if rel_dir else name
+                if mask & IN_ISDIR:
+                    dirs.update((rel_dir, child))
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        try:
+                            self._watch_tree(child)
+                        except OSError:
+                            pass  # Schon wieder weg oder Limit erreicht; der Teil-Scan sieht den Stand trotzdem.
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        self._inotify.remove_subtree(child)
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    dirs.add(rel_dir)
+                elif name and self._relevant(name):
+                    dirs.add(rel_dir)
+            if dirs:
+                self.mark(dirs)
+
+    def _fall_back_to_polling(self):
+        inotify, self._inotify, self.mode = self._inotify, None, 'poll'
+        try:
+            inotify.close()
+        except OSError:
+            pass
+        # Ereignisse seit dem letzten Batch können verloren sein: einmal alles abgleichen.
+        self.mark(rescan_all=True)
+        self._poll_loop()
+
+    def _poll_state(self, abs_dir, entry):
+        """
+        (Verzeichnis-mtime, Sidecar-Signaturen) – dazu (Manifest-Stand) zum Vergleich. Eine .json oder ein Poster,
+        das an Ort und Stelle überschrieben wird, ändert die mtime des Verzeichnisses nicht; deshalb zählen
+        Größe und mtime jeder bekannten Sidecar-Datei mit.
+        """
+        mtime = os.stat(abs_dir).st_mtime
+        current, expected = [], []
+        for name, signature in entry['files'].items():
+            ext = os.path.splitext(name)[1].lower()
+            if ext != '.json' and ext not in IMAGE_EXTENSIONS:
+                continue
+            try:
+                st = os.stat(os.path.join(abs_dir, name))
+                current.append((name, st.st_size, st.st_mtime))
+            except FileNotFoundError:
+                current.append((name, None, None))
+            expected.append((name, *signature))
+        return (mtime, tuple(current)), (entry['mtime'], tuple(expected))
+
+    def _poll_loop(self):
+        """
+        Fallback: vergleicht die mtimes aller bekannten Verzeichnisse und ihrer Sidecar-Dateien mit dem
+        Manifest. Gemeldet wird nur, was sich seit dem letzten Durchlauf bewegt hat – sonst würde die
+        Ruhephase nie erreicht.
+        """
+        observed = {}
+        while not self._stop.wait(self.poll_interval):
+            manifest = load_manifest(self.manifest_path, self.base_path)
+            if manifest is None:
+                self.mark(rescan_all=True)
+                continue
+            changed = set()
+            for rel_dir, entry in manifest['dirs'].items():
+                try:
+                    state, expected = self._poll_state(os.path.join(self.base_path, rel_dir) if rel_dir else self.base_path, entry)
+                except FileNotFoundError:
+                    state, expected = None, True
+                except OSError:
+                    continue
+                if state != expected and observed.get(rel_dir) != state:
+                    changed.add(rel_dir)
+                observed[rel_dir] = state
+            if changed:
+                self.stats['events'] += len(changed)
+                self.mark(changed)
+
+    # --- Gesammelte Verzeichnisse anwenden ---
+    def _due(self, now):
+        return (self._pending or self._rescan_all) and (
+            now - self._last_event >= self.debounce or now - self._first_event >= self.max_delay)
+
+    def _apply_loop(self, app):
+        while not self._stop.is_set():
+            with self._cond:
+                now = time.monotonic()
+                if not self._due(now):
+                    timeout = None
+                    if self._pending or self._rescan_all:
+                        timeout = min(self._last_event + self.debounce, self._first_event + self.max_delay) - now
+                    self._cond.wait(timeout=max(timeout, 0.05) if timeout is not None else None)
+                    continue
+                dirs, rescan_all = self._pending, self._rescan_all
+                self._pending, self._rescan_all = set(), False
+                self._first_event = self._last_event = None
+            # Läuft schon ein Scan (manuell oder der vorige Batch), wird der Batch zurückgelegt und danach angewendet.
+            if not scan_job.start(app, dirs=None if rescan_all else dirs):
+                self.mark(dirs, rescan_all=rescan_all)
+                self._stop.wait(1.0)
+                continue
+            with self._cond:
+                self.stats['batches'] += 1
+                self.stats['dirs_applied'] += len(dirs)
+                self.stats['last_batch_at'] = time.time()
+
+
+video_watcher = VideoWatcher()
+
+
+def init_video_watcher(app):
+    if app.config['VIDEO_WATCH_MODE'] not in ('off', 'auto', 'inotify', 'poll'):
+        raise ValueError(f"Unbekannter VIDEO_WATCH_MODE: {app.config['VIDEO_WATCH_MODE']}")
+    if app.config['VIDEO_WATCH_MODE'] != 'off' and os.path.isdir(app.config['VIDEO_FOLDER']):
+        video_watcher.start(app)
+
+
+@click.command('watch-videos')
+@click.option('--mode', type=click.Choice(['auto', 'inotify', 'poll']), default=None,
+              help="Überschreibt VIDEO_WATCH_MODE.")
+def watch_videos_command(mode):
+    """
+    Eigener Watcher-Prozess für VIDEO_FOLDER, wenn mehrere Web-Worker laufen (dann VIDEO_WATCH_MODE=off
+    für die Worker). Deren Katalog und Suchindex übernehmen die Änderungen nach VIDEO_CATALOG_TTL.
+    """
+    app = current_app._get_current_object()
+    if mode:
+        app.config['VIDEO_WATCH_MODE'] = mode
+    elif app.config['VIDEO_WATCH_MODE'] == 'off':
+        app.config['VIDEO_WATCH_MODE'] = 'auto'
+    video_watcher.start(app)
+    click.echo(f"Überwache {app.config['VIDEO_FOLDER']} ({video_watcher.mode}). Beenden mit Strg+C.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        video_watcher.stop()
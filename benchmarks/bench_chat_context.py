@@ -0,0 +1,107 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_chat_context.py
+
+"""
+Promptgröße und Zeit bis zum ersten Token über eine lange Unterhaltung.
+
+Vergleicht das bisherige Verfahren (Client schickt die gesamte Historie, ungekürzt)
+mit dem serverseitigen Verlauf und Token-Budget (app/conversations.py). Der KI-Stub
+braucht für die Prompt-Verarbeitung --prompt-ms-per-kb pro KB Anfrage, so dass sich
+die Promptgröße direkt in der Zeit bis zum ersten Byte niederschlägt.
+
+Aufruf:  python -m benchmarks.bench_chat_context --turns 40
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app, db
+from app.conversations import ReplyRecorder
+from app.models import User
+from benchmarks.stub_ki_server import start_stub_server
+
+FILLER = ("Ich plane gerade eine Reise und möchte die Route, die Unterkünfte und das Budget durchsprechen. "
+          "Dabei interessieren mich vor allem Zugverbindungen, Preise und Sehenswürdigkeiten unterwegs. ")
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve(app):
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run(name, stub_url, tmp, turns, config, server_side):
+    app = create_app({
+        'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, name + '.db')}",
+        'KI_SERVER_URL_LOCAL': stub_url, 'KI_SERVER_URL_PUBLIC': stub_url,
+        'CHAT_HISTORY_SUMMARY': False, 'DISPATCH_CACHE_ENABLED': False, **config,
+    })
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.org')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+    server, base_url = serve(app)
+    http = requests.Session()
+    http.post(f"{base_url}/api/login", json={'email': 'bench@example.org', 'password': 'bench'}).raise_for_status()
+
+    history, conversation_id, rows = [], None, []
+    for turn in range(1, turns + 1):
+        message = f"Runde {turn}: {FILLER * 2}"
+        body = {'conversation_id': conversation_id, 'message': message} if server_side else \
+            {'messages': history + [{'role': 'user', 'content': message}]}
+        start = time.perf_counter()
+        response = http.post(f"{base_url}/api/chat", json=body, stream=True)
+        chunks = response.iter_content(chunk_size=None)
+        first = next(chunks)
+        ttfb = time.perf_counter() - start
+        recorder = ReplyRecorder()
+        recorder.feed(first + b''.join(chunks))
+        reply = recorder.text
+        conversation_id = int(response.headers['X-Conversation-Id']) if server_side else None
+        history += [{'role': 'user', 'content': message}, {'role': 'assistant', 'content': reply}]
+        rows.append((turn, int(response.headers['X-Prompt-Tokens']), int(response.headers['X-Prompt-Bytes']),
+                     len(response.request.body), ttfb))
+    server.shutdown()
+
+    print(f"\n{name}")
+    print(f"{'Runde':>6} {'Prompt-Tokens':>14} {'Prompt-Bytes':>13} {'Request-Bytes':>14} {'TTFB':>9}")
+    for turn, tokens, size, request_size, ttfb in rows:
+        if turn == 1 or turn % 10 == 0:
+            print(f"{turn:>6} {tokens:>14} {size:>13} {request_size:>14} {ttfb * 1000:>7.0f} ms")
+    last = rows[-10:]
+    print(f"letzte 10 Runden: Prompt ~{statistics.mean(r[1] for r in last):.0f} Tokens, "
+          f"TTFB p50 {statistics.median(r[4] for r in last) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--turns', type=int, default=40)
+    parser.add_argument('--prompt-ms-per-kb', type=float, default=20.0)
+    parser.add_argument('--budget', type=int, default=2048)
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub_server(tokens=60, prompt_delay_per_kb=args.prompt_ms_per_kb / 1000)
+    with tempfile.TemporaryDirectory() as tmp:
+        run('Gesamte Historie vom Client (bisher)', stub_url, tmp, args.turns,
+            {'CHAT_CONTEXT_TOKEN_BUDGET': 10 ** 9, 'CHAT_CONTEXT_MAX_MESSAGES': 10 ** 6}, server_side=False)
+        run(f'Serverseitiger Verlauf, Budget {args.budget} Tokens', stub_url, tmp, args.turns,
+            {'CHAT_CONTEXT_TOKEN_BUDGET': args.budget}, server_side=True)
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
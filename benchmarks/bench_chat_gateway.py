@@ -0,0 +1,164 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_chat_gateway.py
+
+"""
+Lasttest /api/chat: WSGI mit begrenztem Thread-Pool gegen das asynchrone Chat-Gateway.
+
+Der KI-Stub liefert langsame Tokens (--tokens x --token-delay), so dass jede
+Unterhaltung lange offen bleibt. Viele Clients starten gleichzeitig eine Frage;
+gemessen werden Zeit bis zum ersten Byte, Gesamtdauer und Durchsatz. Danach
+trennen Clients nach dem ersten Token die Verbindung, und es wird geprüft, wie
+schnell der Stub den Abbruch der Generierung sieht.
+
+Aufruf:  python -m benchmarks.bench_chat_gateway --clients 64 --workers 8
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from app import create_app, db
+from app.chat_gateway import start_gateway
+from app.models import User
+from benchmarks.stub_ki_server import start_stub_server
+
+QUESTION = {'messages': [{'role': 'user', 'content': "Erklär mir bitte Rekursion"}]}
+
+
+class QuietHandler(WSGIRequestHandler):
+    # Chunked-Antworten wie hinter gunicorn, sonst liest der Client bis zum Verbindungsende.
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Wie gunicorn --threads N: höchstens N Anfragen gleichzeitig, der Rest wartet in der Accept-Queue."""
+
+    request_queue_size = 1024
+
+    def __init__(self, host, port, app, workers):
+        super().__init__(host, port, app, handler=QuietHandler)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def login(base_url):
+    http = requests.Session()
+    http.post(f"{base_url}/api/login", json={'email': 'bench@example.org', 'password': 'bench'}).raise_for_status()
+    return http.cookies
+
+
+def chat(base_url, cookies, disconnect=False):
+    """Gibt (Zeit bis zum ersten Byte, Gesamtdauer, Bytes) zurück."""
+    start = time.perf_counter()
+    response = requests.post(f"{base_url}/api/chat", json=QUESTION, cookies=cookies, stream=True, timeout=600)
+    response.raise_for_status()
+    ttfb, size = None, 0
+    for chunk in response.iter_content(chunk_size=None):
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+            if disconnect:
+                break
+        size += len(chunk)
+    response.close()
+    return ttfb, time.perf_counter() - start, size
+
+
+def percentiles(values):
+    values = sorted(values)
+    return f"p50 {statistics.median(values):6.2f} s  p95 {values[min(len(values) - 1, int(len(values) * 0.95))]:6.2f} s"
+
+
+def load(name, base_url, cookies, stub, clients):
+    stub.max_active_streams = 0
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda _: chat(base_url, cookies), range(clients)))
+        elapsed = time.perf_counter() - start
+    ttfb, total = [r[0] for r in results], [r[1] for r in results]
+    print(f"{name:<10} TTFB {percentiles(ttfb)}   Dauer {percentiles(total)}   "
+          f"{clients / elapsed:6.2f} Antworten/s   max. {stub.max_active_streams:3d} parallele Streams")
+
+
+def disconnects(name, base_url, cookies, stub, clients):
+    aborted_before = stub.aborted_streams
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(lambda _: chat(base_url, cookies, disconnect=True), range(clients)))
+    start = time.perf_counter()
+    while stub.active_streams and time.perf_counter() - start < 60:
+        time.sleep(0.01)
+    print(f"{name:<10} {clients} Abbrüche: {stub.aborted_streams - aborted_before:3d} vom Stub bemerkt, "
+          f"offene Streams nach {time.perf_counter() - start:5.2f} s bei {stub.active_streams}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=8, help="Threads des WSGI-Servers")
+    parser.add_argument('--tokens', type=int, default=40)
+    parser.add_argument('--token-delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub_server(latency=0.02, tokens=args.tokens, token_delay=args.token_delay)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            'KI_SERVER_URL_LOCAL': stub_url, 'KI_SERVER_URL_PUBLIC': stub_url,
+            'KI_POOL_SIZE': args.clients, 'CHAT_GATEWAY_PLAN_WORKERS': args.workers,
+            # Gemessen wird der Transport, nicht die Zulassungssteuerung vor dem KI-Server.
+            'KI_ADMISSION_ENABLED': False,
+        })
+        with app.app_context():
+            db.create_all()
+            user = User(email='bench@example.org')
+            user.set_password('bench')
+            db.session.add(user)
+            db.session.commit()
+
+        wsgi = PooledWSGIServer('127.0.0.1', 0, app, args.workers)
+        threading.Thread(target=wsgi.serve_forever, daemon=True).start()
+        wsgi_url = f"http://127.0.0.1:{wsgi.server_port}"
+
+        loop = asyncio.new_event_loop()
+        runner, gateway = loop.run_until_complete(start_gateway(app, port=0))
+        gateway_url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+
+        cookies = login(wsgi_url)
+        print(f"{args.clients} Clients, Antwort {args.tokens} Tokens x {args.token_delay * 1000:.0f} ms, "
+              f"WSGI mit {args.workers} Threads, Gateway mit einer Event-Loop + {args.workers} Planungs-Threads\n")
+        load('WSGI', wsgi_url, cookies, stub, args.clients)
+        load('Gateway', gateway_url, cookies, stub, args.clients)
+        print()
+        disconnects('WSGI', wsgi_url, cookies, stub, args.workers)
+        disconnects('Gateway', gateway_url, cookies, stub, args.clients)
+        print(f"\nGateway-Statistik: {gateway.stats}")
+
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        wsgi.shutdown()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
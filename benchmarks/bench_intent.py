@@ -0,0 +1,69 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_intent.py
+
+"""
+Genauigkeit und Latenz des lokalen Fast-Path-Dispatchers (app/intent.py).
+
+Für jede Schwelle wird gezeigt, welcher Anteil der Nachrichten am LLM vorbei
+entschieden würde (Abdeckung) und wie viele dieser Entscheidungen Werkzeug UND
+Argumente korrekt treffen (Präzision). Falsch-positive Treffer sind teurer als
+ein zusätzlicher LLM-Aufruf – die Schwelle sollte also bei ~100 % Präzision liegen.
+
+Aufruf:  python -m benchmarks.bench_intent [--thresholds 0.8 0.85 0.9 0.95]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from app.intent import IntentClassifier
+from app.routes import AVAILABLE_TOOLS
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'intent_utterances.json')
+
+
+def is_correct(match, sample):
+    if match.tool_name != sample['tool']:
+        return False
+    return match.tool_name == 'none' or match.arguments == sample.get('arguments', {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.8, 0.85, 0.9, 0.95])
+    parser.add_argument('--repeat', type=int, default=200, help='Wiederholungen für die Latenzmessung')
+    parser.add_argument('--verbose', action='store_true', help='Falsche Fast-Path-Entscheidungen ausgeben')
+    args = parser.parse_args()
+
+    with open(DATA_FILE, encoding='utf-8') as f:
+        samples = json.load(f)
+    classifier = IntentClassifier(AVAILABLE_TOOLS)
+    results = [(sample, classifier.classify(sample['text'])) for sample in samples]
+
+    print(f"{len(samples)} gelabelte Äußerungen\n")
+    print(f"{'Schwelle':>8}  {'Abdeckung':>9}  {'Präzision':>9}  {'falsch':>6}")
+    for threshold in args.thresholds:
+        bypassed = [(s, m) for s, m in results if m and m.confidence >= threshold]
+        correct = sum(1 for s, m in bypassed if is_correct(m, s))
+        precision = correct / len(bypassed) if bypassed else 1.0
+        print(f"{threshold:8.2f}  {len(bypassed) / len(samples):9.1%}  {precision:9.1%}  {len(bypassed) - correct:6d}")
+        if args.verbose:
+            for s, m in bypassed:
+                if not is_correct(m, s):
+                    print(f"          ✗ {s['text']!r} -> {m}")
+
+    timings = []
+    for _ in range(args.repeat):
+        for sample in samples:
+            start = time.perf_counter()
+            classifier.classify(sample['text'])
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"\nLatenz pro Nachricht: Median {statistics.median(timings) * 1e6:.1f} µs, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_ki_backends.py
+
+"""
+Simulation eines Pools aus mehreren KI-Servern (app/ki_state.py).
+
+Startet mehrere Stubs mit unterschiedlicher Latenz, Kapazität und Fehlerrate, einen
+davon mit einem anderen Modell, und schickt parallel Chats über /api/chat (Dispatcher
++ Streaming). Nach einem Drittel der Laufzeit fällt das schnellste Backend aus, nach
+zwei Dritteln kommt es zurück. Verglichen wird das bisherige Verfahren (ein Backend,
+die übrigen nur als Fallback) mit dem Pool. Am Ende werden die erwarteten Eigenschaften
+geprüft; der Exit-Code ist 1, wenn eine davon verletzt ist.
+
+Aufruf:  python -m benchmarks.bench_ki_backends --duration 15 --clients 16
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app, db, ki_state
+from app.models import User
+from benchmarks.stub_ki_server import start_stub_server
+
+# name, Latenz (s), Kapazität (gleichzeitige Anfragen), Fehlerrate, Modell
+BACKENDS = [
+    ('gpu-a', 0.05, 4, 0.0, 'stub-model'),
+    ('gpu-b', 0.10, 4, 0.0, 'stub-model'),
+    ('gpu-c', 0.30, 2, 0.0, 'stub-model'),
+    ('gpu-flaky', 0.05, 4, 0.5, 'stub-model'),
+    ('gpu-other', 0.05, 4, 0.0, 'other-model'),
+]
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def run(name, backends, stubs, tmp, duration, clients):
+    for stub in stubs.values():
+        stub.down = False
+    app = create_app({
+        'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, name.split()[0] + '.db')}",
+        'KI_BACKENDS': backends, 'KI_STATE_REFRESH_INTERVAL': 1, 'KI_BREAKER_COOLDOWN': 2,
+        'KI_ADMISSION_ENABLED': False, 'DISPATCH_CACHE_ENABLED': False, 'INTENT_FASTPATH_ENABLED': False,
+        'CHAT_HISTORY_SUMMARY': False,
+    })
+    # Fehler gehören hier zur Simulation; Protokoll von App und Pool (Logger 'app.ki_state') unterdrücken.
+    app.logger.setLevel(logging.CRITICAL)
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.org')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    results = []           # (Dauer, ok)
+    results_lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        http = requests.Session()
+        http.post(f"{base_url}/api/login", json={'email': 'bench@example.org', 'password': 'bench'}).raise_for_status()
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                response = http.post(f"{base_url}/api/chat", json={'messages': [{'role': 'user', 'content': 'Erzähl mir etwas.'}]})
+                ok = response.status_code == 200 and 'tok0' in response.text
+            except requests.exceptions.RequestException:
+                ok = False
+            with results_lock:
+                results.append((time.perf_counter() - start, ok))
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration / 3)
+    stubs['gpu-a'].down = True
+    time.sleep(duration / 3)
+    stubs['gpu-a'].down = False
+    for thread in threads:
+        thread.join()
+    with app.app_context():
+        snapshot = ki_state.snapshot()
+    server.shutdown()
+
+    durations = [d for d, ok in results if ok]
+    errors = sum(1 for _, ok in results if not ok)
+    print(f"\n{name}")
+    print(f"  {len(results)} Chats, {len(results) / duration:.1f}/s, Fehler {errors} ({errors / max(1, len(results)):.1%}), "
+          f"p50 {statistics.median(durations) * 1000 if durations else 0:.0f} ms, p95 {percentile(durations, 0.95) * 1000:.0f} ms")
+    print(f"  {'Backend':<10} {'Anfragen':>9} {'Fehler':>7} {'Sperren':>8} {'Latenz':>9}  Breaker")
+    for backend in snapshot['backends']:
+        latency = f"{backend['latency_avg'] * 1000:.0f} ms" if backend['latency_avg'] is not None else '-'
+        print(f"  {backend['name']:<10} {backend['requests']:>9} {backend['errors']:>7} {backend['trips']:>8} {latency:>9}  "
+              f"{backend['breaker']}")
+    return {'chats': len(results), 'error_rate': errors / max(1, len(results)),
+            'backends': {backend['name']: backend for backend in snapshot['backends']}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--clients', type=int, default=16)
+    args = parser.parse_args()
+
+    stubs, urls = {}, {}
+    for seed, (name, latency, capacity, failure_rate, model) in enumerate(BACKENDS):
+        stubs[name], urls[name] = start_stub_server(latency=latency, tokens=10, token_delay=0.01, model=model,
+                                                    capacity=capacity, failure_rate=failure_rate, seed=seed)
+    pool = [{'url': urls[name], 'name': name} for name, *_ in BACKENDS]
+    single = [dict(entry, fallback=i > 0) for i, entry in enumerate(pool)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = run('single Ein Backend, übrige nur als Fallback (bisher)', single, stubs, tmp, args.duration, args.clients)
+        after = run('pool Pool: Least-Outstanding, Modell-Affinität, Circuit Breaker', pool, stubs, tmp, args.duration,
+                    args.clients)
+    for stub in stubs.values():
+        stub.shutdown()
+
+    backends = after['backends']
+    checks = [
+        ("Pool verteilt auf alle Backends mit passendem Modell",
+         all(backends[name]['requests'] > 0 for name in ('gpu-a', 'gpu-b', 'gpu-c'))),
+        ("Backend mit anderem Modell bekommt keine Anfragen", backends['gpu-other']['requests'] == 0),
+        ("Circuit Breaker sperrt das fehlerhafte Backend", backends['gpu-flaky']['trips'] > 0),
+        ("Circuit Breaker sperrt das ausgefallene Backend", backends['gpu-a']['trips'] > 0),
+        ("Ausgefallenes Backend wird nach der Rückkehr wieder genutzt", backends['gpu-a']['breaker'] == 'closed'),
+        ("Pool schafft mehr Chats als ein einzelnes Backend", after['chats'] > before['chats']),
+    ]
+    print("\nPrüfungen")
+    for label, ok in checks:
+        print(f"  [{'OK' if ok else 'FEHLER'}] {label}")
+    sys.exit(0 if all(ok for _, ok in checks) else 1)
+
+
+if __name__ == '__main__':
+    main()
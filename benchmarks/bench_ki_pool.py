@@ -0,0 +1,58 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_ki_pool.py
+
+"""
+Microbenchmark: Verbindungsaufbau pro Chat-Runde mit und ohne KIClient-Pool.
+
+Eine Chat-Runde besteht wie in api_chat aus zwei /health-Abfragen, dem
+Dispatcher-Aufruf und der Streaming-Anfrage.
+
+Aufruf:  python -m benchmarks.bench_ki_pool --turns 200
+"""
+
+import argparse
+import time
+
+import requests
+
+from app.ki_client import KIClient
+from benchmarks.stub_ki_server import start_stub_server
+
+
+def chat_turn(http, base_url):
+    http.get(f"{base_url}/health", timeout=1)
+    http.get(f"{base_url}/health", timeout=10).json()
+    http.post(f"{base_url}/api/chat", json={'stream': False}, timeout=30).json()
+    response = http.post(f"{base_url}/api/chat", json={'stream': True}, stream=True, timeout=300)
+    for _ in response.iter_content(chunk_size=1024):
+        pass
+    response.close()
+
+
+def run(name, http, server, base_url, turns):
+    server.connections = 0
+    start = time.perf_counter()
+    for _ in range(turns):
+        chat_turn(http, base_url)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<18} {turns / elapsed:8.1f} Runden/s  {elapsed / turns * 1000:7.2f} ms/Runde  "
+          f"{server.connections / turns:5.2f} Verbindungen/Runde")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--turns', type=int, default=200)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    try:
+        run('requests (bare)', requests, server, base_url, args.turns)
+        client = KIClient(pool_size=4)
+        run('KIClient (pool)', client, server, base_url, args.turns)
+        client.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_login.py
+
+"""
+Anmeldungen unter Last: Passwort-Hashing im Request-Thread gegen den Prozess-Pool (app/passwords.py).
+
+Mehrere Clients melden sich gleichzeitig immer wieder über /api/login an (wie nach einem Deploy,
+wenn alle Sitzungen neu aufgebaut werden). Parallel misst ein Client die Latenz eines billigen
+Requests (GET /api/notes) – das sind die Anfragen, die bisher hinter den Hashes gewartet haben.
+Verglichen werden:
+
+  inline  PASSWORD_HASH_WORKERS=0 ohne Obergrenze (bisheriges Verhalten: jeder Request hasht selbst)
+  pool    Prozess-Pool mit PASSWORD_HASH_MAX_CONCURRENT (Standardwerte oder --workers/--max-concurrent)
+
+Mit --legacy werden die Benutzer mit pbkdf2-Hashes angelegt; die erste Anmeldung je Benutzer
+rechnet dann auf die konfigurierte Methode um (Spalte "umgerechnet").
+
+Aufruf:  python -m benchmarks.bench_login [--clients 16] [--duration 10] [--legacy]
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app, db, password_hasher
+from app.models import User
+
+PASSWORD = 'bench-passwort'
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values) + 0.5) - 1))]
+
+
+def run_mode(tmp, name, config, args):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, f'{name}.db')}",
+                      'KI_BACKENDS': ['http://127.0.0.1:9'], **config})
+    app.logger.setLevel(logging.CRITICAL)
+    with app.app_context():
+        # Alle Benutzer teilen sich einen Hash – das Anlegen soll nicht mitgemessen werden.
+        method = 'pbkdf2:sha256:260000' if args.legacy else password_hasher.method
+        password_hash = generate_password_hash(PASSWORD, method=method)
+        db.session.add_all([User(email=f"bench{i}@example.org", password=password_hash) for i in range(args.clients + 1)])
+        db.session.commit()
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    probe = requests.Session()
+    # Anmeldung des Mess-Clients startet nebenbei den Prozess-Pool.
+    probe.post(f"{base_url}/api/login", json={'email': f"bench{args.clients}@example.org", 'password': PASSWORD}).raise_for_status()
+    stop = threading.Event()
+    login_times, probe_times, statuses = [], [], {}
+    lock = threading.Lock()
+
+    def login_loop(i):
+        http = requests.Session()
+        while not stop.is_set():
+            start = time.perf_counter()
+            status = http.post(f"{base_url}/api/login", json={'email': f"bench{i}@example.org", 'password': PASSWORD}).status_code
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    login_times.append(time.perf_counter() - start)
+
+    def probe_loop():
+        while not stop.is_set():
+            start = time.perf_counter()
+            probe.get(f"{base_url}/api/notes").raise_for_status()
+            probe_times.append(time.perf_counter() - start)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=login_loop, args=(i,)) for i in range(args.clients)] + [threading.Thread(target=probe_loop)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    stats = password_hasher.to_dict()
+    return {
+        'logins_per_second': len(login_times) / elapsed,
+        'login_p50': percentile(login_times, 50), 'login_p95': percentile(login_times, 95),
+        'probe_p50': percentile(probe_times, 50), 'probe_p95': percentile(probe_times, 95),
+        'probe_p99': percentile(probe_times, 99), 'rejected': statuses.get(503, 0),
+        'rehashed': stats['rehashed'], 'peak_active': stats['peak_active'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-concurrent', type=int, default=None)
+    parser.add_argument('--legacy', action='store_true', help="Benutzer mit pbkdf2-Hashes anlegen (Umrechnung beim Login)")
+    args = parser.parse_args()
+
+    pool_config = {}
+    if args.workers is not None:
+        pool_config['PASSWORD_HASH_WORKERS'] = args.workers
+    if args.max_concurrent is not None:
+        pool_config['PASSWORD_HASH_MAX_CONCURRENT'] = args.max_concurrent
+    modes = [
+        ('inline', {'PASSWORD_HASH_WORKERS': 0, 'PASSWORD_HASH_MAX_CONCURRENT': 10000}),
+        ('pool', pool_config),
+    ]
+    print(f"{args.clients} Clients, {args.duration:.0f} s pro Modus, {os.cpu_count()} CPU(s)\n")
+    print(f"{'Modus':<8} {'Logins/s':>9} {'Login p50':>10} {'p95':>8}   {'GET p50':>8} {'p95':>8} {'p99':>8}"
+          f"   {'503':>5} {'max. parallel':>13} {'umgerechnet':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, config in modes:
+            r = run_mode(tmp, name, config, args)
+            print(f"{name:<8} {r['logins_per_second']:>9.1f} {r['login_p50'] * 1000:>8.0f}ms {r['login_p95'] * 1000:>6.0f}ms"
+                  f"   {r['probe_p50'] * 1000:>6.1f}ms {r['probe_p95'] * 1000:>6.1f}ms {r['probe_p99'] * 1000:>6.1f}ms"
+                  f"   {r['rejected']:>5} {r['peak_active']:>13} {r['rehashed']:>11}")
+
+
+if __name__ == '__main__':
+    main()
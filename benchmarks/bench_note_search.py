@@ -0,0 +1,98 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_note_search.py
+
+"""
+Notizsuche: ilike-Tabellenscan gegen FTS5/BM25 (app/note_search.py).
+
+Legt für jede Größe eine temporäre SQLite-Datenbank mit einem "Power-User" an,
+dem alle Notizen gehören, und misst die mittlere Latenz pro Suchanfrage.
+
+Aufruf:  python -m benchmarks.bench_note_search --sizes 10000 100000 1000000
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import create_app, db
+from app.models import Note, User
+from app.note_search import search_notes_fts, search_notes_like
+
+# Echte Texte sind Zipf-verteilt: wenige sehr häufige Wörter, ein langer Schwanz seltener.
+# Die Suchbegriffe liegen im mittleren Frequenzbereich, so wie typische Suchwörter.
+SYLLABLES = "ka ri mo ne lu ta be so fi ga de no pu le wi ro sa tu me hi".split()
+QUERY_WORDS = ("urlaub koffer python docker kuchen zahnarzt termin steuer finanzamt garten").split()
+QUERIES = ["urlaub", "python docker", "zahnarzt termin", "kuchen", "finanzamt steuer", "gibtesnicht"]
+
+
+def build_vocabulary(rng, size=20000):
+    words = list(dict.fromkeys("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size * 2)))[:size]
+    for rank, word in zip(range(100, 100 + 50 * len(QUERY_WORDS), 50), QUERY_WORDS):
+        words.insert(rank, word)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    return words, cum_weights
+
+
+def seed(size, rng):
+    user = User(email='power@coldnet.local', password='-')
+    db.session.add(user)
+    db.session.commit()
+    words, cum_weights = build_vocabulary(rng)
+    start = datetime(2020, 1, 1)
+    batch = []
+    for i in range(size):
+        batch.append({
+            'title': " ".join(rng.choices(words, cum_weights=cum_weights, k=3)).capitalize(),
+            'content': " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(20, 80))),
+            'created_at': start + timedelta(minutes=i),
+            'user_id': user.id,
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(Note), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Note), batch)
+    db.session.commit()
+    return user.id
+
+
+def measure(func, user_id, repeat):
+    timings = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            start = time.perf_counter()
+            func(user_id, query, 5)
+            timings.append(time.perf_counter() - start)
+    return statistics.mean(timings) * 1000, sorted(timings)[int(len(timings) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'Notizen':>9}  {'ilike Ø ms':>10}  {'ilike p95':>9}  {'FTS5 Ø ms':>9}  {'FTS5 p95':>8}  {'Faktor':>6}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+            with app.app_context():
+                if not app.extensions['note_search']['fts5']:
+                    raise SystemExit("Dieser SQLite-Build hat kein FTS5.")
+                user_id = seed(size, random.Random(size))
+                like_mean, like_p95 = measure(search_notes_like, user_id, args.repeat)
+                fts_mean, fts_p95 = measure(search_notes_fts, user_id, args.repeat)
+                db.session.remove()
+                db.engine.dispose()
+        print(f"{size:9d}  {like_mean:10.2f}  {like_p95:9.2f}  {fts_mean:9.2f}  {fts_p95:8.2f}  {like_mean / fts_mean:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_notes_bulk.py
+
+"""
+Notizen migrieren: einzelne Anfragen gegen /api/notes/bulk (app/note_bulk.py).
+
+Ein Client legt N Notizen an und löscht sie wieder – einmal wie bisher mit einer
+Anfrage (und einem Commit) pro Notiz, einmal als NDJSON-Stream über /api/notes/bulk
+(anlegen, ändern, löschen). Zusätzlich wird der Export über /api/notes/export gemessen.
+Die App läuft mit dem Standard-SQLite-Profil (WAL) gegen eine temporäre Datenbank.
+
+Aufruf:  python -m benchmarks.bench_notes_bulk --notes 5000 [--chunk-size 500]
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app, db
+from app.models import User
+from benchmarks.stub_ki_server import start_stub_server
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def ndjson(operations):
+    return (json.dumps(operation, ensure_ascii=False).encode('utf-8') + b"\n" for operation in operations)
+
+
+def note(i):
+    return {'title': f"Importierte Notiz {i}", 'content': f"Inhalt der Notiz {i} " * 10}
+
+
+def timed(label, count, fn):
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    print(f"  {label:<34} {seconds:>7.2f} s  {count / seconds:>9.0f} Notizen/s")
+    return seconds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--notes', type=int, default=5000)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    args = parser.parse_args()
+
+    stub, ki_url = start_stub_server()
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                          'KI_BACKENDS': [ki_url], 'NOTES_BULK_CHUNK_SIZE': args.chunk_size})
+        app.logger.setLevel(logging.WARNING)
+        with app.app_context():
+            user = User(email='bench@example.org')
+            user.set_password('bench')
+            db.session.add(user)
+            db.session.commit()
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        http = requests.Session()
+        http.post(f"{base_url}/api/login", json={'email': 'bench@example.org', 'password': 'bench'}).raise_for_status()
+
+        print(f"{args.notes} Notizen, Blockgröße {args.chunk_size}\n")
+        print("Einzeln (eine Anfrage und ein Commit pro Notiz)")
+        single_create, _ = timed("anlegen (POST /api/notes)", args.notes,
+                                 lambda: [http.post(f"{base_url}/api/notes", json=note(i)).raise_for_status()
+                                          for i in range(args.notes)])
+        ids = [row['id'] for row in http.get(f"{base_url}/api/notes", params={'fields': 'id'}).json()]
+        single_delete, _ = timed("löschen (DELETE /api/notes/<id>)", len(ids),
+                                 lambda: [http.delete(f"{base_url}/api/notes/{note_id}").raise_for_status() for note_id in ids])
+
+        def bulk(operations):
+            # Generator als Body: requests sendet chunked, der Client hält nicht alle Zeilen im Speicher.
+            response = http.post(f"{base_url}/api/notes/bulk", data=ndjson(operations),
+                                 headers={'Content-Type': 'application/x-ndjson'})
+            response.raise_for_status()
+            results = [json.loads(line) for line in response.text.splitlines()]
+            failed = sum(1 for result in results if not result['ok'])
+            if failed:
+                raise SystemExit(f"{failed} Zeilen fehlgeschlagen, z.B. {next(r for r in results if not r['ok'])}")
+            return results
+
+        print("\nBulk (NDJSON über /api/notes/bulk)")
+        bulk_create, results = timed("anlegen", args.notes, lambda: bulk({'op': 'create', **note(i)} for i in range(args.notes)))
+        ids = [result['id'] for result in results]
+        timed("ändern", len(ids), lambda: bulk({'op': 'update', 'id': note_id, 'title': f"Geändert {note_id}"} for note_id in ids))
+        _, export = timed("exportieren (/api/notes/export)", len(ids), lambda: http.get(f"{base_url}/api/notes/export").text)
+        bulk_delete, _ = timed("löschen", len(ids), lambda: bulk({'op': 'delete', 'id': note_id} for note_id in ids))
+        timed("Export wieder importieren", len(ids), lambda: bulk(json.loads(line) for line in export.splitlines()))
+
+        print(f"\nBeschleunigung: anlegen {single_create / bulk_create:.0f}x, löschen {single_delete / bulk_delete:.0f}x")
+        server.shutdown()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
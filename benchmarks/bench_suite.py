@@ -0,0 +1,342 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_suite.py
+
+"""
+Reproduzierbare Benchmark-Suite für die wichtigsten Endpunkte.
+
+Baut die App über create_app() mit einer temporären SQLite-Datenbank, befüllt sie mit
+Benutzern, Notizen und Video-Zeilen, erzeugt einen synthetischen Video-Ordner (Kategorien,
+Staffeln, Sidecar-JSONs, Vorschaubilder) und startet den Stub des KI-Servers mit
+einstellbarer Latenz. Jedes Szenario läuft mit --concurrency parallelen, angemeldeten
+Clients gegen einen echten WSGI-Server; berichtet werden Durchsatz und p50/p95/p99.
+Die Scans laufen zuletzt: der erste vollständige Scan ersetzt die geseedeten Video-Zeilen
+durch die Dateien des synthetischen Ordners.
+
+Die Ergebnisse landen als JSON in benchmarks/results/ (samt Commit und Parametern);
+mit --compare wird gegen einen früheren Lauf verglichen. Gleiche Parameter und gleicher
+--seed ergeben dieselben Daten und dieselbe Anfragefolge.
+
+Aufruf:  python -m benchmarks.bench_suite [--users 20 --notes 200 --videos 5000 --video-files 2000]
+         python -m benchmarks.bench_suite --only chat_llm notes_page --compare benchmarks/results/alt.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app, db
+from app.models import Note, User, Video
+from app.video_scanner import scan_job
+from benchmarks.stub_ki_server import start_stub_server
+
+try:
+    from PIL import Image
+except ImportError:  # Ohne Pillow bekommt der synthetische Ordner keine Vorschaubilder.
+    Image = None
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+PASSWORD = 'bench'
+WORDS = "Stern Reise Nacht König Drachen Straße Meer Wald Stadt Licht Schatten Feuer Winter Sommer".split()
+GENRES = "Action Drama Komödie Dokumentation Animation Thriller Fantasy".split()
+SEARCHES = ["ste", "stern", "reise n", "kön", "drachen", "licht wald", "winter 19"]
+CHAT_QUESTIONS = ["Erklär mir Rekursion.", "Was ist der Unterschied zwischen TCP und UDP?", "Schreib ein kurzes Gedicht."]
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def title(rng, words=3):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, words)))
+
+
+# --- Testdaten ---
+def seed_database(rng, users, notes, videos, categories):
+    """Massen-Insert statt ORM-Objekten; alle Benutzer teilen sich einen Passwort-Hash (Hashen dauert pro Stück)."""
+    password_hash = generate_password_hash(PASSWORD)
+    db.session.execute(insert(User), [
+        {'email': f"bench{i}@example.org", 'password': password_hash, 'is_admin': i == 0} for i in range(users)])
+    user_ids = db.session.execute(db.select(User.id).order_by(User.id)).scalars().all()
+    start = datetime(2024, 1, 1)
+    rows = []
+    for user_id in user_ids:
+        for i in range(notes):
+            rows.append({'user_id': user_id, 'title': title(rng), 'created_at': start + timedelta(minutes=i),
+                         'content': " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 80)))})
+            if len(rows) == 10000:
+                db.session.execute(insert(Note), rows)
+                rows = []
+    if rows:
+        db.session.execute(insert(Note), rows)
+    rows = [{'filepath': f"Seed/{i}.mp4", 'filename': f"{i}.mp4", 'title': title(rng, 4),
+             'category': categories[i % len(categories)], 'genre': rng.choice(GENRES), 'year': rng.randint(1950, 2025),
+             'description': " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40)))} for i in range(videos)]
+    for offset in range(0, len(rows), 10000):
+        db.session.execute(insert(Video), rows[offset:offset + 10000])
+    db.session.commit()
+
+
+def build_video_tree(root, rng, files, categories, file_kb, thumbnail_share):
+    """Kategorie/Staffel/Datei.mp4 (sparse), jede zweite mit Sidecar-JSON, ein Teil mit Vorschaubild."""
+    paths = []
+    for i in range(files):
+        directory = os.path.join(root, categories[i % len(categories)], f"Staffel {i // len(categories) % 4 + 1}")
+        os.makedirs(directory, exist_ok=True)
+        name = f"Folge {i:05d}"
+        with open(os.path.join(directory, f"{name}.mp4"), 'wb') as f:
+            f.truncate(file_kb * 1024)
+        if i % 2 == 0:
+            with open(os.path.join(directory, f"{name}.json"), 'w', encoding='utf-8') as f:
+                json.dump({'title': title(rng, 4), 'year': rng.randint(1950, 2025), 'genre': rng.choice(GENRES),
+                           'description': " ".join(rng.choice(WORDS) for _ in range(20))}, f, ensure_ascii=False)
+        if Image is not None and rng.random() < thumbnail_share:
+            color = (i * 37 % 256, i * 91 % 256, i * 53 % 256)
+            Image.new('RGB', (320, 180), color).save(os.path.join(directory, f"{name}.jpg"), quality=80)
+        paths.append(os.path.relpath(os.path.join(directory, f"{name}.mp4"), root).replace(os.sep, '/'))
+    return paths
+
+
+# --- Szenarien: (Session, Nummer der Anfrage) -> ok ---
+def make_scenarios(base_url, categories, video_paths):
+    def notes_page(http, n):
+        return http.get(f"{base_url}/api/notes", params={'limit': 50}).status_code == 200
+
+    def notes_all(http, n):
+        return http.get(f"{base_url}/api/notes").status_code == 200
+
+    def notes_create(http, n):
+        return http.post(f"{base_url}/api/notes", json={'title': f"Bench {n}", 'content': "Inhalt " * 20}).ok
+
+    def login(http, n):
+        return http.post(f"{base_url}/api/login", json={'email': http.email, 'password': PASSWORD}).status_code == 200
+
+    def video_stream(http, n):
+        return http.get(f"{base_url}/video-stream").status_code == 200
+
+    def videos_category(http, n):
+        params = {'category': categories[n % len(categories)], 'offset': 30 * (n % 3), 'limit': 30}
+        return http.get(f"{base_url}/api/videos", params=params).status_code == 200
+
+    def videos_search(http, n):
+        return http.get(f"{base_url}/api/videos/search", params={'q': SEARCHES[n % len(SEARCHES)]}).status_code == 200
+
+    def video_file(http, n):
+        response = http.get(f"{base_url}/video_files/{video_paths[n % len(video_paths)]}", headers={'Range': 'bytes=0-65535'})
+        return response.status_code == 206 and len(response.content) == 65536
+
+    def chat_tool(http, n):
+        # Lokaler Fast-Path + Werkzeug, ohne KI-Aufruf
+        response = http.post(f"{base_url}/api/chat", json={'message': "Welche Notizen habe ich?"})
+        return response.status_code == 200 and 'data:' in response.text
+
+    def chat_llm(http, n):
+        # Dispatcher + gestreamte Antwort über den Stub; jede Session führt eine Unterhaltung fort.
+        body = {'message': CHAT_QUESTIONS[n % len(CHAT_QUESTIONS)]}
+        if getattr(http, 'conversation_id', None):
+            body['conversation_id'] = http.conversation_id
+        response = http.post(f"{base_url}/api/chat", json=body)
+        if response.headers.get('X-Conversation-Id'):
+            http.conversation_id = int(response.headers['X-Conversation-Id'])
+        return response.status_code == 200 and 'tok0' in response.text
+
+    return {f.__name__: f for f in (notes_page, notes_all, notes_create, login, video_stream, videos_category,
+                                    videos_search, video_file, chat_tool, chat_llm)}
+
+
+# --- Messung ---
+def percentile(values, p):
+    """Nearest-Rank auf sortierten Werten."""
+    if not values:
+        return 0.0
+    return values[max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))]
+
+
+def summarize(durations, errors, seconds, unit_count=None):
+    durations = sorted(durations)
+    count = len(durations) + errors
+    return {
+        'requests': count, 'errors': errors, 'seconds': round(seconds, 3),
+        'throughput': round((unit_count if unit_count is not None else count) / seconds, 2) if seconds else 0.0,
+        'mean_ms': round(sum(durations) / len(durations) * 1000, 2) if durations else 0.0,
+        **{f"p{p}_ms": round(percentile(durations, p) * 1000, 2) for p in (50, 95, 99)},
+        'max_ms': round(durations[-1] * 1000, 2) if durations else 0.0,
+    }
+
+
+def run_scenario(scenario, sessions, total, warmup):
+    """total Anfragen, verteilt auf die Sessions (je ein Thread); die ersten warmup zählen nicht."""
+    counter = iter(range(total + warmup))
+    lock = threading.Lock()
+    durations, errors = [], [0]
+
+    def worker(http):
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            start = time.perf_counter()
+            try:
+                ok = scenario(http, n)
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if n >= warmup:
+                with lock:
+                    if ok:
+                        durations.append(elapsed)
+                    else:
+                        errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(http,)) for http in sessions]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(durations, errors[0], time.perf_counter() - start)
+
+
+def run_scans(admin, base_url, runs):
+    """Erster Lauf vollständig (full), danach inkrementell ohne Änderungen; Durchsatz in Dateien pro Sekunde."""
+    runs_by_kind = {'scan_full': [], 'scan_incremental': []}
+    for i in range(runs):
+        kind = 'scan_full' if i == 0 else 'scan_incremental'
+        start = time.perf_counter()
+        response = admin.post(f"{base_url}/api/admin/scan", json={'full': i == 0})
+        scan_job.join()
+        progress = scan_job.progress.to_dict()
+        ok = response.status_code == 202 and progress.get('state') == 'done'
+        if not ok:
+            print(f"    Scan fehlgeschlagen: {progress.get('error') or response.text}")
+        runs_by_kind[kind].append((time.perf_counter() - start, progress.get('files_seen', 0), ok))
+    results = {}
+    for kind, measured in runs_by_kind.items():
+        if measured:
+            results[kind] = summarize([d for d, _, ok in measured if ok], sum(1 for *_, ok in measured if not ok),
+                                      sum(d for d, _, _ in measured), sum(files for _, files, _ in measured))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"\n{'Szenario':<18} {'Anfragen':>8} {'Fehler':>6} {'pro s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          + ("   Δ pro s    Δ p95" if baseline else ''))
+    for name, r in results.items():
+        line = (f"{name:<18} {r['requests']:>8} {r['errors']:>6} {r['throughput']:>8.1f} {r['p50_ms']:>8.1f} "
+                f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+        old = (baseline or {}).get(name)
+        if old:
+            def delta(key):
+                return f"{(r[key] / old[key] - 1):+8.1%}" if old[key] else f"{'-':>8}"
+            line += f"  {delta('throughput')}  {delta('p95_ms')}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--notes', type=int, default=200, help='Notizen pro Benutzer')
+    parser.add_argument('--videos', type=int, default=5000, help='Video-Zeilen in der Datenbank')
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--video-files', type=int, default=2000, help='Dateien im synthetischen Video-Ordner')
+    parser.add_argument('--video-file-kb', type=int, default=256)
+    parser.add_argument('--thumbnail-share', type=float, default=0.1, help='Anteil der Videos mit Vorschaubild')
+    parser.add_argument('--ki-latency', type=float, default=0.05, help='Stub: Sekunden bis zur Antwort')
+    parser.add_argument('--ki-tokens', type=int, default=20)
+    parser.add_argument('--ki-token-delay', type=float, default=0.005)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400, help='Anfragen pro Szenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--scan-runs', type=int, default=3)
+    parser.add_argument('--only', nargs='+', help='Nur diese Szenarien (scan für die Scans)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='JSON-Datei (Standard: benchmarks/results/suite-<Zeitstempel>.json)')
+    parser.add_argument('--compare', help='Früherer Lauf (JSON) als Vergleich')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    categories = [f"Kategorie {i:02d}" for i in range(args.categories)]
+    stub, ki_url = start_stub_server(latency=args.ki_latency, tokens=args.ki_tokens, token_delay=args.ki_token_delay)
+    tmp = tempfile.mkdtemp(prefix='coldnet-bench-')
+    video_folder = os.path.join(tmp, 'videos')
+    print(f"Erzeuge Testdaten in {tmp} ...")
+    video_paths = build_video_tree(video_folder, rng, args.video_files, categories, args.video_file_kb,
+                                   args.thumbnail_share)
+    os.makedirs(os.path.join(tmp, 'thumbnails'))
+    app = create_app({
+        'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        'KI_BACKENDS': [ki_url], 'VIDEO_FOLDER': video_folder, 'THUMBNAIL_FOLDER': os.path.join(tmp, 'thumbnails'),
+        'VIDEO_MANIFEST_PATH': os.path.join(tmp, 'video_manifest.json'),
+    })
+    app.logger.setLevel(logging.CRITICAL)
+    with app.app_context():
+        seed_database(rng, args.users, args.notes, args.videos, categories)
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    sessions = []
+    for i in range(args.concurrency):
+        http = requests.Session()
+        http.email = f"bench{i % args.users}@example.org"
+        http.post(f"{base_url}/api/login", json={'email': http.email, 'password': PASSWORD}).raise_for_status()
+        sessions.append(http)
+
+    scenarios = make_scenarios(base_url, categories, video_paths)
+    selected = args.only or [*scenarios, 'scan']
+    unknown = [name for name in selected if name not in scenarios and name != 'scan']
+    if unknown:
+        parser.error(f"Unbekannte Szenarien: {', '.join(unknown)} (verfügbar: {', '.join(scenarios)}, scan)")
+
+    results = {}
+    for name in (name for name in scenarios if name in selected):
+        print(f"  {name} ...", flush=True)
+        results[name] = run_scenario(scenarios[name], sessions, args.requests, args.warmup)
+    if 'scan' in selected:
+        print("  scan ...", flush=True)
+        results.update(run_scans(sessions[0], base_url, args.scan_runs))
+
+    server.shutdown()
+    stub.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"suite-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'meta': {'started_at': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+                            'python': sys.version.split()[0], 'platform': platform.platform(),
+                            'cpus': os.cpu_count(), 'pillow': Image is not None, 'args': vars(args)},
+                   'results': results}, f, indent=2, ensure_ascii=False)
+    print(f"\nErgebnisse: {output}")
+
+
+if __name__ == '__main__':
+    main()
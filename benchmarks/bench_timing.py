@@ -0,0 +1,91 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_timing.py
+
+"""
+Kosten der Zeitmessung (app/timing.py) mit und ohne METRICS_ENABLED.
+
+Misst einen einzelnen Span im Vergleich zu einem leeren with-Block und den Durchsatz
+eines billigen Requests (Notizliste über den Test-Client) mit aktivierter und
+deaktivierter Messung. Ausgeschaltet sollte praktisch kein Unterschied bleiben,
+eingeschaltet liegt der Aufschlag im Mikrosekundenbereich pro Request.
+
+Aufruf:  python -m benchmarks.bench_timing [--spans 200000] [--requests 2000]
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+
+from app import create_app, db, metrics
+from app.models import User
+from benchmarks.stub_ki_server import start_stub_server
+
+
+def per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_requests(tmp, name, ki_url, enabled, repeat):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, f'{name}.db')}",
+                      'METRICS_ENABLED': enabled, 'KI_BACKENDS': [ki_url]})
+    app.logger.setLevel(logging.CRITICAL)
+    with app.app_context():
+        user = User(email='bench@example.org')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+    client = app.test_client()
+    client.post('/api/login', json={'email': 'bench@example.org', 'password': 'bench'})
+    for _ in range(50):
+        client.get('/api/notes')
+    return per_call(lambda: client.get('/api/notes'), repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--spans', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    empty = nullcontext()
+
+    def baseline():
+        with empty:
+            pass
+
+    def span():
+        with metrics.span('bench'):
+            pass
+
+    print(f"{'Span':<28} {'pro Aufruf':>12}")
+    metrics.enabled = False
+    timings = {'leerer with-Block': per_call(baseline, args.spans), 'span() deaktiviert': per_call(span, args.spans)}
+    metrics.enabled = True
+    timings['span() aktiviert'] = per_call(span, args.spans)
+    for label, seconds in timings.items():
+        print(f"{label:<28} {seconds * 1e9:>9.0f} ns")
+
+    stub, ki_url = start_stub_server()
+    # Abwechselnd und jeweils der beste Lauf: das erste create_app() zahlt sonst das Aufwärmen.
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = {False: [], True: []}
+        for i in range(args.rounds):
+            for enabled in (False, True):
+                runs[enabled].append(bench_requests(tmp, f"{i}-{enabled}", ki_url, enabled, args.requests))
+        off, on = min(runs[False]), min(runs[True])
+    stub.shutdown()
+    print(f"\n{'GET /api/notes':<28} {'pro Request':>12} {'Requests/s':>11}")
+    for label, seconds in (('METRICS_ENABLED aus', off), ('METRICS_ENABLED an', on)):
+        print(f"{label:<28} {seconds * 1e6:>9.0f} µs {1 / seconds:>11.0f}")
+    print(f"Aufschlag durch die Messung: {(on - off) * 1e6:+.0f} µs ({(on / off - 1):+.1%})")
+
+
+if __name__ == '__main__':
+    main()
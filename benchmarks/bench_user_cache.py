@@ -0,0 +1,115 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_user_cache.py
+
+"""
+Datenbankzugriffe pro Range-Request auf /video_files mit und ohne user_loader-Cache (app/user_cache.py).
+
+Ein Player fragt ein Video in vielen kleinen Range-Stücken ab; jede dieser Anfragen ist angemeldet
+und lud bisher den Benutzer aus der Datenbank. Gezählt werden die SQL-Anweisungen pro Anfrage
+(Listener auf der Engine), dazu die Latenz über den Test-Client – einmal seriell, einmal mit
+mehreren parallelen Lesern. Die Modi laufen abwechselnd, pro Modus zählt der beste Durchgang.
+
+Aufruf:  python -m benchmarks.bench_user_cache [--requests 3000] [--readers 8] [--rounds 3]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+from app import create_app, db, user_cache
+from app.models import User
+
+CHUNK = 256 * 1024
+
+
+def setup(tmp, name, enabled, args):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, f'{name}.db')}",
+                      'VIDEO_FOLDER': tmp, 'VIDEO_DELIVERY_MODE': args.mode, 'USER_CACHE_ENABLED': enabled,
+                      'METRICS_ENABLED': False, 'PASSWORD_HASH_WORKERS': 0})
+    app.logger.setLevel(logging.CRITICAL)
+    statements = [0]
+    with app.app_context():
+        for i in range(args.readers):
+            user = User(email=f"bench{i}@example.org")
+            user.set_password('bench')
+            db.session.add(user)
+        db.session.commit()
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.__setitem__(0, statements[0] + 1))
+    clients = []
+    for i in range(args.readers):
+        client = app.test_client()
+        client.post('/api/login', json={'email': f"bench{i}@example.org", 'password': 'bench'})
+        clients.append(client)
+    return clients, statements
+
+
+def range_requests(client, count, size, latencies):
+    for n in range(count):
+        start = (n * CHUNK) % (size - CHUNK)
+        begin = time.perf_counter()
+        response = client.get('/video_files/film.mp4', headers={'Range': f"bytes={start}-{start + CHUNK - 1}"})
+        response.get_data()
+        latencies.append(time.perf_counter() - begin)
+        assert response.status_code == 206, response.status_code
+        response.close()
+
+
+def measure(clients, statements, size, args):
+    """(Anweisungen pro Anfrage, Latenzen seriell, Anfragen/s parallel)"""
+    range_requests(clients[0], 50, size, [])
+    statements[0] = 0
+    serial = []
+    range_requests(clients[0], args.requests, size, serial)
+    per_request = statements[0] / args.requests
+
+    latencies = []
+    threads = [threading.Thread(target=range_requests, args=(client, args.requests // args.readers, size, latencies))
+               for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return per_request, serial, len(latencies) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--mode', default='sendfile', help="VIDEO_DELIVERY_MODE (sendfile, x-accel, ...)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        size = 64 * 1024 * 1024
+        with open(os.path.join(tmp, 'film.mp4'), 'wb') as f:
+            f.truncate(size)
+        best = {}
+        for round_number in range(args.rounds):
+            # user_cache ist ein Singleton: jede App konfiguriert ihn neu, also pro Durchgang frisch aufsetzen.
+            for name, enabled in (('ohne', False), ('mit', True)):
+                clients, statements = setup(tmp, f"{name}{round_number}", enabled, args)
+                result = measure(clients, statements, size, args)
+                if name not in best or statistics.mean(result[1]) < statistics.mean(best[name][1]):
+                    best[name] = result
+        stats = user_cache.to_dict()
+
+    print(f"{args.requests} Range-Requests à {CHUNK // 1024} KB, {args.readers} parallele Leser, Modus {args.mode}\n")
+    print(f"{'Cache':<6} {'SQL/Anfr.':>10} {'Mittel':>9} {'p50':>9} {'p95':>9}   {'parallel':>12}")
+    for name, (per_request, serial, throughput) in best.items():
+        serial.sort()
+        print(f"{name:<6} {per_request:>10.2f} {statistics.mean(serial) * 1e6:>7.0f}µs {serial[len(serial) // 2] * 1e6:>7.0f}µs "
+              f"{serial[int(len(serial) * 0.95) - 1] * 1e6:>7.0f}µs   {throughput:>7.0f} Anfr./s")
+    saved = best['ohne'][0] - best['mit'][0]
+    print(f"\nEingespart: {saved:.2f} SQL-Anweisungen pro Anfrage; Trefferquote im letzten Durchgang {stats['hit_rate']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
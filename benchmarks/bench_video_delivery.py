@@ -0,0 +1,144 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_video_delivery.py
+
+"""
+Benchmark: parallele Range-Leser gegen /video_files in jedem VIDEO_DELIVERY_MODE.
+
+Die App läuft unter einem kleinen wsgiref-Server, der wie gunicorn wsgi.file_wrapper
+per sendfile() überträgt. Gemessen werden Durchsatz, Latenz und die Worker-Belegung
+(Zeit, die ein Server-Thread pro Anfrage gebunden ist). Im Modus 'x-accel' liefert
+normalerweise nginx die Bytes aus – hier wird nur die Belegung des Workers gemessen.
+
+Aufruf:  python -m benchmarks.bench_video_delivery --readers 16 --requests 400
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import ServerHandler, WSGIRequestHandler, WSGIServer, make_server
+
+import requests
+
+from app import create_app, db
+from app.models import User
+
+
+class SendfileHandler(ServerHandler):
+    """Überträgt wsgi.file_wrapper-Antworten wie gunicorn per sendfile() ab der aktuellen Dateiposition."""
+
+    def sendfile(self):
+        f = self.result.filelike
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+        self.request_handler.connection.sendfile(f, f.tell(), int(self.headers['Content-Length']))
+        return True
+
+
+class TimedRequestHandler(WSGIRequestHandler):
+    busy_seconds = 0.0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        self.raw_requestline = self.rfile.readline(65537)
+        if not self.parse_request():
+            return
+        start = time.perf_counter()
+        handler = SendfileHandler(self.rfile, self.wfile, self.get_stderr(), self.get_environ(), multithread=True)
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+        with TimedRequestHandler.lock:
+            TimedRequestHandler.busy_seconds += time.perf_counter() - start
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def start_app_server(mode, video_folder, db_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{db_path}",
+                      'VIDEO_FOLDER': video_folder, 'VIDEO_DELIVERY_MODE': mode})
+    with app.app_context():
+        if not User.query.filter_by(email='bench@coldnet.local').first():
+            user = User(email='bench@coldnet.local')
+            user.set_password('bench')
+            db.session.add(user)
+            db.session.commit()
+    server = make_server('127.0.0.1', 0, app, server_class=ThreadingWSGIServer, handler_class=TimedRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def reader(base_url, cookies, size, span, count, rng, latencies, totals):
+    session = requests.Session()
+    session.cookies.update(cookies)
+    for _ in range(count):
+        start = rng.randrange(max(1, size - span), size)
+        begin = time.perf_counter()
+        response = session.get(f"{base_url}/video_files/film.mp4", headers={'Range': f"bytes={start}-"}, stream=True)
+        received = sum(len(chunk) for chunk in response.iter_content(chunk_size=256 * 1024))
+        latencies.append(time.perf_counter() - begin)
+        totals.append(received)
+        assert response.status_code in (200, 206), response.status_code
+
+
+def run(mode, video_folder, db_path, size, args):
+    server, base_url = start_app_server(mode, video_folder, db_path)
+    login = requests.Session()
+    login.post(f"{base_url}/api/login", json={'email': 'bench@coldnet.local', 'password': 'bench'}).raise_for_status()
+    TimedRequestHandler.busy_seconds = 0.0
+    latencies, totals = [], []
+    per_reader = args.requests // args.readers
+    threads = [threading.Thread(target=reader, args=(base_url, login.cookies, size, args.span * 1024 * 1024, per_reader,
+                                                     random.Random(i), latencies, totals))
+               for i in range(args.readers)]
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    server.shutdown()
+
+    latencies.sort()
+    requests_done = len(latencies)
+    print(f"{mode:<11} {requests_done / wall:7.1f} Anfr./s  {sum(totals) / wall / 1e6:8.1f} MB/s  "
+          f"p50 {statistics.median(latencies) * 1000:7.2f} ms  p95 {latencies[int(requests_done * 0.95) - 1] * 1000:7.2f} ms  "
+          f"Worker {TimedRequestHandler.busy_seconds / requests_done * 1000:7.2f} ms/Anfr.  CPU {cpu:5.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--size', type=int, default=64, help="Größe der Testdatei in MB")
+    parser.add_argument('--span', type=int, default=8, help="Range-Starts liegen in den letzten N MB")
+    parser.add_argument('--modes', default='flask,sendfile,x-accel')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='coldnet-bench-')
+    try:
+        video_folder = os.path.join(workdir, 'videos')
+        os.makedirs(video_folder)
+        size = args.size * 1024 * 1024
+        with open(os.path.join(video_folder, 'film.mp4'), 'wb') as f:
+            f.write(os.urandom(size))
+        print(f"{args.readers} Leser, {args.requests} Range-Anfragen (bytes=N-), Datei {args.size} MB\n")
+        for mode in args.modes.split(','):
+            run(mode, video_folder, os.path.join(workdir, f"{mode}.db"), size, args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
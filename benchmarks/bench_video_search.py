@@ -0,0 +1,116 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: bench_video_search.py
+
+"""
+Videosuche: ilike auf dem Titel gegen den Suchindex mit Facetten (app/video_index.py).
+
+Legt eine temporäre Datenbank mit synthetischen Videos an und spielt Suchen
+"während des Tippens" ab (jeder Tastendruck eine Anfrage). Gemessen werden
+p50/p95/p99 pro Anfrage; der Index liefert zusätzlich die Facettenzahlen.
+
+Aufruf:  python -m benchmarks.bench_video_search --videos 50000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import insert
+
+from app import create_app, db
+from app.models import Video
+from app.video_index import VideoSearchIndex
+
+SYLLABLES = "ka ri mo ne lu ta be so fi ga de no pu le wi ro sa tu me hi".split()
+NAMED_WORDS = "Amélie Straße Müller König Über Nacht Stern Krieg Reise Drachen".split()
+GENRES = "Action Drama Komödie Dokumentation Animation Thriller Science-Fiction Fantasy".split()
+CATEGORIES = [f"Sammlung {i}" for i in range(40)]
+TYPED = ["ame", "amel", "amelie", "koni", "konig reise", "drama stern", "uber nacht k", "stra", "dokumentation 19"]
+
+
+def word(rng):
+    return rng.choice(NAMED_WORDS) if rng.random() < 0.1 else "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+
+
+def seed(count, rng):
+    batch = []
+    for i in range(count):
+        batch.append({
+            'filepath': f"{i % 40}/video_{i}.mp4", 'filename': f"video_{i}.mp4",
+            'title': " ".join(word(rng) for _ in range(rng.randint(1, 4))).title(),
+            'category': rng.choice(CATEGORIES), 'genre': rng.choice(GENRES), 'year': rng.randint(1950, 2025),
+            'description': " ".join(word(rng) for _ in range(rng.randint(15, 60))),
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(Video), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Video), batch)
+    db.session.commit()
+
+
+def keystrokes():
+    """'ame' -> 'a', 'am', 'ame' – so wie die Anfragen beim Tippen eintreffen."""
+    for query in TYPED:
+        for end in range(1, len(query) + 1):
+            if not query[end - 1].isspace():
+                yield query[:end]
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    pick = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+    return f"p50 {statistics.median(timings) * 1000:7.2f} ms  p95 {pick(0.95):7.2f} ms  p99 {pick(0.99):7.2f} ms"
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        for query in keystrokes():
+            start = time.perf_counter()
+            func(query)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--videos', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+        with app.app_context():
+            seed(args.videos, random.Random(42))
+            index = VideoSearchIndex()
+            start = time.perf_counter()
+            index.build()
+            print(f"{args.videos} Videos, Index-Aufbau {time.perf_counter() - start:.2f} s, "
+                  f"{len(list(keystrokes()))} Tastendrücke x {args.repeat}\n")
+
+            def ilike(query):
+                db.session.execute(db.select(Video.id).where(Video.title.ilike(f"%{query}%"))
+                                   .order_by(Video.category, Video.title)).all()
+
+            def ilike_all_fields(query):
+                pattern = f"%{query}%"
+                db.session.execute(db.select(Video.id).where(Video.title.ilike(pattern) | Video.description.ilike(pattern)
+                                                             | Video.genre.ilike(pattern))
+                                   .order_by(Video.category, Video.title)).all()
+
+            print(f"{'ilike Titel':<26} {percentiles(measure(ilike, args.repeat))}")
+            print(f"{'ilike Titel+Beschr.+Genre':<26} {percentiles(measure(ilike_all_fields, args.repeat))}")
+            print(f"{'Index + Facetten':<26} {percentiles(measure(lambda q: index.search(q, limit=20), args.repeat))}")
+            print(f"{'Index, Filter Genre':<26} "
+                  f"{percentiles(measure(lambda q: index.search(q, genre='Drama', limit=20), args.repeat))}")
+            result = index.search("amelie", genre='Drama', limit=3)
+            print(f"\nBeispiel 'amelie' + Genre Drama: {result.total} Treffer, "
+                  f"Jahre: {dict(list(result.facets['year'].items())[:3])}, Genres: {dict(list(result.facets['genre'].items())[:3])}")
+
+
+if __name__ == '__main__':
+    main()
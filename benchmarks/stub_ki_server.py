@@ -0,0 +1,152 @@
+# Ordner: /coldNet/benchmarks/
+# Datei: stub_ki_server.py
+
+"""
+Lokaler Stub des KI-Servers für Benchmarks.
+
+Bedient /health, /models, /load_model und /api/chat (mit und ohne Streaming)
+und zählt die geöffneten TCP-Verbindungen, damit sich Keep-Alive messen lässt,
+sowie gleichzeitig laufende und vom Client abgebrochene Streams. Mit capacity bearbeitet
+der Stub nur so viele /api/chat-Anfragen gleichzeitig (wie eine GPU), mit failure_rate
+antwortet er zufällig mit 500, mit server.down = True fällt er ganz aus.
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubKIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.body_size = length
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _fail_if_down(self):
+        if self.server.down:
+            # Wie ein abgestürzter Server: Verbindung ohne Antwort schließen.
+            self.close_connection = True
+            return True
+        return False
+
+    def do_GET(self):
+        with self.server.stats_lock:
+            self.server.requests += 1
+        if self._fail_if_down():
+            return
+        if self.path == '/health':
+            self._send_json({'status': 'ok', 'model_loaded': True, 'loaded_model_name': self.server.model})
+        elif self.path == '/models':
+            self._send_json({'models': [{'name': self.server.model}]})
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        with self.server.stats_lock:
+            self.server.requests += 1
+        data = self._read_json()
+        if self._fail_if_down():
+            return
+        if self.path == '/load_model':
+            self.server.model = data.get('model', self.server.model)
+            self._send_json({'message': f"Modell {self.server.model} geladen."})
+        elif self.path == '/api/chat':
+            with self.server.slots:
+                self._chat(data)
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def _chat(self, data):
+        # Prompt-Verarbeitung wächst mit der Größe der Anfrage (prompt_delay_per_kb Sekunden pro KB).
+        time.sleep(self.server.latency + self.body_size / 1024 * self.server.prompt_delay_per_kb)
+        if self.server.failure_rate and self.server.random.random() < self.server.failure_rate:
+            with self.server.stats_lock:
+                self.server.failures += 1
+            self._send_json({'error': 'simulierter Fehler'}, 500)
+            return
+        if not data.get('stream'):
+            self._send_json({'message': {'role': 'assistant', 'content': self.server.dispatcher_reply}})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        with self.server.stats_lock:
+            self.server.active_streams += 1
+            self.server.max_active_streams = max(self.server.max_active_streams, self.server.active_streams)
+        try:
+            for i in range(self.server.tokens):
+                chunk = f"data: {json.dumps({'message': {'content': f'tok{i} '}})}\n\n".encode('utf-8')
+                self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+                time.sleep(self.server.token_delay)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client hat die Generierung abgebrochen
+            with self.server.stats_lock:
+                self.server.aborted_streams += 1
+            self.close_connection = True
+        finally:
+            with self.server.stats_lock:
+                self.server.active_streams -= 1
+
+
+class StubServer(ThreadingHTTPServer):
+    # Standard-Backlog 5 verwirft bei vielen gleichzeitigen Verbindungen SYNs (1 s Wartezeit bis zur Wiederholung).
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Abgebrochene Verbindungen gehören zu den Benchmarks (Client-Abbrüche, simulierte Ausfälle).
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_stub_server(latency=0.0, tokens=5, token_delay=0.0, model='stub-model',
+                      dispatcher_reply='{"tool_name": "none"}', port=0, prompt_delay_per_kb=0.0, failure_rate=0.0, seed=None,
+                      capacity=None):
+    """Startet den Stub in einem Hintergrund-Thread und gibt (server, base_url) zurück."""
+    server = StubServer(('127.0.0.1', port), StubKIHandler)
+    server.daemon_threads = True
+    server.stats_lock = threading.Lock()
+    server.connections = 0
+    server.requests = 0
+    server.aborted_streams = 0
+    server.active_streams = 0
+    server.max_active_streams = 0
+    server.latency = latency
+    server.tokens = tokens
+    server.token_delay = token_delay
+    server.prompt_delay_per_kb = prompt_delay_per_kb
+    server.model = model
+    server.dispatcher_reply = dispatcher_reply
+    server.failure_rate = failure_rate
+    server.random = random.Random(seed)
+    server.failures = 0
+    server.down = False
+    server.slots = threading.BoundedSemaphore(capacity) if capacity else nullcontext()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
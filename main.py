@@ -3,10 +3,13 @@
 
 from app import create_app
 
-# Erstellt eine Instanz deiner Anwendung mit der Factory-Funktion
-app = create_app()
+# Die App entsteht erst im Startzweig: der Passwort-Pool (app/passwords.py) importiert dieses Modul in jedem
+# Worker-Prozess neu und soll dort keine zweite App samt Datenbank und Video-Watcher hochfahren.
+# WSGI-Server und "flask --app main" nutzen die Factory: gunicorn "main:create_app()".
 
 if __name__ == '__main__':
+    # Erstellt eine Instanz deiner Anwendung mit der Factory-Funktion
+    app = create_app()
     # Startet den Flask-Entwicklungsserver
     # debug=True sorgt dafür, dass der Server bei Code-Änderungen automatisch neu startet.
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,58 @@
+"""add conversations
+
+Serverseitiger Chatverlauf: Unterhaltungen mit laufender Zusammenfassung und
+ihre Nachrichten inkl. geschätzter Tokenzahl. Neue Datenbanken bekommen die
+Tabellen über db.create_all(), deshalb if_not_exists.
+
+Revision ID: 3c1f0a9d5b27
+Revises: 8e16e8746b79
+Create Date: 2026-10-18 11:32:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0a9d5b27'
+down_revision = '8e16e8746b79'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'conversation',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=True),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('summary_until_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_conversation_user_updated', 'conversation', ['user_id', 'updated_at'], unique=False, if_not_exists=True)
+    op.create_table(
+        'conversation_message',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('conversation_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('tokens', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['conversation_id'], ['conversation.id']),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_conversation_message_conversation_id', 'conversation_message', ['conversation_id', 'id'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_conversation_message_conversation_id', table_name='conversation_message', if_exists=True)
+    op.drop_table('conversation_message', if_exists=True)
+    op.drop_index('ix_conversation_user_updated', table_name='conversation', if_exists=True)
+    op.drop_table('conversation', if_exists=True)
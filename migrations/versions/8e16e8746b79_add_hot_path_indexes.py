@@ -0,0 +1,32 @@
+"""add hot path indexes
+
+Zusammengesetzte Indizes für die Notiz-Abfragen (user_id, created_at, id) und
+die Videoübersicht (category, title). Die Tabellen selbst legt db.create_all()
+an; neue Datenbanken haben die Indizes daher schon, deshalb if_not_exists.
+
+Revision ID: 8e16e8746b79
+Revises: 
+Create Date: 2026-10-18 10:46:06.362536
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e16e8746b79'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_note_user_created', 'note', ['user_id', 'created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_video_category_title', 'video', ['category', 'title'], unique=False, if_not_exists=True)
+    # Statistiken für den Query-Planer aktualisieren, damit er die neuen Indizes sofort nutzt.
+    op.execute('ANALYZE')
+
+
+def downgrade():
+    op.drop_index('ix_video_category_title', table_name='video', if_exists=True)
+    op.drop_index('ix_note_user_created', table_name='note', if_exists=True)